@@ -2,149 +2,4134 @@ import sys
 import os
 import subprocess
 import json
+import ctypes
+import time
+import tempfile
+import string
+import re
+import struct
+import bisect
+import heapq
+import random
+from collections import namedtuple, OrderedDict, deque
+import threading
+import getpass
+import argparse
+import shutil
+import stat
+import tracemalloc
+import gzip
+from concurrent.futures import ThreadPoolExecutor, Future
+from multiprocessing.connection import Listener, Client
 from PyQt5 import QtWidgets, QtGui, QtCore
 from PyQt5.QtCore import pyqtSignal, QObject
-import win32gui
-import win32con
-import win32process
-import keyboard
+try:
+    import win32gui
+    import win32con
+    import win32process
+except ImportError:
+    win32gui = win32con = win32process = None
+try:
+    import keyboard
+except ImportError:
+    keyboard = None
+try:
+    from PyQt5.QtWinExtras import QtWin
+except ImportError:
+    QtWin = None
+try:
+    import xcffib
+    import xcffib.xproto
+except ImportError:
+    xcffib = None
+
+FULL_SCAN_INTERVAL_MS = 60000
+POLL_INTERVAL_MS = 5000
+HIDDEN_POLL_INTERVAL_MS = 15000
+SCAN_BACKOFF_LIMIT = 8
+REFRESH_COALESCE_MS = 20
+TITLE_TIMEOUT_MS = 200
+CONFIG_FLUSH_MS = 500
+COMMAND_TIMEOUT_S = 5.0
+PROFILER_INTERVAL_MS = 5
+SEARCH_LIMIT = 200
+PROCESS_CACHE_SIZE = 1024
+ICON_CACHE_KB = 1024
+ICON_SIZE = 16
+ICON_WORKERS = 2
+PIN_JOURNAL_MAX_AGE_DAYS = 30
+PIN_JOURNAL_COMPACT_MIN = 256
+TOPMOST_CHECK_DELAY_MS = 50
+TOPMOST_REASSERT_MIN_MS = 200
+TOPMOST_FIGHT_LIMIT = 5
+TOPMOST_FIGHT_WINDOW_S = 10
+DEFAULT_THEME = "white"
+
+WS_EX_TOOLWINDOW = 0x00000080
+WS_EX_TOPMOST = 0x00000008
+WM_GETTEXT = 0x000D
+WM_GETTEXTLENGTH = 0x000E
+WM_GETICON = 0x007F
+ICON_SMALL = 0
+GCL_HICONSM = -34
+SMTO_ABORTIFHUNG = 0x0002
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+
+WINDOW_CREATED = "create"
+WINDOW_DESTROYED = "destroy"
+WINDOW_SHOWN = "show"
+WINDOW_HIDDEN = "hide"
+WINDOW_RENAMED = "rename"
+WINDOW_REORDERED = "reorder"
+WINDOW_FOREGROUND = "foreground"
+
+TEXT_KEYS = (
+    "title", "select_window", "unpin_all", "hotkey_label", "menu_file", "menu_open_location",
+    "menu_about", "menu_exit", "menu_theme", "menu_white", "menu_gray", "menu_black",
+    "menu_refresh", "menu_settings", "menu_pin_selected", "menu_unpin_selected",
+    "menu_pin_process", "menu_per_window", "search_placeholder", "settings_title", "settings_hotkey",
+    "settings_pin", "settings_unpin", "settings_example", "settings_close_tray",
+    "settings_language", "btn_save", "btn_cancel", "msg_error", "msg_empty_hotkey",
+    "msg_invalid_hotkey", "msg_cannot_open", "msg_topmost_fight", "tray_open", "tray_exit", "about_title",
+    "about_app_name", "about_version", "about_author",
+)
+TEXT_KEY_INDEX = {key: index for index, key in enumerate(TEXT_KEYS)}
+DEFAULT_LANGUAGE = "vi"
+FALLBACK_LANGUAGE = "en"
+
+STYLESHEET_TEMPLATE = string.Template("""
+    QWidget {
+        background-color: ${bg_color};
+        color: ${text_color};
+    }
+    QListView {
+        background-color: ${list_bg};
+        border: 1px solid ${border_color};
+    }
+    QPushButton {
+        background-color: ${btn_bg};
+        border: 1px solid ${border_color};
+        padding: 5px;
+        color: ${text_color};
+    }
+    QPushButton:hover {
+        background-color: ${btn_hover};
+    }
+    QPushButton:disabled {
+        background-color: ${border_color};
+        color: #888888;
+    }
+    QMenuBar {
+        background-color: ${menubar_bg};
+        color: ${text_color};
+    }
+    QMenuBar::item {
+        background-color: transparent;
+        padding: 4px 8px;
+    }
+    QMenuBar::item:selected {
+        background-color: #0078D4;
+        color: #FFFFFF;
+    }
+    QMenuBar::item:pressed {
+        background-color: #005A9E;
+        color: #FFFFFF;
+    }
+    QMenu {
+        background-color: ${menu_bg};
+        color: ${text_color};
+        border: 1px solid ${border_color};
+    }
+    QMenu::item {
+        padding: 5px 20px;
+    }
+    QMenu::item:selected {
+        background-color: #0078D4;
+        color: #FFFFFF;
+    }
+    QGroupBox {
+        border: 1px solid ${border_color};
+        margin-top: 10px;
+        padding-top: 10px;
+        color: ${text_color};
+    }
+    QGroupBox::title {
+        subcontrol-origin: margin;
+        left: 10px;
+        padding: 0 5px;
+    }
+""")
 
 def resource_path(relative_path):
     try:
-        base_path = sys._MEIPASS
+        base_path = sys._MEIPASS
+    except Exception:
+        base_path = os.path.abspath(".")
+    return os.path.join(base_path, relative_path)
+
+HISTOGRAM_BOUNDS = tuple(m * 10 ** e for e in range(-3, 6) for m in (1, 2, 5))
+
+class Histogram:
+    __slots__ = ("count", "total", "min", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        self.buckets[bisect.bisect_left(HISTOGRAM_BOUNDS, value)] += 1
+
+    def percentile(self, fraction):
+        # Upper bound of the bucket holding the percentile, capped at max.
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= rank and bucket:
+                if index < len(HISTOGRAM_BOUNDS):
+                    return min(HISTOGRAM_BOUNDS[index], self.max)
+                break
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+class Metrics:
+    # Counters and histograms for the hot paths. While disabled, recording
+    # returns after one attribute check. Swallowed exceptions are counted
+    # either way: they are rare, and the first thing worth looking at.
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.started = time.time()
+        self.counters = {}
+        self.histograms = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(value)
+
+    def observe_since(self, name, started):
+        if self.enabled:
+            self.observe(name, (time.perf_counter() - started) * 1000)
+
+    def swallowed(self, site, error=None):
+        with self._lock:
+            entry = self.errors.get(site)
+            if entry is None:
+                entry = self.errors[site] = {"count": 0, "last": None}
+            entry["count"] += 1
+            if error is not None:
+                entry["last"] = "{0}: {1}".format(type(error).__name__, error)
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.counters = {}
+            self.histograms = {}
+            self.errors = {}
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "uptime_s": round(time.time() - self.started, 1),
+                "counters": dict(self.counters),
+                "histograms": {name: h.summary() for name, h in self.histograms.items()},
+                "errors": {site: dict(entry) for site, entry in self.errors.items()},
+            }
+
+    def report(self):
+        snapshot = self.snapshot()
+        lines = ["metrics {0}, {1:.0f} s".format("on" if snapshot["enabled"] else "off",
+                                                 snapshot["uptime_s"])]
+        if snapshot["histograms"]:
+            lines.append("")
+            lines.append("{0:<26}{1:>8}{2:>10}{3:>10}{4:>10}{5:>10}".format(
+                "histogram", "count", "mean", "p50", "p95", "max"))
+            for name in sorted(snapshot["histograms"]):
+                s = snapshot["histograms"][name]
+                lines.append("{0:<26}{1:>8}{2:>10.3f}{3:>10.3f}{4:>10.3f}{5:>10.3f}".format(
+                    name, s["count"], s["mean"], s["p50"], s["p95"], s["max"]))
+        if snapshot["counters"]:
+            lines.append("")
+            for name in sorted(snapshot["counters"]):
+                lines.append("{0:<26}{1:>8}".format(name, snapshot["counters"][name]))
+        if snapshot["errors"]:
+            lines.append("")
+            lines.append("swallowed exceptions")
+            for site in sorted(snapshot["errors"]):
+                entry = snapshot["errors"][site]
+                lines.append("{0:<26}{1:>8}  {2}".format(site, entry["count"], entry["last"] or ""))
+        return "\n".join(lines)
+
+metrics = Metrics()
+
+class Win32WindowBackend:
+    def __init__(self):
+        self.calls = 0
+        if sys.platform == "win32":
+            from ctypes import wintypes
+            send = ctypes.windll.user32.SendMessageTimeoutW
+            send.argtypes = [wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM,
+                             wintypes.UINT, wintypes.UINT, ctypes.POINTER(ctypes.c_size_t)]
+            send.restype = wintypes.LPARAM
+            self._send_message_timeout = send
+            user32 = ctypes.windll.user32
+            user32.BeginDeferWindowPos.argtypes = [ctypes.c_int]
+            user32.BeginDeferWindowPos.restype = wintypes.HANDLE
+            user32.DeferWindowPos.argtypes = [wintypes.HANDLE, wintypes.HWND, wintypes.HWND,
+                                              ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                              ctypes.c_int, wintypes.UINT]
+            user32.DeferWindowPos.restype = wintypes.HANDLE
+            user32.EndDeferWindowPos.argtypes = [wintypes.HANDLE]
+            user32.EndDeferWindowPos.restype = wintypes.BOOL
+
+    def enum_windows(self):
+        hwnds = []
+        self.calls += 1
+        win32gui.EnumWindows(lambda hwnd, _: hwnds.append(hwnd), None)
+        return hwnds
+
+    def is_window(self, hwnd):
+        self.calls += 1
+        return win32gui.IsWindow(hwnd)
+
+    def is_visible(self, hwnd):
+        self.calls += 1
+        return win32gui.IsWindowVisible(hwnd)
+
+    def get_parent(self, hwnd):
+        self.calls += 1
+        return win32gui.GetParent(hwnd)
+
+    def get_owner(self, hwnd):
+        self.calls += 1
+        return win32gui.GetWindow(hwnd, win32con.GW_OWNER)
+
+    def get_ex_style(self, hwnd):
+        self.calls += 1
+        return win32gui.GetWindowLong(hwnd, win32con.GWL_EXSTYLE)
+
+    def get_pid(self, hwnd):
+        self.calls += 1
+        return win32process.GetWindowThreadProcessId(hwnd)[1]
+
+    def get_text(self, hwnd, timeout_ms=None):
+        self.calls += 1
+        if timeout_ms is None:
+            return win32gui.GetWindowText(hwnd)
+        # WM_GETTEXT through SendMessageTimeout so that a hung owner thread
+        # costs at most timeout_ms; None tells the caller it timed out.
+        send = self._send_message_timeout
+        length = ctypes.c_size_t()
+        if not send(hwnd, WM_GETTEXTLENGTH, 0, 0, SMTO_ABORTIFHUNG, timeout_ms,
+                    ctypes.byref(length)):
+            return None
+        buffer = ctypes.create_unicode_buffer(length.value + 1)
+        if not send(hwnd, WM_GETTEXT, length.value + 1, ctypes.addressof(buffer),
+                    SMTO_ABORTIFHUNG, timeout_ms, ctypes.byref(length)):
+            return None
+        return buffer.value
+
+    def get_class_name(self, hwnd):
+        self.calls += 1
+        return win32gui.GetClassName(hwnd)
+
+    def get_foreground_window(self):
+        self.calls += 1
+        return win32gui.GetForegroundWindow()
+
+    def activate(self, hwnd):
+        self.calls += 1
+        win32gui.SetForegroundWindow(hwnd)
+
+    def get_process_path(self, pid):
+        self.calls += 1
+        from ctypes import wintypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return None
+        try:
+            size = wintypes.DWORD(1024)
+            buffer = ctypes.create_unicode_buffer(size.value)
+            if not kernel32.QueryFullProcessImageNameW(handle, 0, buffer, ctypes.byref(size)):
+                return None
+            return buffer.value
+        finally:
+            kernel32.CloseHandle(handle)
+
+    def get_process_start_time(self, pid):
+        # Creation time tells a reused pid from the process it used to name.
+        self.calls += 1
+        from ctypes import wintypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return None
+        try:
+            times = [wintypes.FILETIME() for _ in range(4)]
+            if not kernel32.GetProcessTimes(handle, *(ctypes.byref(t) for t in times)):
+                return None
+            return (times[0].dwHighDateTime << 32) | times[0].dwLowDateTime
+        finally:
+            kernel32.CloseHandle(handle)
+
+    def set_topmost(self, hwnd, topmost):
+        self.calls += 1
+        insert_after = win32con.HWND_TOPMOST if topmost else win32con.HWND_NOTOPMOST
+        win32gui.SetWindowPos(hwnd, insert_after, 0, 0, 0, 0,
+                              win32con.SWP_NOMOVE | win32con.SWP_NOSIZE)
+
+    def set_topmost_many(self, hwnds, topmost):
+        # One DeferWindowPos batch commits every z-order change together. A
+        # dead hwnd fails the whole batch, so fall back to one call per window.
+        hwnds = [hwnd for hwnd in hwnds if win32gui.IsWindow(hwnd)]
+        if not hwnds:
+            return []
+        user32 = ctypes.windll.user32
+        insert_after = win32con.HWND_TOPMOST if topmost else win32con.HWND_NOTOPMOST
+        flags = win32con.SWP_NOMOVE | win32con.SWP_NOSIZE | win32con.SWP_NOACTIVATE
+        self.calls += 2
+        hdwp = user32.BeginDeferWindowPos(len(hwnds))
+        for hwnd in hwnds:
+            if not hdwp:
+                break
+            self.calls += 1
+            hdwp = user32.DeferWindowPos(hdwp, hwnd, insert_after, 0, 0, 0, 0, flags)
+        if hdwp and user32.EndDeferWindowPos(hdwp):
+            return hwnds
+        done = []
+        for hwnd in hwnds:
+            try:
+                self.set_topmost(hwnd, topmost)
+                done.append(hwnd)
+            except Exception as e:
+                metrics.swallowed("backend.set_topmost", e)
+        return done
+
+class X11Window:
+    __slots__ = ("title", "pid", "state", "types", "owner", "class_name")
+
+    def __init__(self, title, pid, state, types, owner, class_name):
+        self.title = title
+        self.pid = pid
+        self.state = state
+        self.types = types
+        self.owner = owner
+        self.class_name = class_name
+
+class X11WindowBackend:
+    # EWMH desktops through xcffib. A scan reads _NET_CLIENT_LIST, then
+    # every property it needs for every client in one pipelined batch: all
+    # requests go out before the first reply is awaited, so it costs two
+    # round trips however many windows there are. The getters answer from
+    # that snapshot; a window it does not cover yet is fetched on its own.
+    # Skip-taskbar and non-normal window types map to WS_EX_TOOLWINDOW,
+    # _NET_WM_STATE_ABOVE to WS_EX_TOPMOST and WM_TRANSIENT_FOR to the owner.
+    ATOMS = ("_NET_CLIENT_LIST", "_NET_ACTIVE_WINDOW", "_NET_WM_NAME", "_NET_WM_PID",
+             "_NET_WM_STATE", "_NET_WM_STATE_ABOVE", "_NET_WM_STATE_SKIP_TASKBAR",
+             "_NET_WM_WINDOW_TYPE", "_NET_WM_WINDOW_TYPE_NORMAL", "_NET_WM_WINDOW_TYPE_DIALOG",
+             "UTF8_STRING")
+    NET_WM_STATE_REMOVE = 0
+    NET_WM_STATE_ADD = 1
+    SOURCE_PAGER = 2
+
+    def __init__(self, display=None):
+        self.calls = 0
+        self.round_trips = 0
+        self.conn = xcffib.connect(display=display)
+        self.root = self.conn.get_setup().roots[self.conn.pref_screen].root
+        cookies = [self.conn.core.InternAtom(False, len(name), name) for name in self.ATOMS]
+        self.calls += len(cookies)
+        self.round_trips += 1
+        self.atoms = {name: cookie.reply().atom for name, cookie in zip(self.ATOMS, cookies)}
+        atom = xcffib.xproto.Atom
+        atoms = self.atoms
+        self._properties = (
+            (atoms["_NET_WM_NAME"], atoms["UTF8_STRING"], 1024),
+            (atom.WM_NAME, xcffib.xproto.GetPropertyType.Any, 1024),
+            (atoms["_NET_WM_PID"], atom.CARDINAL, 1),
+            (atoms["_NET_WM_STATE"], atom.ATOM, 64),
+            (atoms["_NET_WM_WINDOW_TYPE"], atom.ATOM, 64),
+            (atom.WM_TRANSIENT_FOR, atom.WINDOW, 1),
+            (atom.WM_CLASS, atom.STRING, 256),
+        )
+        self._taskbar_types = {atoms["_NET_WM_WINDOW_TYPE_NORMAL"], atoms["_NET_WM_WINDOW_TYPE_DIALOG"]}
+        self._clients = set()
+        self._windows = {}
+
+    def _read(self, cookies):
+        # Replies in request order; a window destroyed mid-batch reads as None.
+        values = []
+        for cookie in cookies:
+            try:
+                values.append(b"".join(cookie.reply().value))
+            except xcffib.Error:
+                values.append(None)
+        return values
+
+    def _root_property(self, name, kind, length):
+        self.calls += 1
+        self.round_trips += 1
+        return self._read([self.conn.core.GetProperty(False, self.root, self.atoms[name],
+                                                      kind, 0, length)])[0] or b""
+
+    def _fetch(self, hwnds):
+        core = self.conn.core
+        pending = [(hwnd, [core.GetProperty(False, hwnd, name, kind, 0, length)
+                           for name, kind, length in self._properties])
+                   for hwnd in hwnds]
+        if not pending:
+            return
+        self.calls += len(pending) * len(self._properties)
+        self.round_trips += 1
+        for hwnd, cookies in pending:
+            net_name, name, pid, state, types, owner, class_name = self._read(cookies)
+            if net_name is None:
+                self._windows.pop(hwnd, None)
+                self._clients.discard(hwnd)
+                continue
+            # WM_CLASS is "instance\0class\0".
+            class_parts = (class_name or b"").split(b"\0")
+            self._windows[hwnd] = X11Window(
+                net_name.decode("utf-8", "replace") if net_name else (name or b"").decode("latin-1"),
+                unpack_cardinals(pid)[0] if pid else 0,
+                set(unpack_cardinals(state)),
+                set(unpack_cardinals(types)),
+                unpack_cardinals(owner)[0] if owner else 0,
+                class_parts[1].decode("latin-1") if len(class_parts) > 1 else ""
+            )
+
+    def _window(self, hwnd):
+        window = self._windows.get(hwnd)
+        if window is None:
+            self._fetch([hwnd])
+            window = self._windows.get(hwnd)
+            if window is None:
+                raise OSError("Invalid window handle: {0}".format(hwnd))
+        return window
+
+    def enum_windows(self):
+        clients = unpack_cardinals(self._root_property("_NET_CLIENT_LIST", xcffib.xproto.Atom.WINDOW, 65536))
+        self._clients = set(clients)
+        self._windows = {}
+        self._fetch(clients)
+        return [hwnd for hwnd in clients if hwnd in self._windows]
+
+    def is_window(self, hwnd):
+        return hwnd in self._clients
+
+    def is_visible(self, hwnd):
+        # Managed windows are on the taskbar even while iconified.
+        self._window(hwnd)
+        return True
+
+    def get_parent(self, hwnd):
+        self._window(hwnd)
+        return 0
+
+    def get_owner(self, hwnd):
+        return self._window(hwnd).owner
+
+    def get_ex_style(self, hwnd):
+        window = self._window(hwnd)
+        style = 0
+        if (self.atoms["_NET_WM_STATE_SKIP_TASKBAR"] in window.state
+                or (window.types and not window.types & self._taskbar_types)):
+            style |= WS_EX_TOOLWINDOW
+        if self.atoms["_NET_WM_STATE_ABOVE"] in window.state:
+            style |= WS_EX_TOPMOST
+        return style
+
+    def get_pid(self, hwnd):
+        return self._window(hwnd).pid
+
+    def get_text(self, hwnd, timeout_ms=None):
+        return self._window(hwnd).title
+
+    def get_class_name(self, hwnd):
+        return self._window(hwnd).class_name
+
+    def get_foreground_window(self):
+        active = unpack_cardinals(self._root_property("_NET_ACTIVE_WINDOW", xcffib.xproto.Atom.WINDOW, 1))
+        return active[0] if active else 0
+
+    def _client_message(self, hwnd, message, data):
+        event = xcffib.xproto.ClientMessageEvent.synthetic(
+            32, hwnd, self.atoms[message],
+            xcffib.xproto.ClientMessageData.synthetic(data, "I" * 5)
+        )
+        mask = xcffib.xproto.EventMask.SubstructureRedirect | xcffib.xproto.EventMask.SubstructureNotify
+        self.calls += 1
+        self.conn.core.SendEvent(False, self.root, mask, event.pack())
+
+    def activate(self, hwnd):
+        self._window(hwnd)
+        self._client_message(hwnd, "_NET_ACTIVE_WINDOW", [self.SOURCE_PAGER, 0, 0, 0, 0])
+        self.conn.flush()
+
+    def get_process_path(self, pid):
+        self.calls += 1
+        try:
+            return os.readlink("/proc/{0}/exe".format(pid))
+        except OSError:
+            return None
+
+    def get_process_start_time(self, pid):
+        self.calls += 1
+        try:
+            with open("/proc/{0}/stat".format(pid), 'rb') as f:
+                return int(f.read().rpartition(b")")[2].split()[19])
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def _set_above(self, hwnd, topmost):
+        window = self._window(hwnd)
+        above = self.atoms["_NET_WM_STATE_ABOVE"]
+        action = self.NET_WM_STATE_ADD if topmost else self.NET_WM_STATE_REMOVE
+        self._client_message(hwnd, "_NET_WM_STATE", [action, above, 0, self.SOURCE_PAGER, 0])
+        if topmost:
+            window.state.add(above)
+        else:
+            window.state.discard(above)
+
+    def set_topmost(self, hwnd, topmost):
+        self._set_above(hwnd, topmost)
+        self.conn.flush()
+
+    def set_topmost_many(self, hwnds, topmost):
+        # Client messages have no reply: the whole batch is one flush.
+        done = []
+        for hwnd in hwnds:
+            try:
+                self._set_above(hwnd, topmost)
+                done.append(hwnd)
+            except OSError as e:
+                metrics.swallowed("backend.set_topmost", e)
+        self.conn.flush()
+        return done
+
+def unpack_cardinals(data):
+    count = len(data) // 4
+    return struct.unpack("={0}I".format(count), data[:count * 4])
+
+class FakeWindow:
+    __slots__ = ("title", "pid", "visible", "parent", "owner", "ex_style", "class_name")
+
+    def __init__(self, title, pid, visible=True, parent=0, owner=0, ex_style=0, class_name="Window"):
+        self.title = title
+        self.pid = pid
+        self.visible = visible
+        self.parent = parent
+        self.owner = owner
+        self.ex_style = ex_style
+        self.class_name = class_name
+
+class FakeWindowBackend:
+    # In-memory desktop that records z-order changes instead of making them.
+    def __init__(self):
+        self.calls = 0
+        self.windows = {}
+        self.foreground = 0
+        self.topmost_calls = []
+        self.batches = []
+        self.processes = {}
+        self.process_started = {}
+        self._next_hwnd = 0x10000
+        self._clock = 0
+
+    def start_process(self, pid, exe):
+        # Also how a test reuses a pid: same number, new start time.
+        self._clock += 1
+        self.processes[pid] = exe
+        self.process_started[pid] = self._clock
+
+    def add_window(self, title, pid, exe=None, hwnd=None, **attrs):
+        if exe is not None and self.processes.get(pid) != exe:
+            self.start_process(pid, exe)
+        if hwnd is None:
+            self._next_hwnd += 4
+            hwnd = self._next_hwnd
+        self.windows[hwnd] = FakeWindow(title, pid, **attrs)
+        return hwnd
+
+    def remove_window(self, hwnd):
+        self.windows.pop(hwnd, None)
+
+    def _call(self):
+        self.calls += 1
+
+    def enum_windows(self):
+        self._call()
+        return list(self.windows)
+
+    def _window(self, hwnd):
+        self._call()
+        window = self.windows.get(hwnd)
+        if window is None:
+            raise OSError("Invalid window handle: {0}".format(hwnd))
+        return window
+
+    def is_window(self, hwnd):
+        self._call()
+        return hwnd in self.windows
+
+    def is_visible(self, hwnd):
+        return self._window(hwnd).visible
+
+    def get_parent(self, hwnd):
+        return self._window(hwnd).parent
+
+    def get_owner(self, hwnd):
+        return self._window(hwnd).owner
+
+    def get_ex_style(self, hwnd):
+        return self._window(hwnd).ex_style
+
+    def get_pid(self, hwnd):
+        return self._window(hwnd).pid
+
+    def get_text(self, hwnd, timeout_ms=None):
+        return self._window(hwnd).title
+
+    def get_class_name(self, hwnd):
+        return self._window(hwnd).class_name
+
+    def get_foreground_window(self):
+        self._call()
+        return self.foreground
+
+    def activate(self, hwnd):
+        self._window(hwnd)
+        self.foreground = hwnd
+
+    def get_process_path(self, pid):
+        self._call()
+        return self.processes.get(pid)
+
+    def get_process_start_time(self, pid):
+        self._call()
+        return self.process_started.get(pid)
+
+    def _apply_topmost(self, window, topmost):
+        if topmost:
+            window.ex_style |= WS_EX_TOPMOST
+        else:
+            window.ex_style &= ~WS_EX_TOPMOST
+
+    def set_topmost(self, hwnd, topmost):
+        self._apply_topmost(self._window(hwnd), topmost)
+        self.topmost_calls.append((hwnd, topmost))
+
+    def set_topmost_many(self, hwnds, topmost):
+        self._call()
+        done = [hwnd for hwnd in hwnds if hwnd in self.windows]
+        for hwnd in done:
+            self._apply_topmost(self.windows[hwnd], topmost)
+        if done:
+            self.batches.append((tuple(done), topmost))
+        return done
+
+class SimulatedDesktop(FakeWindowBackend):
+    # Seeded desktop for benchmarks and for running without Win32: a mix of
+    # taskbar, owned, tool and hidden windows, title churn, and an optional
+    # fixed cost per backend call to stand in for a slow window manager.
+    def __init__(self, seed=0, latency_us=0):
+        super().__init__()
+        self.rng = random.Random(seed)
+        self.latency = latency_us / 1e6
+        self._serial = 0
+        self._top_level = []
+        self.fighters = set()
+
+    def _call(self):
+        self.calls += 1
+        if self.latency:
+            deadline = time.perf_counter() + self.latency
+            while time.perf_counter() < deadline:
+                pass
+
+    def spawn(self, processes=100, owned=0.1, tools=0.05, hidden=0.1):
+        rng = self.rng
+        self._serial += 1
+        roll = rng.random()
+        attrs = {}
+        if roll < owned and self._top_level:
+            attrs["owner"] = rng.choice(self._top_level)
+            pid = self.windows[attrs["owner"]].pid
+        else:
+            pid = 1000 + 4 * rng.randrange(processes)
+            if roll < owned + tools:
+                attrs["ex_style"] = WS_EX_TOOLWINDOW
+            elif roll < owned + tools + hidden:
+                attrs["visible"] = False
+        exe = "C:\\Program Files\\App{0}\\app{0}.exe".format(pid)
+        attrs["class_name"] = "App{0}Frame".format(pid % 7)
+        hwnd = self.add_window("Document {0} - App{1}".format(self._serial, pid), pid, exe, **attrs)
+        if len(attrs) == 1:
+            self._top_level.append(hwnd)
+        return hwnd
+
+    def populate(self, count, processes=None, **mix):
+        processes = processes or max(1, count // 3)
+        return [self.spawn(processes, **mix) for _ in range(count)]
+
+    def remove_window(self, hwnd):
+        super().remove_window(hwnd)
+        if hwnd in self._top_level:
+            self._top_level.remove(hwnd)
+
+    def churn(self, renames=0, creates=0, destroys=0, strips=0):
+        # Returns the events a window event hook would have reported.
+        # strips drops topmost from that many random topmost windows, and
+        # from every window in fighters each time.
+        rng = self.rng
+        events = []
+        for hwnd in rng.sample(list(self.windows), min(renames, len(self.windows))):
+            self._serial += 1
+            self.windows[hwnd].title = "Document {0} - App{1}".format(self._serial, self.windows[hwnd].pid)
+            events.append((WINDOW_RENAMED, hwnd))
+        if strips or self.fighters:
+            topmost = [hwnd for hwnd, window in self.windows.items() if window.ex_style & WS_EX_TOPMOST]
+            stripped = set(rng.sample(topmost, min(strips, len(topmost))))
+            stripped.update(hwnd for hwnd in self.fighters if hwnd in self.windows)
+            for hwnd in stripped:
+                self._apply_topmost(self.windows[hwnd], False)
+                events.append((WINDOW_REORDERED, hwnd))
+        for hwnd in rng.sample(list(self.windows), min(destroys, len(self.windows))):
+            self.remove_window(hwnd)
+            events.append((WINDOW_DESTROYED, hwnd))
+        for _ in range(creates):
+            events.append((WINDOW_CREATED, self.spawn(max(1, len(self.processes)))))
+        return events
+
+def create_window_backend():
+    if win32gui is not None:
+        return Win32WindowBackend()
+    if xcffib is not None and os.environ.get("DISPLAY"):
+        try:
+            return X11WindowBackend()
+        except Exception as e:
+            metrics.swallowed("backend.x11", e)
+    return FakeWindowBackend()
+
+class WindowAttributes:
+    __slots__ = ("parent", "owner", "ex_style", "pid", "title", "class_name")
+
+    def __init__(self, parent, owner, ex_style, pid):
+        self.parent = parent
+        self.owner = owner
+        self.ex_style = ex_style
+        self.pid = pid
+        self.title = None
+        self.class_name = None
+
+class WindowAttributeCache:
+    # Parent, owner, pid and ex-style are fetched once per hwnd. Visibility
+    # is always re-read. Titles are re-read once per scan, or, with
+    # track_titles set, only after invalidate_title() from a rename event.
+    # Scans fill it on the worker thread while the GUI thread looks up
+    # class names, so changes to the entry table hold the lock; backend
+    # calls never do.
+    def __init__(self, backend, track_titles=False, title_timeout_ms=None):
+        self.backend = backend
+        self.track_titles = track_titles
+        self.title_timeout_ms = title_timeout_ms
+        self.hits = 0
+        self.misses = 0
+        self.title_timeouts = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hit_rate, 3), "title_timeouts": self.title_timeouts}
+
+    def attributes(self, hwnd):
+        entry = self._entries.get(hwnd)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        backend = self.backend
+        entry = WindowAttributes(
+            backend.get_parent(hwnd),
+            backend.get_owner(hwnd),
+            backend.get_ex_style(hwnd),
+            backend.get_pid(hwnd)
+        )
+        with self._lock:
+            return self._entries.setdefault(hwnd, entry)
+
+    def is_visible(self, hwnd):
+        return self.backend.is_visible(hwnd)
+
+    def title(self, hwnd, refresh=False):
+        entry = self.attributes(hwnd)
+        if entry.title is None or (refresh and not self.track_titles):
+            title = self.backend.get_text(hwnd, self.title_timeout_ms)
+            if title is None:
+                # Hung window: keep reporting the last title we saw.
+                self.title_timeouts += 1
+                return entry.title or ""
+            entry.title = title
+        return entry.title
+
+    def class_name(self, hwnd):
+        # Only the per-window list shows it, so it is fetched on first use.
+        entry = self.attributes(hwnd)
+        if entry.class_name is None:
+            entry.class_name = self.backend.get_class_name(hwnd)
+        return entry.class_name
+
+    def invalidate_title(self, hwnd):
+        entry = self._entries.get(hwnd)
+        if entry is not None:
+            entry.title = None
+
+    def invalidate(self, hwnd):
+        with self._lock:
+            self._entries.pop(hwnd, None)
+
+    def retain(self, hwnds):
+        alive = set(hwnds)
+        with self._lock:
+            for hwnd in [h for h in self._entries if h not in alive]:
+                del self._entries[hwnd]
+
+def data_directories(config_dir, name):
+    directories = []
+    for directory in (resource_path(name),
+                      os.path.join(os.path.dirname(os.path.abspath(__file__)), name),
+                      os.path.join(config_dir, name)):
+        if directory not in directories:
+            directories.append(directory)
+    return directories
+
+def is_window_on_taskbar(hwnd, cache, refresh=False):
+    if not cache.is_visible(hwnd):
+        return False
+    attrs = cache.attributes(hwnd)
+    if attrs.parent or attrs.owner:
+        return False
+    if attrs.ex_style & WS_EX_TOOLWINDOW:
+        return False
+    return bool(cache.title(hwnd, refresh).strip())
+
+def get_window_info(hwnd, cache, refresh=False):
+    if not is_window_on_taskbar(hwnd, cache, refresh):
+        return None
+    return cache.title(hwnd), cache.attributes(hwnd).pid
+
+def enum_taskbar_windows(cache, cancelled=None):
+    windows = []
+    hwnds = cache.backend.enum_windows()
+    for hwnd in hwnds:
+        if cancelled and cancelled():
+            return None
+        try:
+            info = get_window_info(hwnd, cache, refresh=True)
+        except Exception as e:
+            metrics.swallowed("scan.window_info", e)
+            continue
+        if info:
+            windows.append((hwnd, info[0], info[1]))
+    cache.retain(hwnds)
+    return windows
+
+def filter_taskbar_windows(windows, exclude_title="AOT - AlwaysOnTop", per_window=False):
+    result = []
+    seen_pids = set()
+    exclude_titles = [exclude_title, "Settings", "Cài đặt"]
+    for hwnd, title, pid in windows:
+        if per_window or pid not in seen_pids:
+            seen_pids.add(pid)
+            if title not in exclude_titles:
+                result.append((hwnd, title))
+    return result
+
+def get_taskbar_windows(exclude_title="AOT - AlwaysOnTop", cache=None, per_window=False):
+    if cache is None:
+        cache = WindowAttributeCache(create_window_backend())
+    return filter_taskbar_windows(enum_taskbar_windows(cache), exclude_title, per_window)
+
+class WindowTracker:
+    def __init__(self):
+        self.windows = {}
+
+    def reset(self, windows):
+        self.windows = {hwnd: (title, pid) for hwnd, title, pid in windows}
+
+    def update(self, hwnd, info):
+        if info is None:
+            return self.remove(hwnd)
+        if self.windows.get(hwnd) == info:
+            return False
+        self.windows[hwnd] = info
+        return True
+
+    def remove(self, hwnd):
+        return self.windows.pop(hwnd, None) is not None
+
+    def snapshot(self, exclude_title="AOT - AlwaysOnTop", per_window=False):
+        return filter_taskbar_windows(
+            ((hwnd, title, pid) for hwnd, (title, pid) in self.windows.items()),
+            exclude_title, per_window
+        )
+
+class WindowScanWorker(QObject):
+    scan_finished = pyqtSignal(int, list)
+    window_probed = pyqtSignal(int, object)
+
+    def __init__(self, cache, current_generation):
+        super().__init__()
+        self.cache = cache
+        self.current_generation = current_generation
+
+    @QtCore.pyqtSlot(int)
+    def scan(self, generation):
+        # Scans queue up behind each other on this thread; any that a newer
+        # request has superseded bail out as soon as they notice.
+        cancelled = lambda: self.current_generation() != generation
+        if cancelled():
+            return
+        started = time.perf_counter()
+        calls = self.cache.backend.calls
+        windows = enum_taskbar_windows(self.cache, cancelled)
+        if windows is None:
+            metrics.count("scan.cancelled")
+            return
+        metrics.count("scan.completed")
+        metrics.observe_since("scan.enumerate_ms", started)
+        metrics.observe("scan.backend_calls", self.cache.backend.calls - calls)
+        self.scan_finished.emit(generation, windows)
+
+    @QtCore.pyqtSlot(str, int)
+    def probe(self, kind, hwnd):
+        cache = self.cache
+        info = None
+        try:
+            if kind == WINDOW_DESTROYED:
+                cache.invalidate(hwnd)
+            elif kind != WINDOW_HIDDEN:
+                if kind == WINDOW_RENAMED:
+                    cache.invalidate_title(hwnd)
+                info = get_window_info(hwnd, cache)
+        except Exception as e:
+            metrics.swallowed("scan.probe", e)
+            cache.invalidate(hwnd)
+        metrics.count("scan.probes")
+        self.window_probed.emit(hwnd, info)
+
+class WindowScanner(QObject):
+    scan_requested = pyqtSignal(int)
+    probe_requested = pyqtSignal(str, int)
+    scan_finished = pyqtSignal(list)
+    window_probed = pyqtSignal(int, object)
+
+    def __init__(self, cache, parent=None):
+        super().__init__(parent)
+        self.generation = 0
+        self.thread = QtCore.QThread()
+        self.worker = WindowScanWorker(cache, lambda: self.generation)
+        self.worker.moveToThread(self.thread)
+        self.scan_requested.connect(self.worker.scan)
+        self.probe_requested.connect(self.worker.probe)
+        self.worker.scan_finished.connect(self._on_scan_finished)
+        self.worker.window_probed.connect(self.window_probed)
+        self.thread.start()
+
+    def request_scan(self):
+        self.generation += 1
+        self.scan_requested.emit(self.generation)
+
+    def probe(self, kind, hwnd):
+        self.probe_requested.emit(kind, hwnd)
+
+    def stop(self):
+        self.generation += 1
+        self.thread.quit()
+        self.thread.wait(1000)
+
+    def _on_scan_finished(self, generation, windows):
+        if generation == self.generation:
+            self.scan_finished.emit(windows)
+
+class RefreshScheduler(QObject):
+    # Collects invalidations and runs at most one refresh per coalescing
+    # window. A rescan is only done if one of the invalidations asked for it.
+    # With manual set the timer is not used and the caller runs flush().
+    def __init__(self, sync, rescan, delay_ms=REFRESH_COALESCE_MS, parent=None):
+        super().__init__(parent)
+        self._sync = sync
+        self._rescan = rescan
+        self._needs_rescan = False
+        self.delay_ms = delay_ms
+        self.manual = False
+        self.pending = False
+        self.requested = 0
+        self.executed = 0
+        self.rescans = 0
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay_ms)
+        self._timer.timeout.connect(self.flush)
+
+    def invalidate(self, rescan=False):
+        self.requested += 1
+        self._needs_rescan = self._needs_rescan or rescan
+        if not self.pending:
+            self.pending = True
+            if not self.manual:
+                self._timer.start()
+
+    def flush(self):
+        self._timer.stop()
+        self.pending = False
+        rescan = self._needs_rescan
+        self._needs_rescan = False
+        self.executed += 1
+        if rescan:
+            self.rescans += 1
+            self._rescan()
+        else:
+            self._sync()
+
+    def cancel(self):
+        self._timer.stop()
+        self.pending = False
+        self._needs_rescan = False
+
+    def stats(self):
+        return {"requested": self.requested, "executed": self.executed, "rescans": self.rescans,
+                "pending": self.pending}
+
+class ScanScheduler(QObject):
+    # Drives the periodic scan, and only while the window can be seen:
+    # hiding it stops the timer and defers any scan asked for, showing it
+    # again scans once. Each scan that finds the desktop unchanged doubles
+    # the interval, up to backoff times the base; a change or user activity
+    # brings it back to the base. With hidden_ms set (no window events to
+    # go on), scans carry on at that fixed rate while hidden instead.
+    def __init__(self, scan, backoff=SCAN_BACKOFF_LIMIT, parent=None):
+        super().__init__(parent)
+        self._scan = scan
+        self.backoff = backoff
+        self.base = POLL_INTERVAL_MS
+        self.interval = self.base
+        self.hidden_ms = None
+        self.running = False
+        self.visible = False
+        self.stale = True
+        self.scans = 0
+        self.deferred = 0
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.request)
+
+    def start(self, base_ms):
+        self.base = self.interval = base_ms
+        self.running = True
+        self.request()
+
+    def stop(self):
+        self.running = False
+        self._timer.stop()
+
+    def request(self):
+        if not self.visible and not self.hidden_ms:
+            self.stale = True
+            self.deferred += 1
+            metrics.count("scan.deferred")
+            return False
+        # A scan while hidden leaves the list itself stale for showing.
+        self.stale = not self.visible
+        self.scans += 1
+        self._scan()
+        if self.running:
+            self._timer.start(self.interval if self.visible else self.hidden_ms)
+        return True
+
+    def scan_done(self, changed):
+        self.interval = self.base if changed else min(self.interval * 2, self.base * self.backoff)
+        metrics.observe("scan.interval_ms", self.interval)
+        if self.running and self.visible:
+            self._timer.start(self.interval)
+        elif self.running and self.hidden_ms:
+            self._timer.start(self.hidden_ms)
+
+    def activity(self):
+        self.interval = self.base
+        if self._timer.isActive() and self._timer.remainingTime() > self.base:
+            self._timer.start(self.base)
+
+    def set_visible(self, visible):
+        if visible == self.visible:
+            return
+        self.visible = visible
+        if not visible:
+            self._timer.stop()
+            self.stale = True
+            if self.running and self.hidden_ms:
+                self._timer.start(self.hidden_ms)
+            return
+        self.interval = self.base
+        if self.running and self.stale:
+            self.request()
+        elif self.running:
+            self._timer.start(self.interval)
+
+    def stats(self):
+        return {"scans": self.scans, "deferred": self.deferred, "interval_ms": self.interval,
+                "hidden_ms": self.hidden_ms, "visible": self.visible}
+
+class WindowEventSource(QObject):
+    window_event = pyqtSignal(str, int)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+class FakeWindowEventSource(WindowEventSource):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.running = False
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+    def push(self, kind, hwnd):
+        if self.running:
+            self.window_event.emit(kind, hwnd)
+
+class WinEventHookSource(WindowEventSource):
+    EVENT_OBJECT_CREATE = 0x8000
+    EVENT_OBJECT_DESTROY = 0x8001
+    EVENT_OBJECT_SHOW = 0x8002
+    EVENT_OBJECT_HIDE = 0x8003
+    EVENT_OBJECT_REORDER = 0x8004
+    EVENT_OBJECT_NAMECHANGE = 0x800C
+    EVENT_SYSTEM_FOREGROUND = 0x0003
+    WINEVENT_OUTOFCONTEXT = 0x0000
+    WINEVENT_SKIPOWNPROCESS = 0x0002
+    OBJID_WINDOW = 0
+    CHILDID_SELF = 0
+
+    EVENT_KINDS = {
+        EVENT_OBJECT_CREATE: WINDOW_CREATED,
+        EVENT_OBJECT_DESTROY: WINDOW_DESTROYED,
+        EVENT_OBJECT_SHOW: WINDOW_SHOWN,
+        EVENT_OBJECT_HIDE: WINDOW_HIDDEN,
+        EVENT_OBJECT_REORDER: WINDOW_REORDERED,
+        EVENT_OBJECT_NAMECHANGE: WINDOW_RENAMED,
+        EVENT_SYSTEM_FOREGROUND: WINDOW_FOREGROUND,
+    }
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._hooks = []
+        from ctypes import wintypes
+        self._proc_type = ctypes.WINFUNCTYPE(
+            None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+            wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD
+        )
+        # Keep a reference to the callback, ctypes does not.
+        self._proc = self._proc_type(self._on_event)
+
+    def start(self):
+        if self._hooks:
+            return
+        user32 = ctypes.windll.user32
+        flags = self.WINEVENT_OUTOFCONTEXT | self.WINEVENT_SKIPOWNPROCESS
+        for first, last in ((self.EVENT_OBJECT_CREATE, self.EVENT_OBJECT_REORDER),
+                            (self.EVENT_OBJECT_NAMECHANGE, self.EVENT_OBJECT_NAMECHANGE),
+                            (self.EVENT_SYSTEM_FOREGROUND, self.EVENT_SYSTEM_FOREGROUND)):
+            hook = user32.SetWinEventHook(first, last, None, self._proc, 0, 0, flags)
+            if hook:
+                self._hooks.append(hook)
+
+    def stop(self):
+        user32 = ctypes.windll.user32
+        for hook in self._hooks:
+            user32.UnhookWinEvent(hook)
+        self._hooks = []
+
+    def _on_event(self, hook, event, hwnd, id_object, id_child, thread_id, timestamp):
+        if id_object != self.OBJID_WINDOW or id_child != self.CHILDID_SELF or not hwnd:
+            return
+        kind = self.EVENT_KINDS.get(event)
+        if kind:
+            self.window_event.emit(kind, hwnd)
+
+def create_window_event_source(parent=None):
+    if sys.platform == "win32":
+        return WinEventHookSource(parent)
+    return None
+
+class ThemeEngine:
+    # Palettes come from *.json theme files; a later directory overrides an
+    # earlier one. Stylesheets are rendered on first use and then cached.
+    def __init__(self, directories):
+        self.directories = directories
+        self.themes = {}
+        self.current = None
+        self.renders = 0
+        self._stylesheets = {}
+
+    def load(self):
+        for directory in self.directories:
+            try:
+                filenames = sorted(os.listdir(directory))
+            except OSError:
+                continue
+            for filename in filenames:
+                name, ext = os.path.splitext(filename)
+                if ext.lower() != ".json":
+                    continue
+                try:
+                    with open(os.path.join(directory, filename), 'r', encoding='utf-8') as f:
+                        theme = json.load(f)
+                    STYLESHEET_TEMPLATE.substitute(theme["palette"])
+                except Exception as e:
+                    metrics.swallowed("theme.load", e)
+                    continue
+                self.themes[name] = theme
+                self._stylesheets.pop(name, None)
+
+    def names(self):
+        return sorted(self.themes, key=lambda name: (self.themes[name].get("order", 100), name))
+
+    def stylesheet(self, name):
+        stylesheet = self._stylesheets.get(name)
+        if stylesheet is None:
+            stylesheet = STYLESHEET_TEMPLATE.substitute(self.themes[name]["palette"])
+            self._stylesheets[name] = stylesheet
+            self.renders += 1
+        return stylesheet
+
+    def apply(self, widget, name):
+        if name == self.current or name not in self.themes:
+            return False
+        widget.setStyleSheet(self.stylesheet(name))
+        self.current = name
+        return True
+
+class TranslationCatalogs:
+    # One <code>.json file per language, found by file name and read the
+    # first time the language is used. A catalog is compiled into a tuple in
+    # TEXT_KEYS order, so a lookup is one index into it; gaps are filled from
+    # the fallback language, then with the key itself.
+    def __init__(self, directories, fallback=FALLBACK_LANGUAGE):
+        self.directories = directories
+        self.fallback = fallback
+        self.loads = 0
+        self._paths = None
+        self._compiled = {}
+
+    def paths(self):
+        if self._paths is None:
+            self._paths = {}
+            for directory in self.directories:
+                try:
+                    filenames = os.listdir(directory)
+                except OSError:
+                    continue
+                for filename in filenames:
+                    code, ext = os.path.splitext(filename)
+                    if ext.lower() == ".json" and code != "languages":
+                        self._paths[code] = os.path.join(directory, filename)
+        return self._paths
+
+    def languages(self):
+        # Display names come from languages.json so listing them does not
+        # open every catalog.
+        names = {}
+        for directory in self.directories:
+            try:
+                with open(os.path.join(directory, "languages.json"), 'r', encoding='utf-8') as f:
+                    names.update(json.load(f))
+            except OSError:
+                pass
+            except Exception as e:
+                metrics.swallowed("i18n.languages", e)
+        return sorted(((code, names.get(code, code)) for code in self.paths()),
+                      key=lambda item: item[1].lower())
+
+    def catalog(self, code):
+        compiled = self._compiled.get(code)
+        if compiled is None:
+            compiled = self._compiled[code] = self._compile(code)
+        return compiled
+
+    def _compile(self, code):
+        texts = {}
+        path = self.paths().get(code)
+        if path is not None:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    texts = json.load(f)
+                self.loads += 1
+            except Exception as e:
+                metrics.swallowed("i18n.load", e)
+        compiled = [texts.get(key) for key in TEXT_KEYS]
+        if None in compiled:
+            fallback = self.catalog(self.fallback) if code != self.fallback else TEXT_KEYS
+            compiled = [text if text is not None else fallback[index]
+                        for index, text in enumerate(compiled)]
+        return tuple(compiled)
+
+class ConfigStore(QObject):
+    # The file is parsed once; later reads come from memory. Changes mark
+    # keys dirty and are flushed after a short delay by a single writer
+    # thread, via a temp file and rename so a crash never leaves half a file.
+    def __init__(self, path, delay_ms=CONFIG_FLUSH_MS, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.writes = 0
+        self._data = {}
+        self._dirty = set()
+        self._written = None
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay_ms)
+        self._timer.timeout.connect(self.flush)
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                text = f.read()
+            data = json.loads(text)
+            if not isinstance(data, dict):
+                raise ValueError("expected an object, got {0}".format(type(data).__name__))
+            self._data = data
+            self._written = json.dumps(self._data, indent=4)
+        except FileNotFoundError:
+            self._data = {}
+        except Exception as e:
+            metrics.swallowed("config.load", e)
+            self._data = {}
+        self._dirty.clear()
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def set(self, key, value):
+        if key in self._data and self._data[key] == value:
+            return
+        self._data[key] = value
+        self._dirty.add(key)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def update(self, values):
+        for key, value in values.items():
+            self.set(key, value)
+
+    @property
+    def dirty_keys(self):
+        return set(self._dirty)
+
+    def flush(self, wait=False):
+        self._timer.stop()
+        if not self._dirty:
+            return
+        self._dirty.clear()
+        text = json.dumps(self._data, indent=4)
+        if text == self._written:
+            return
+        self._written = text
+        if self._closed:
+            self._write(text)
+            return
+        future = self._executor.submit(self._write, text)
+        if wait:
+            future.result()
+
+    def close(self):
+        if self._closed:
+            return
+        self.flush(wait=True)
+        self._closed = True
+        self._executor.shutdown(wait=True)
+
+    def _write(self, text):
+        started = time.perf_counter()
+        try:
+            directory = os.path.dirname(self.path)
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix=".config-", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    f.write(text)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+            self.writes += 1
+            metrics.count("config.writes")
+            metrics.observe_since("config.write_ms", started)
+        except Exception as e:
+            metrics.swallowed("config.write", e)
+
+class PinnedWindow:
+    __slots__ = ("hwnd", "pid", "generation", "pinned_at", "slot")
+
+    def __init__(self, hwnd, pid, generation, pinned_at):
+        self.hwnd = hwnd
+        self.pid = pid
+        self.generation = generation
+        self.pinned_at = pinned_at
+        self.slot = None
+
+class PinnedRegistry:
+    # Holds only windows that are pinned right now. The pid and generation
+    # recorded at pin time let a sweep tell a reused hwnd from the original.
+    def __init__(self):
+        self._records = {}
+        self._generation = 0
+        self.last_pruned = 0
+        self.total_pruned = 0
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, hwnd):
+        return hwnd in self._records
+
+    def __iter__(self):
+        return iter(list(self._records))
+
+    def get(self, hwnd):
+        return self._records.get(hwnd)
+
+    def add(self, hwnd, pid):
+        record = self._records.get(hwnd)
+        if record is not None and record.pid == pid:
+            return record
+        self._generation += 1
+        record = PinnedWindow(hwnd, pid, self._generation, time.monotonic())
+        self._records[hwnd] = record
+        return record
+
+    def discard(self, hwnd):
+        return self._records.pop(hwnd, None) is not None
+
+    def assign_slot(self, hwnd, slot):
+        for record in self._records.values():
+            if record.slot == slot:
+                record.slot = None
+        record = self._records.get(hwnd)
+        if record is not None:
+            record.slot = slot
+
+    def slot_window(self, slot):
+        for hwnd, record in self._records.items():
+            if record.slot == slot:
+                return hwnd
+        return None
+
+    def prune(self, hwnd):
+        if self.discard(hwnd):
+            self.total_pruned += 1
+            metrics.count("pinned.pruned")
+            return True
+        return False
+
+    def sweep(self, backend):
+        dead = []
+        for hwnd, record in self._records.items():
+            try:
+                if not backend.is_window(hwnd) or backend.get_pid(hwnd) != record.pid:
+                    dead.append(hwnd)
+            except Exception as e:
+                metrics.swallowed("pinned.sweep", e)
+                dead.append(hwnd)
+        for hwnd in dead:
+            del self._records[hwnd]
+        self.last_pruned = len(dead)
+        self.total_pruned += len(dead)
+        if dead:
+            metrics.count("pinned.pruned", len(dead))
+        return len(dead)
+
+    def stats(self):
+        return {"pinned": len(self._records), "last_pruned": self.last_pruned,
+                "total_pruned": self.total_pruned}
+
+class TopmostWatchdog(QObject):
+    # Puts pinned windows back on top when their own app drops topmost.
+    # Only pinned hwnds are checked, and only after a z-order or foreground
+    # event or a scan, batched over a short delay. Re-asserts on one window
+    # are spaced out; one that reverts fight_limit times within
+    # fight_window_s is given up on instead of fought over.
+    fight_detected = pyqtSignal(int)
+
+    def __init__(self, backend, pinned, clock=time.monotonic, parent=None):
+        super().__init__(parent)
+        self.backend = backend
+        self.pinned = pinned
+        self.clock = clock
+        self.enabled = True
+        self.fight_limit = TOPMOST_FIGHT_LIMIT
+        self.fight_window = TOPMOST_FIGHT_WINDOW_S
+        self.min_gap = TOPMOST_REASSERT_MIN_MS / 1000
+        self.checks = 0
+        self.reasserts = 0
+        self.fights = 0
+        self.given_up = set()
+        self._history = {}
+        self._dirty = set()
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
+
+    def notify(self, hwnd):
+        # An event on a pinned window checks that window; anything else
+        # (another window coming to the front) checks all of them.
+        if not self.enabled or not len(self.pinned):
+            return
+        if hwnd in self.pinned:
+            self._dirty.add(hwnd)
+        else:
+            self._dirty.update(self.pinned)
+        if not self._timer.isActive():
+            self._timer.start(TOPMOST_CHECK_DELAY_MS)
+
+    def check_all(self):
+        if self.enabled:
+            self._dirty.update(self.pinned)
+            self.flush()
+
+    def reset(self, hwnd):
+        self.given_up.discard(hwnd)
+        self._history.pop(hwnd, None)
+
+    def flush(self):
+        self._timer.stop()
+        dirty, self._dirty = self._dirty, set()
+        for hwnd in [h for h in self._history if h not in self.pinned]:
+            del self._history[hwnd]
+        self.given_up.intersection_update(self.pinned)
+        now = self.clock()
+        retry = None
+        stripped = []
+        for hwnd in dirty:
+            if hwnd not in self.pinned or hwnd in self.given_up:
+                continue
+            self.checks += 1
+            try:
+                if self.backend.get_ex_style(hwnd) & WS_EX_TOPMOST:
+                    continue
+            except Exception as e:
+                metrics.swallowed("topmost.check", e)
+                continue
+            history = self._history.setdefault(hwnd, deque())
+            while history and now - history[0] > self.fight_window:
+                history.popleft()
+            if len(history) >= self.fight_limit:
+                self.given_up.add(hwnd)
+                self.fights += 1
+                metrics.count("topmost.fights")
+                self.fight_detected.emit(hwnd)
+                continue
+            wait = history[-1] + self.min_gap - now if history else 0
+            if wait > 0:
+                self._dirty.add(hwnd)
+                retry = wait if retry is None else min(retry, wait)
+                continue
+            history.append(now)
+            stripped.append(hwnd)
+        metrics.count("topmost.checks", len(dirty))
+        if stripped:
+            try:
+                done = self.backend.set_topmost_many(stripped, True)
+            except Exception as e:
+                metrics.swallowed("topmost.reassert", e)
+                done = []
+            self.reasserts += len(done)
+            metrics.count("topmost.reasserts", len(done))
+        if self._dirty:
+            self._timer.start(int(retry * 1000) + 1 if retry is not None else TOPMOST_CHECK_DELAY_MS)
+
+    def stats(self):
+        return {"checks": self.checks, "reasserts": self.reasserts, "fights": self.fights,
+                "given_up": len(self.given_up)}
+
+class SearchIndex:
+    # Trigram postings over "title process" for every listed window. The
+    # list model feeds it the rows its diff touched, so a keystroke only
+    # intersects the postings of the query's own trigrams.
+    WORD_STARTS = " -_.:/\\([|"
+
+    def __init__(self, describe=None):
+        self.describe = describe
+        self._texts = {}
+        self._postings = {}
+
+    def __len__(self):
+        return len(self._texts)
+
+    @staticmethod
+    def trigrams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def add(self, hwnd, title):
+        text = title.lower()
+        extra = self.describe(hwnd) if self.describe else None
+        if extra:
+            text += " " + extra.lower()
+        old = self._texts.get(hwnd)
+        if old is not None:
+            if old[0] == text:
+                self._texts[hwnd] = (text, title)
+                return
+            self._unindex(hwnd, old[0])
+        self._texts[hwnd] = (text, title)
+        postings = self._postings
+        for gram in self.trigrams(text):
+            posting = postings.get(gram)
+            if posting is None:
+                postings[gram] = {hwnd}
+            else:
+                posting.add(hwnd)
+
+    def discard(self, hwnd):
+        old = self._texts.pop(hwnd, None)
+        if old is not None:
+            self._unindex(hwnd, old[0])
+
+    def _unindex(self, hwnd, text):
+        postings = self._postings
+        for gram in self.trigrams(text):
+            posting = postings.get(gram)
+            if posting is not None:
+                posting.discard(hwnd)
+                if not posting:
+                    del postings[gram]
+
+    def _candidates(self, terms):
+        # None means no term was long enough to narrow anything down.
+        # Postings are intersected smallest first, so a common trigram costs
+        # no more than the rarest one.
+        postings = []
+        for term in terms:
+            for gram in self.trigrams(term):
+                posting = self._postings.get(gram)
+                if not posting:
+                    return set()
+                postings.append(posting)
+        if not postings:
+            return None
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                break
+        return candidates
+
+    def _score(self, text, terms):
+        score = 0
+        for term in terms:
+            pos = text.find(term)
+            if pos < 0:
+                return None
+            if pos and text[pos - 1] not in self.WORD_STARTS:
+                score += 2
+            elif pos:
+                score += 1
+        return score
+
+    def _fuzzy(self, terms):
+        # Nothing contains the query: fall back to matching its letters in
+        # order, ranked by how tightly they sit together. Letters in order
+        # need not share a trigram with the query, so every text is tried.
+        compact = "".join(terms)
+        pattern = re.compile(".*?".join(re.escape(c) for c in compact))
+        hits = []
+        texts = self._texts
+        for hwnd in texts:
+            text = texts[hwnd][0]
+            match = pattern.search(text)
+            if match:
+                hits.append((3 + (match.end() - match.start()) / len(compact), len(text), hwnd))
+        return hits
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        terms = query.lower().split()
+        if not terms:
+            return []
+        texts = self._texts
+        candidates = self._candidates(terms)
+        hits = []
+        for hwnd in (texts if candidates is None else candidates):
+            text = texts[hwnd][0]
+            score = self._score(text, terms)
+            if score is not None:
+                hits.append((score, len(text), hwnd))
+        if not hits:
+            hits = self._fuzzy(terms)
+        return [(hwnd, texts[hwnd][1]) for _, _, hwnd in heapq.nsmallest(limit, hits)]
+
+class Win32IconProvider:
+    # Runs on the icon worker threads, so it only builds QImages; QIcon and
+    # QPixmap are made on the GUI thread.
+    def load(self, exe, hwnd):
+        if QtWin is None:
+            return None
+        if exe:
+            try:
+                large, small = win32gui.ExtractIconEx(exe, 0, 1)
+            except Exception:
+                large, small = [], []
+            try:
+                for hicon in small or large:
+                    return QtWin.imageFromHICON(hicon)
+            finally:
+                for hicon in large + small:
+                    win32gui.DestroyIcon(hicon)
+        # No file icon: ask the window. These handles belong to the window.
+        try:
+            _, hicon = win32gui.SendMessageTimeout(hwnd, WM_GETICON, ICON_SMALL, 0,
+                                                   SMTO_ABORTIFHUNG, TITLE_TIMEOUT_MS)
+            hicon = hicon or win32gui.GetClassLong(hwnd, GCL_HICONSM)
+        except Exception:
+            hicon = 0
+        return QtWin.imageFromHICON(hicon) if hicon else None
+
+class FakeIconProvider:
+    # One solid square per key, colored from the key; counts every fetch.
+    def __init__(self, delay_s=0.0):
+        self.delay_s = delay_s
+        self.fetches = {}
+        self._lock = threading.Lock()
+
+    def load(self, exe, hwnd):
+        key = exe or hwnd
+        with self._lock:
+            self.fetches[key] = self.fetches.get(key, 0) + 1
+        if self.delay_s:
+            time.sleep(self.delay_s)
+        image = QtGui.QImage(ICON_SIZE, ICON_SIZE, QtGui.QImage.Format_ARGB32)
+        image.fill(QtGui.QColor.fromHsv(hash(key) % 360, 160, 200))
+        return image
+
+class PlaceholderIconProvider:
+    # No way to read program icons here (X11, or no QtWinExtras): every
+    # row keeps the placeholder.
+    def load(self, exe, hwnd):
+        return None
+
+def create_icon_provider():
+    if win32gui is not None and QtWin is not None:
+        return Win32IconProvider()
+    return PlaceholderIconProvider()
+
+class IconCache(QObject):
+    # LRU of QIcons keyed by executable path (by hwnd when the process path
+    # is unknown), bounded by the bytes of the images behind them. A miss
+    # returns the placeholder at once and loads the image on a worker;
+    # icon_ready fires when it lands so the view can repaint.
+    icon_ready = pyqtSignal(object)
+    _loaded = pyqtSignal(object, object)
+
+    def __init__(self, provider, placeholder, capacity_kb=ICON_CACHE_KB, parent=None):
+        super().__init__(parent)
+        self.provider = provider
+        self.placeholder = placeholder
+        self.capacity = capacity_kb * 1024
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evicted = 0
+        self._icons = OrderedDict()
+        self._pending = set()
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=ICON_WORKERS)
+        self._loaded.connect(self._on_loaded)
+
+    def __len__(self):
+        return len(self._icons)
+
+    @staticmethod
+    def key(exe, hwnd):
+        return exe.lower() if exe else hwnd
+
+    def icon(self, exe, hwnd):
+        key = self.key(exe, hwnd)
+        entry = self._icons.get(key)
+        if entry is not None:
+            self._icons.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        if key not in self._pending and not self._closed:
+            # A repaint can still ask after close(), e.g. while quitting.
+            self._pending.add(key)
+            future = self._executor.submit(self.provider.load, exe, hwnd)
+            future.add_done_callback(lambda f, key=key: self._loaded.emit(key, f))
+        return self.placeholder
+
+    def _on_loaded(self, key, future):
+        self._pending.discard(key)
+        self.loads += 1
+        try:
+            image = future.result()
+        except Exception as e:
+            metrics.swallowed("icons.load", e)
+            image = None
+        if image is None or image.isNull():
+            # Remember the miss too, or every repaint would fetch again.
+            icon, cost = self.placeholder, 64
+        else:
+            if image.width() > ICON_SIZE or image.height() > ICON_SIZE:
+                image = image.scaled(ICON_SIZE, ICON_SIZE, QtCore.Qt.KeepAspectRatio,
+                                     QtCore.Qt.SmoothTransformation)
+            icon, cost = QtGui.QIcon(QtGui.QPixmap.fromImage(image)), image.byteCount()
+        old = self._icons.pop(key, None)
+        if old is not None:
+            self.size -= old[1]
+        self._icons[key] = (icon, cost)
+        self.size += cost
+        while self.size > self.capacity and len(self._icons) > 1:
+            _, (_, evicted_cost) = self._icons.popitem(last=False)
+            self.size -= evicted_cost
+            self.evicted += 1
+        self.icon_ready.emit(key)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"icons": len(self._icons), "kb": round(self.size / 1024, 1),
+                "capacity_kb": self.capacity // 1024, "loads": self.loads,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evicted": self.evicted}
+
+    def close(self):
+        self._closed = True
+        self._executor.shutdown(wait=False)
+
+def window_fingerprint(process_name, class_name, title):
+    # Survives a restart: numbers in titles (counters, dates) are wildcards.
+    return (process_name, class_name, re.sub(r"\d+", "#", " ".join(title.lower().split())))
+
+class PinJournal:
+    # Pins as an append-only log, one JSON record per line, so a crash loses
+    # at most the line being written. Each pin is a slot: bound to a window
+    # while it is open and pinned, unbound (closed) once the app stops or
+    # the window closes while pinned. Pinning a window with the same
+    # fingerprint takes a closed slot before it adds one, and a closed slot
+    # expires max_age_days after its window was last seen. load() also
+    # keeps the hwnds of the last session if it never logged a clean stop.
+    # Once dead records outnumber live ones, compact() rewrites the file
+    # with only the live slots.
+    def __init__(self, path, max_age_days=PIN_JOURNAL_MAX_AGE_DAYS):
+        self.path = path
+        self.max_age = max_age_days * 86400
+        self.closed = {}
+        self.session = {}
+        self.crashed = False
+        self.records = 0
+        self.compactions = 0
+        self._file = None
+
+    def __len__(self):
+        return len(self.session) + sum(len(times) for times in self.closed.values())
+
+    def counts(self):
+        # fingerprint -> pins to restore, bound or not.
+        counts = {fp: len(times) for fp, times in self.closed.items()}
+        for pid, fp in self.session.values():
+            counts[fp] = counts.get(fp, 0) + 1
+        return counts
+
+    def load(self):
+        self.closed = closed = {}
+        session = {}
+        crashed = False
+        seen = 0
+        self.records = 0
+        try:
+            f = open(self.path, 'r', encoding='utf-8')
+        except OSError:
+            return
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self.records += 1
+                op = record.get("op")
+                # Older journals have no time on stops; the last one seen
+                # is close enough.
+                seen = record.get("t", seen)
+                if op in ("start", "stop"):
+                    # A session that never stopped ends at the next start.
+                    for pid, fp in session.values():
+                        closed.setdefault(fp, []).append(seen)
+                    session = {}
+                    crashed = op == "start"
+                elif op == "unpin":
+                    session.pop(record.get("hwnd"), None)
+                elif op == "closed":
+                    pinned = session.pop(record.get("hwnd"), None)
+                    if pinned is not None:
+                        closed.setdefault(pinned[1], []).append(seen)
+                elif op == "pin":
+                    fp = tuple(record.get("fp") or ())
+                    if len(fp) != 3:
+                        continue
+                    if "hwnd" in record:
+                        self._take_closed(fp)
+                        session[record["hwnd"]] = (record.get("pid"), fp)
+                    else:
+                        closed.setdefault(fp, []).append(seen)
+        self.crashed = crashed
+        self.session = session
+        cutoff = time.time() - self.max_age
+        for fp in list(closed):
+            closed[fp] = [t for t in closed[fp] if t >= cutoff]
+            if not closed[fp]:
+                del closed[fp]
+
+    def clear(self):
+        self.closed = {}
+        self.session = {}
+
+    def begin_session(self, session):
+        # session: hwnd -> (pid, fingerprint) for the pins restored just now.
+        # Whatever a crashed run had pinned and did not get back is closed.
+        now = time.time()
+        for hwnd, entry in self.session.items():
+            if session.get(hwnd) != entry:
+                self.closed.setdefault(entry[1], []).append(now)
+        for hwnd, entry in session.items():
+            if self.session.get(hwnd) != entry:
+                self._take_closed(entry[1])
+        self.session = dict(session)
+        self.crashed = False
+        self.compact()
+
+    def _take_closed(self, fp):
+        times = self.closed.get(fp)
+        if times:
+            times.pop()
+            if not times:
+                del self.closed[fp]
+
+    def record_pin(self, hwnd, pid, fp):
+        if self.session.get(hwnd) == (pid, fp):
+            return
+        if hwnd in self.session:
+            self.record_unpin(hwnd)
+        self._take_closed(fp)
+        self.session[hwnd] = (pid, fp)
+        self._append({"op": "pin", "fp": fp, "hwnd": hwnd, "pid": pid, "t": int(time.time())})
+
+    def record_unpin(self, hwnd):
+        pinned = self.session.pop(hwnd, None)
+        if pinned is None:
+            return
+        pid, fp = pinned
+        self._append({"op": "unpin", "fp": fp, "hwnd": hwnd, "pid": pid})
+
+    def forget(self, hwnd):
+        # The window is gone but its pin stays for the next start, and for
+        # the next window like it.
+        pinned = self.session.pop(hwnd, None)
+        if pinned is None:
+            return
+        now = int(time.time())
+        self.closed.setdefault(pinned[1], []).append(now)
+        self._append({"op": "closed", "fp": pinned[1], "hwnd": hwnd, "t": now})
+
+    def _append(self, record):
+        try:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+            self.records += 1
+        except Exception as e:
+            metrics.swallowed("journal.append", e)
+            return
+        if self.records > max(PIN_JOURNAL_COMPACT_MIN, 4 * (len(self) + 1)):
+            self.compact()
+
+    def _live_records(self):
+        # Bound slots first: on load a bound pin takes a closed slot of its
+        # fingerprint, and these must not.
+        now = int(time.time())
+        cutoff = now - self.max_age
+        records = [{"op": "start", "t": now}]
+        for hwnd, (pid, fp) in self.session.items():
+            records.append({"op": "pin", "fp": fp, "hwnd": hwnd, "pid": pid, "t": now})
+        for fp, times in self.closed.items():
+            for seen in times:
+                if seen >= cutoff:
+                    records.append({"op": "pin", "fp": fp, "t": int(seen)})
+        return records
+
+    def compact(self):
+        records = self._live_records()
+        self.close_file()
+        try:
+            directory = os.path.dirname(self.path)
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix=".pins-", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    for record in records:
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+            self.records = len(records)
+            self.compactions += 1
+        except Exception as e:
+            metrics.swallowed("journal.compact", e)
+
+    def close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        self._append({"op": "stop", "t": int(time.time())})
+        self.close_file()
+
+def plan_pin_restore(journal, windows, process_name, class_name):
+    # One pass over the first scan, one hash lookup per window. Windows a
+    # crashed session left pinned are taken back by hwnd and pid first.
+    # Those that no longer match a live pin are returned as orphans.
+    remaining = journal.counts()
+    restored = {}
+    orphans = []
+    for hwnd, (pid, fp) in journal.session.items():
+        info = windows.get(hwnd)
+        if info is None or info[1] != pid:
+            continue
+        if remaining.get(fp, 0) > 0:
+            restored[hwnd] = (pid, fp)
+            remaining[fp] -= 1
+        else:
+            orphans.append(hwnd)
+    names = {fp[0] for fp, count in remaining.items() if count > 0}
+    if names:
+        for hwnd, (title, pid) in windows.items():
+            if hwnd in restored:
+                continue
+            name = process_name(pid)
+            if name not in names:
+                continue
+            fp = window_fingerprint(name, class_name(hwnd), title)
+            if remaining.get(fp, 0) > 0:
+                restored[hwnd] = (pid, fp)
+                remaining[fp] -= 1
+    return restored, orphans
+
+class WindowListModel(QtCore.QAbstractListModel):
+    pin_toggled = pyqtSignal(int, bool)
+
+    def __init__(self, parent=None, search_index=None, icon_for=None):
+        super().__init__(parent)
+        self.search_index = search_index
+        self.icon_for = icon_for
+        self._rows = []
+        self._rows_by_hwnd = {}
+        self.last_ops = {"inserted": 0, "removed": 0, "changed": 0}
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        hwnd, title, pinned = self._rows[index.row()]
+        if role == QtCore.Qt.DisplayRole:
+            return title
+        if role == QtCore.Qt.CheckStateRole:
+            return QtCore.Qt.Checked if pinned else QtCore.Qt.Unchecked
+        if role == QtCore.Qt.UserRole:
+            return hwnd
+        if role == QtCore.Qt.DecorationRole and self.icon_for is not None:
+            return self.icon_for(hwnd)
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return QtCore.Qt.NoItemFlags
+        return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsUserCheckable
+
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        if not index.isValid() or role != QtCore.Qt.CheckStateRole:
+            return False
+        row = self._rows[index.row()]
+        checked = value == QtCore.Qt.Checked
+        if row[2] == checked:
+            return False
+        row[2] = checked
+        self.dataChanged.emit(index, index, [QtCore.Qt.CheckStateRole])
+        self.pin_toggled.emit(row[0], checked)
+        return True
+
+    def set_pinned(self, hwnd, pinned):
+        row = self._rows_by_hwnd.get(hwnd)
+        if row is None or self._rows[row][2] == pinned:
+            return
+        self._rows[row][2] = pinned
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [QtCore.Qt.CheckStateRole])
+
+    def set_rows(self, windows, pinned):
+        self.beginResetModel()
+        self._rows = [[hwnd, title, hwnd in pinned] for hwnd, title in windows]
+        self._rows_by_hwnd = {r[0]: i for i, r in enumerate(self._rows)}
+        self.endResetModel()
+
+    def apply_snapshot(self, windows, pinned):
+        # Diff against the rows we already show so that only inserted,
+        # removed, retitled or re-pinned rows are touched.
+        ops = {"inserted": 0, "removed": 0, "changed": 0}
+        titles = dict(windows)
+        index_rows = self.search_index
+
+        row = len(self._rows) - 1
+        while row >= 0:
+            if self._rows[row][0] in titles:
+                row -= 1
+                continue
+            last = row
+            while row >= 0 and self._rows[row][0] not in titles:
+                if index_rows is not None:
+                    index_rows.discard(self._rows[row][0])
+                row -= 1
+            self.beginRemoveRows(QtCore.QModelIndex(), row + 1, last)
+            del self._rows[row + 1:last + 1]
+            self.endRemoveRows()
+            ops["removed"] += last - row
+        if ops["removed"]:
+            self._rows_by_hwnd = {r[0]: i for i, r in enumerate(self._rows)}
+
+        for i, r in enumerate(self._rows):
+            title = titles[r[0]]
+            is_pinned = r[0] in pinned
+            if r[1] != title or r[2] != is_pinned:
+                if index_rows is not None and r[1] != title:
+                    index_rows.add(r[0], title)
+                r[1] = title
+                r[2] = is_pinned
+                index = self.index(i)
+                self.dataChanged.emit(index, index)
+                ops["changed"] += 1
+
+        added = [[hwnd, title, hwnd in pinned]
+                 for hwnd, title in windows if hwnd not in self._rows_by_hwnd]
+        if added:
+            first = len(self._rows)
+            self.beginInsertRows(QtCore.QModelIndex(), first, first + len(added) - 1)
+            for offset, r in enumerate(added):
+                self._rows.append(r)
+                self._rows_by_hwnd[r[0]] = first + offset
+                if index_rows is not None:
+                    index_rows.add(r[0], r[1])
+            self.endInsertRows()
+            ops["inserted"] = len(added)
+
+        self.last_ops = ops
+        return ops
+
+MOD_ALT = 0x0001
+MOD_CONTROL = 0x0002
+MOD_SHIFT = 0x0004
+MOD_WIN = 0x0008
+MOD_NOREPEAT = 0x4000
+WM_HOTKEY = 0x0312
+SEQUENCE_TIMEOUT_MS = 1500
+
+HOTKEY_ACTION_RE = re.compile(
+    r"^(?:pin|unpin|toggle_pin|unpin_all|cycle_pinned|(?:pin_slot|focus_slot):[1-9])$"
+)
+
+MODIFIER_KEYS = {
+    "ctrl": MOD_CONTROL, "control": MOD_CONTROL, "left ctrl": MOD_CONTROL, "right ctrl": MOD_CONTROL,
+    "shift": MOD_SHIFT, "left shift": MOD_SHIFT, "right shift": MOD_SHIFT,
+    "alt": MOD_ALT, "left alt": MOD_ALT, "right alt": MOD_ALT, "alt gr": MOD_ALT,
+    "win": MOD_WIN, "windows": MOD_WIN, "left windows": MOD_WIN, "right windows": MOD_WIN,
+    "cmd": MOD_WIN, "super": MOD_WIN,
+}
+MODIFIER_NAMES = ((MOD_CONTROL, "ctrl"), (MOD_SHIFT, "shift"), (MOD_ALT, "alt"), (MOD_WIN, "win"))
+
+KEY_CODES = {
+    "space": 0x20, "enter": 0x0D, "tab": 0x09, "esc": 0x1B, "backspace": 0x08,
+    "insert": 0x2D, "delete": 0x2E, "home": 0x24, "end": 0x23,
+    "page up": 0x21, "page down": 0x22, "left": 0x25, "up": 0x26, "right": 0x27, "down": 0x28,
+    "print screen": 0x2C, "pause": 0x13, "caps lock": 0x14,
+    "plus": 0xBB, "comma": 0xBC, "minus": 0xBD, "period": 0xBE,
+    ";": 0xBA, "=": 0xBB, "-": 0xBD, ".": 0xBE, "/": 0xBF, "`": 0xC0,
+    "[": 0xDB, "\\": 0xDC, "]": 0xDD, "'": 0xDE,
+}
+KEY_CODES.update({chr(c): c for c in range(ord("0"), ord("9") + 1)})
+KEY_CODES.update({chr(c).lower(): c for c in range(ord("A"), ord("Z") + 1)})
+KEY_CODES.update({"f{0}".format(n): 0x6F + n for n in range(1, 25)})
+
+KEY_ALIASES = {
+    "escape": "esc", "return": "enter", "del": "delete", "ins": "insert",
+    "pgup": "page up", "pageup": "page up", "pgdn": "page down", "pagedown": "page down",
+    "spacebar": "space", "prtsc": "print screen", ",": "comma",
+}
+
+class Hotkey(namedtuple("Hotkey", "modifiers key")):
+    __slots__ = ()
+
+    def __str__(self):
+        names = [name for flag, name in MODIFIER_NAMES if self.modifiers & flag]
+        return "+".join(names + [self.key])
+
+    @property
+    def vk(self):
+        return KEY_CODES[self.key]
+
+def normalize_key(name):
+    name = " ".join(name.strip().lower().split())
+    return KEY_ALIASES.get(name, name)
+
+def parse_hotkey(text):
+    parts = [part.strip() for part in text.strip().lower().split("+")]
+    if not text.strip() or any(not part for part in parts):
+        raise ValueError(text)
+    modifiers = 0
+    key = None
+    for part in parts:
+        name = normalize_key(part)
+        flag = MODIFIER_KEYS.get(name)
+        if flag:
+            if modifiers & flag:
+                raise ValueError(text)
+            modifiers |= flag
+        elif key is None and name in KEY_CODES:
+            key = name
+        else:
+            raise ValueError(text)
+    if key is None:
+        raise ValueError(text)
+    return Hotkey(modifiers, key)
+
+def parse_hotkey_sequence(text):
+    return [parse_hotkey(step) for step in text.split(",")]
+
+def compile_bindings(bindings):
+    # Builds a trie of Hotkey steps; inner nodes are dicts, leaves are action
+    # names. Entries that don't parse, name an unknown action, or clash with
+    # an earlier binding are skipped and returned in `rejected`.
+    root = {}
+    rejected = []
+    for text, action in bindings:
+        try:
+            steps = parse_hotkey_sequence(text)
+        except (ValueError, AttributeError):
+            rejected.append((text, action))
+            continue
+        if not isinstance(action, str) or not HOTKEY_ACTION_RE.match(action):
+            rejected.append((text, action))
+            continue
+        node = root
+        for step in steps[:-1]:
+            child = node.setdefault(step, {})
+            if not isinstance(child, dict):
+                node = None
+                break
+            node = child
+        if node is None or steps[-1] in node:
+            rejected.append((text, action))
+            continue
+        node[steps[-1]] = action
+    return root, rejected
+
+class HotkeyMatcher:
+    # Walks the compiled binding trie one key press at a time, so the cost
+    # per keystroke is a dict lookup no matter how many bindings exist.
+    def __init__(self, bindings=None):
+        self._root = bindings or {}
+        self._node = self._root
+        self._modifiers = 0
+
+    def set_bindings(self, bindings):
+        self._root = bindings
+        self._node = bindings
+        self._modifiers = 0
+
+    def clear(self):
+        self.set_bindings({})
+
+    @property
+    def pending(self):
+        return self._node is not self._root
+
+    def pending_steps(self):
+        return list(self._node) if self.pending else []
+
+    def reset(self):
+        self._node = self._root
+
+    def press(self, step):
+        target = self._node.get(step)
+        if target is None and self._node is not self._root:
+            self._node = self._root
+            target = self._root.get(step)
+        if target is None:
+            return None
+        if isinstance(target, dict):
+            self._node = target
+            return None
+        self._node = self._root
+        return target
+
+    def feed(self, key, down):
+        flag = MODIFIER_KEYS.get(key)
+        if flag:
+            if down:
+                self._modifiers |= flag
+            else:
+                self._modifiers &= ~flag
+            return None
+        if not down:
+            return None
+        if key not in KEY_CODES:
+            key = normalize_key(key)
+        return self.press((self._modifiers, key))
+
+class MatcherHotkeyEngine(QObject):
+    # Matches key events in Python against the binding trie; tests drive it
+    # with synthetic streams through feed(). The other engines build on it
+    # and only change where key presses come from.
+    activated = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.matcher = HotkeyMatcher()
+        self.event_time = 0.0
+        self._sequence_timer = QtCore.QTimer(self)
+        self._sequence_timer.setSingleShot(True)
+        self._sequence_timer.setInterval(SEQUENCE_TIMEOUT_MS)
+        self._sequence_timer.timeout.connect(self.cancel_sequence)
+
+    def set_bindings(self, bindings, required=()):
+        # Returns the first steps that could not be registered; nothing can
+        # fail here.
+        self.matcher.set_bindings(bindings)
+        return []
+
+    def unregister_all(self):
+        self.matcher.clear()
+
+    def cancel_sequence(self):
+        self.matcher.reset()
+
+    def feed(self, key, down, event_time=None):
+        self.event_time = event_time or time.perf_counter()
+        action = self.matcher.feed(key, down)
+        if action or down:
+            self._dispatch(action)
+
+    def _dispatch(self, action):
+        if action:
+            self._sequence_timer.stop()
+            self.activated.emit(action)
+        elif self.matcher.pending:
+            self._sequence_timer.start()
+
+class KeyboardHookEngine(MatcherHotkeyEngine):
+    # Fallback for platforms without registered hotkeys: one `keyboard` hook
+    # feeding the matcher, installed only while something is bound.
+    hook_event = pyqtSignal(str, bool, float)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._hook = None
+        self.hook_event.connect(self.feed)
+
+    def set_bindings(self, bindings, required=()):
+        skipped = super().set_bindings(bindings, required)
+        if self._hook is None and bindings:
+            self._hook = keyboard.hook(self._on_key_event)
+        return skipped
+
+    def unregister_all(self):
+        super().unregister_all()
+        if self._hook is not None:
+            keyboard.unhook(self._hook)
+            self._hook = None
+
+    def _on_key_event(self, event):
+        if event.name:
+            self.hook_event.emit(event.name.lower(), event.event_type == keyboard.KEY_DOWN,
+                                 time.perf_counter())
+
+class _HotkeyMessageFilter(QtCore.QAbstractNativeEventFilter):
+    def __init__(self, callback):
+        super().__init__()
+        self.callback = callback
+
+    def nativeEventFilter(self, event_type, message):
+        if event_type == b"windows_generic_MSG":
+            from ctypes import wintypes
+            msg = wintypes.MSG.from_address(int(message))
+            if msg.message == WM_HOTKEY:
+                self.callback(msg.wParam)
+                return True, 0
+        return False, 0
+
+class NativeHotkeyEngine(MatcherHotkeyEngine):
+    # RegisterHotKey lets Windows match the chords, so no keystroke reaches
+    # Python unless it is one of ours. Only the first step of each sequence
+    # stays registered; follow-up steps are registered while a sequence is
+    # pending and dropped again when it completes or times out.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._steps = {}
+        self._ids = {}
+        self._pending_ids = []
+        self._next_id = 1
+        self._filter = _HotkeyMessageFilter(self._on_hotkey)
+        QtCore.QCoreApplication.instance().installNativeEventFilter(self._filter)
+
+    def set_bindings(self, bindings, required=()):
+        # Each chord is registered on its own: one that another program
+        # already owns is dropped from the trie and returned, and only a
+        # failure among `required` unregisters everything and raises.
+        self.unregister_all()
+        bindings = dict(bindings)
+        skipped = [step for step in list(bindings) if not self._register(step)]
+        for step in skipped:
+            del bindings[step]
+        self.matcher.set_bindings(bindings)
+        fatal = [str(step) for step in skipped if step in required]
+        if fatal:
+            self.unregister_all()
+            raise OSError(", ".join(fatal))
+        return skipped
+
+    def unregister_all(self):
+        self._sequence_timer.stop()
+        for hotkey_id in self._steps:
+            ctypes.windll.user32.UnregisterHotKey(None, hotkey_id)
+        self._steps = {}
+        self._ids = {}
+        self._pending_ids = []
+        self.matcher.clear()
+
+    def cancel_sequence(self):
+        super().cancel_sequence()
+        self._release_pending()
+
+    def _register(self, step):
+        hotkey_id = self._next_id
+        if not ctypes.windll.user32.RegisterHotKey(None, hotkey_id,
+                                                   step.modifiers | MOD_NOREPEAT, step.vk):
+            return None
+        self._next_id += 1
+        self._steps[hotkey_id] = step
+        self._ids[step] = hotkey_id
+        return hotkey_id
+
+    def _release_pending(self):
+        for hotkey_id in self._pending_ids:
+            ctypes.windll.user32.UnregisterHotKey(None, hotkey_id)
+            del self._ids[self._steps.pop(hotkey_id)]
+        self._pending_ids = []
+
+    def _on_hotkey(self, hotkey_id):
+        step = self._steps.get(hotkey_id)
+        if step is None:
+            return
+        self.event_time = time.perf_counter()
+        action = self.matcher.press(step)
+        self._release_pending()
+        if self.matcher.pending:
+            for next_step in self.matcher.pending_steps():
+                if next_step not in self._ids:
+                    pending_id = self._register(next_step)
+                    if pending_id:
+                        self._pending_ids.append(pending_id)
+        self._dispatch(action)
+
+def create_hotkey_engine(parent=None):
+    if sys.platform == "win32":
+        return NativeHotkeyEngine(parent)
+    if keyboard is not None:
+        return KeyboardHookEngine(parent)
+    return MatcherHotkeyEngine(parent)
+
+class HotkeySignals(QObject):
+    pin_signal = pyqtSignal()
+    unpin_signal = pyqtSignal()
+
+def process_basename(path):
+    return re.split(r"[\\/]", path or "")[-1].lower()
+
+def command_address():
+    if sys.platform == "win32":
+        return r"\\.\pipe\AOT_AlwaysOnTop-" + getpass.getuser()
+    # A directory only this user can write to, so nobody else can take
+    # the name first or swap the socket.
+    directory = os.environ.get("XDG_RUNTIME_DIR")
+    if not directory or not os.path.isdir(directory):
+        directory = os.path.join(tempfile.gettempdir(), "aot-alwaysontop-{0}".format(getpass.getuser()))
+    return os.path.join(directory, "aot-alwaysontop.sock")
+
+def private_directory(path):
+    os.makedirs(path, 0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o022:
+        raise PermissionError("{0} is not a directory only this user can write to".format(path))
+
+def send_commands(commands, address=None, timeout=5.0):
+    with Client(address or command_address()) as conn:
+        conn.send_bytes(json.dumps(commands).encode("utf-8"))
+        if not conn.poll(timeout):
+            raise TimeoutError("no reply from AOT - AlwaysOnTop")
+        return json.loads(conn.recv_bytes().decode("utf-8"))
+
+class ProcessInfo:
+    __slots__ = ("exe", "name", "started", "checked")
+
+    def __init__(self, exe, name, started, checked):
+        self.exe = exe
+        self.name = name
+        self.started = started
+        self.checked = checked
+
+class ProcessInfoCache:
+    # Bounded LRU of pid -> exe path, name and start time. An entry is
+    # re-checked against the process start time once per scan generation,
+    # which catches a pid the OS handed to a new process; pids that are
+    # gone after a scan are dropped by retain(). Shared with the command
+    # server threads, hence the lock.
+    def __init__(self, backend, capacity=PROCESS_CACHE_SIZE):
+        self.backend = backend
+        self.capacity = capacity
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.reused = 0
+        self.evicted = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def begin_scan(self):
+        self.generation += 1
+
+    def info(self, pid):
+        with self._lock:
+            entry = self._entries.get(pid)
+            if entry is not None:
+                self._entries.move_to_end(pid)
+                if entry.checked == self.generation:
+                    self.hits += 1
+                    return entry
+        if entry is not None:
+            try:
+                started = self.backend.get_process_start_time(pid)
+            except Exception as e:
+                metrics.swallowed("process.start_time", e)
+                started = None
+            if started == entry.started:
+                entry.checked = self.generation
+                self.hits += 1
+                return entry
+            self.reused += 1
+        self.misses += 1
+        entry = self._resolve(pid)
+        with self._lock:
+            self._entries[pid] = entry
+            self._entries.move_to_end(pid)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+        return entry
+
+    def _resolve(self, pid):
+        backend = self.backend
+        try:
+            started = backend.get_process_start_time(pid)
+            exe = backend.get_process_path(pid) or ""
+        except Exception as e:
+            metrics.swallowed("process.info", e)
+            started, exe = None, ""
+        return ProcessInfo(exe, process_basename(exe), started, self.generation)
+
+    def name(self, pid):
+        return self.info(pid).name
+
+    def retain(self, pids):
+        alive = set(pids)
+        with self._lock:
+            for pid in [p for p in self._entries if p not in alive]:
+                del self._entries[pid]
+
+    def stats(self):
+        return {"size": len(self._entries), "capacity": self.capacity,
+                "hit_rate": round(self.hit_rate, 3), "reused": self.reused,
+                "evicted": self.evicted}
+
+LEADING_FLAGS_RE = re.compile(r"^\(\?([aiLmsux]+)\)")
+# Named groups, backreferences, conditionals and global flags change
+# meaning (or fail to compile) once a pattern is one branch of many.
+UNSHAREABLE_RE = re.compile(r"\(\?P[<=]|\\[1-9]|\(\?\(|\(\?[aiLmsux]+\)")
+
+class AutoPinRules:
+    # Rules are {"title": ...}, {"process": ...} or both (both must match).
+    # A title wrapped in slashes is a regex, anything else a literal
+    # substring. Title-only rules share one alternation, process-only rules
+    # a set, and combined rules one alternation per process name. A regex
+    # that cannot be a branch of an alternation gets its own pattern.
+    def __init__(self, rules):
+        self.rejected = []
+        self.count = 0
+        self.processes = set()
+        titles = []
+        process_titles = {}
+        for rule in rules:
+            try:
+                title = rule.get("title")
+                process = rule.get("process")
+                pattern = None
+                if title:
+                    if len(title) > 1 and title.startswith("/") and title.endswith("/"):
+                        pattern = self._scope_flags(title[1:-1])
+                    else:
+                        pattern = re.escape(title)
+                    re.compile(pattern, re.IGNORECASE)
+                if not pattern and not process:
+                    raise ValueError(rule)
+            except (AttributeError, TypeError, ValueError, re.error):
+                self.rejected.append(rule)
+                continue
+            if process and pattern:
+                process_titles.setdefault(process.lower(), []).append((rule, pattern))
+            elif process:
+                self.processes.add(process.lower())
+            else:
+                titles.append((rule, pattern))
+            self.count += 1
+        self.title_res = self._merge(titles)
+        self.process_titles = {name: self._merge(patterns) for name, patterns in process_titles.items()}
+        self.needs_process = bool(self.processes or self.process_titles)
+
+    def __bool__(self):
+        return bool(self.title_res or self.needs_process)
+
+    @staticmethod
+    def _scope_flags(pattern):
+        # "(?i)zoom" must be the start of the whole expression; "(?i:zoom)"
+        # means the same and works anywhere.
+        match = LEADING_FLAGS_RE.match(pattern)
+        if match:
+            pattern = "(?{0}:{1})".format(match.group(1), pattern[match.end():])
+        return pattern
+
+    @staticmethod
+    def _join(patterns):
+        return re.compile("|".join("(?:{0})".format(p) for p in patterns), re.IGNORECASE)
+
+    def _merge(self, patterns):
+        # Returns the compiled patterns to try in turn: one alternation of
+        # every shareable pattern, then the rest one by one.
+        shared = []
+        separate = []
+        for rule, pattern in patterns:
+            if UNSHAREABLE_RE.search(pattern):
+                separate.append(re.compile(pattern, re.IGNORECASE))
+            else:
+                shared.append((rule, pattern))
+        if not shared:
+            return separate
+        try:
+            return [self._join(p for _, p in shared)] + separate
+        except re.error:
+            pass
+        # Something slipped past the checks above: grow the alternation one
+        # pattern at a time and drop the rules that break it.
+        merged = []
+        for rule, pattern in shared:
+            try:
+                self._join(merged + [pattern])
+            except re.error:
+                self.rejected.append(rule)
+                self.count -= 1
+                continue
+            merged.append(pattern)
+        return ([self._join(merged)] if merged else []) + separate
+
+    def matches(self, title, process=""):
+        for title_re in self.title_res:
+            if title_re.search(title):
+                return True
+        if process:
+            if process in self.processes:
+                return True
+            for title_re in self.process_titles.get(process, ()):
+                if title_re.search(title):
+                    return True
+        return False
+
+class AutoPinEngine:
+    # Evaluated only for new windows and title changes. A window is pinned
+    # by a rule at most once, so unpinning it by hand sticks.
+    def __init__(self, rules, process_names):
+        self.rules = AutoPinRules(rules)
+        self.process_names = process_names
+        self.evaluations = 0
+        self.matched = 0
+        self.total_time = 0.0
+        self._applied = set()
+        for rule in self.rules.rejected:
+            metrics.swallowed("auto_pin.rejected", ValueError(json.dumps(rule)))
+
+    @property
+    def cost_per_event_us(self):
+        if not self.evaluations:
+            return 0.0
+        return self.total_time / self.evaluations * 1e6
+
+    def check(self, hwnd, title, pid):
+        if not self.rules or hwnd in self._applied:
+            return False
+        started = time.perf_counter()
+        process = self.process_names.name(pid) if self.rules.needs_process else ""
+        hit = self.rules.matches(title, process)
+        elapsed = time.perf_counter() - started
+        self.total_time += elapsed
+        self.evaluations += 1
+        metrics.observe("auto_pin.check_us", elapsed * 1e6)
+        if hit:
+            self.matched += 1
+            self._applied.add(hwnd)
+        return hit
+
+    def forget(self, hwnd):
+        self._applied.discard(hwnd)
+
+    def retain(self, hwnds):
+        self._applied.intersection_update(hwnds)
+
+    def stats(self):
+        return {"rules": self.rules.count, "rejected": len(self.rules.rejected),
+                "evaluations": self.evaluations, "matched": self.matched,
+                "cost_per_event_us": round(self.cost_per_event_us, 3)}
+
+class CommandServer(QObject):
+    # Serves JSON commands on a local socket / named pipe. Each request is a
+    # command object or a list of them. Lookups run on the server threads
+    # against the last published window index; only the pin changes hop to
+    # the GUI thread, once per request. unpin-all is resolved there too,
+    # against the live pinned set, and the index is re-published after
+    # every change.
+    mutations_requested = pyqtSignal(object, object)
+
+    def __init__(self, process_names, apply_mutations, address=None, parent=None, status=None):
+        super().__init__(parent)
+        self.process_names = process_names
+        # Callable returning the app's component stats for "status".
+        self.status = status
+        self.address = address or command_address()
+        self.requests = 0
+        self.commands = 0
+        self._apply_mutations = apply_mutations
+        self._index = ((), frozenset())
+        self._listener = None
+        self._running = False
+        self.mutations_requested.connect(self._on_mutations_requested)
+
+    def publish(self, windows, pinned):
+        self._index = (tuple(windows), frozenset(pinned))
+
+    def start(self):
+        if self._running:
+            return True
+        if sys.platform != "win32":
+            try:
+                private_directory(os.path.dirname(self.address))
+                if os.path.exists(self.address):
+                    try:
+                        Client(self.address).close()
+                        return False
+                    except OSError:
+                        # Left behind by an instance that crashed.
+                        os.unlink(self.address)
+            except OSError as e:
+                metrics.swallowed("commands.start", e)
+                return False
+        try:
+            self._listener = Listener(self.address)
+        except OSError as e:
+            metrics.swallowed("commands.start", e)
+            return False
+        self._running = True
+        threading.Thread(target=self._serve, name="aot-command-server", daemon=True).start()
+        return True
+
+    def stop(self):
+        if not self._running:
+            return
+        self._running = False
+        try:
+            # Wake up the blocking accept() so the serve thread can exit.
+            Client(self.address).close()
+        except OSError:
+            pass
+        self._listener.close()
+
+    def _serve(self):
+        while self._running:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                break
+            if not self._running:
+                conn.close()
+                break
+            threading.Thread(target=self._handle_connection, args=(conn,), daemon=True).start()
+
+    def _handle_connection(self, conn):
+        try:
+            while True:
+                payload = conn.recv_bytes()
+                try:
+                    reply = self.handle(json.loads(payload.decode("utf-8")))
+                except ValueError as e:
+                    reply = {"ok": False, "error": str(e)}
+                conn.send_bytes(json.dumps(reply).encode("utf-8"))
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def handle(self, request):
+        self.requests += 1
+        batch = isinstance(request, list)
+        commands = request if batch else [request]
+        windows, pinned = self._index
+        replies = []
+        mutations = []
+        for command in commands:
+            self.commands += 1
+            reply = self._handle_command(command, windows, pinned, mutations)
+            replies.append(reply)
+        if mutations:
+            results = self._run_on_gui_thread(mutations)
+            for reply, result in zip((r for r in replies if "pending" in r), results):
+                del reply["pending"]
+                reply.setdefault("matched", result)
+                reply["changed"] = result
+        return replies if batch else replies[0]
+
+    def _handle_command(self, command, windows, pinned, mutations):
+        if not isinstance(command, dict):
+            return {"ok": False, "error": "command must be an object"}
+        cmd = command.get("cmd")
+        if cmd == "status":
+            reply = {"ok": True, "windows": len(windows), "pinned": len(pinned),
+                     "requests": self.requests, "commands": self.commands,
+                     "process_cache": self.process_names.stats()}
+            if self.status is not None:
+                reply.update(self.status())
+            return reply
+        if cmd == "metrics":
+            return {"ok": True, "metrics": metrics.snapshot()}
+        if cmd == "list":
+            matched = self._match(command, windows)
+            return {"ok": True, "windows": [
+                {"hwnd": hwnd, "title": title, "pid": pid, "pinned": hwnd in pinned}
+                for hwnd, title, pid in matched
+            ]}
+        if cmd == "unpin-all":
+            mutations.append(("unpin-all", None))
+            return {"ok": True, "pending": True}
+        if cmd in ("pin", "unpin"):
+            if not any(key in command for key in ("title", "pid", "process", "hwnd")):
+                return {"ok": False, "error": "pin/unpin needs title, pid, process or hwnd"}
+            hwnds = [hwnd for hwnd, _, _ in self._match(command, windows)]
+            mutations.append((cmd, hwnds))
+            return {"ok": True, "matched": len(hwnds), "pending": True}
+        return {"ok": False, "error": "unknown command: {0}".format(cmd)}
+
+    def _match(self, command, windows):
+        title = command.get("title")
+        if title is not None:
+            title = str(title).lower()
+            windows = [w for w in windows if title in w[1].lower()]
+        if "pid" in command:
+            windows = [w for w in windows if w[2] == command["pid"]]
+        if "hwnd" in command:
+            windows = [w for w in windows if w[0] == command["hwnd"]]
+        process = command.get("process")
+        if process is not None:
+            process = str(process).lower()
+            windows = [w for w in windows if self.process_names.name(w[2]) == process]
+        return windows
+
+    def _run_on_gui_thread(self, mutations):
+        future = Future()
+        self.mutations_requested.emit(mutations, future)
+        try:
+            return future.result(timeout=COMMAND_TIMEOUT_S)
+        except Exception as e:
+            metrics.swallowed("commands.mutations", e)
+            return [0] * len(mutations)
+
+    def _on_mutations_requested(self, mutations, future):
+        try:
+            future.set_result(self._apply_mutations(mutations))
+        except Exception as e:
+            future.set_exception(e)
+
+def run_command_client(argv):
+    parser = argparse.ArgumentParser(prog="main.py ctl")
+    parser.add_argument("cmd", nargs="?", choices=["pin", "unpin", "list", "unpin-all", "status", "metrics"])
+    parser.add_argument("--title")
+    parser.add_argument("--pid", type=int)
+    parser.add_argument("--process")
+    parser.add_argument("--batch", help="JSON file with a list of commands, - for stdin")
+    args = parser.parse_args(argv)
+    if args.batch:
+        with (sys.stdin if args.batch == "-" else open(args.batch, 'r')) as f:
+            request = json.load(f)
+    elif args.cmd:
+        request = {"cmd": args.cmd}
+        for key in ("title", "pid", "process"):
+            if getattr(args, key) is not None:
+                request[key] = getattr(args, key)
+    else:
+        parser.error("a command or --batch is required")
+    try:
+        reply = send_commands(request)
+    except (OSError, TimeoutError) as e:
+        print("AOT - AlwaysOnTop is not running: {0}".format(e), file=sys.stderr)
+        return 1
+    print(json.dumps(reply, indent=2, ensure_ascii=False))
+    replies = reply if isinstance(reply, list) else [reply]
+    return 0 if all(r.get("ok") for r in replies) else 1
+
+BENCHMARK_SIZES = "100,1000,10000"
+BENCHMARK_THRESHOLD = 0.25
+BENCHMARK_X11_CLIENTS = 500
+BENCHMARK_KEY_EVENTS = 1000000
+TRACE_VERSION = 1
+
+def time_best(func, repeat, counter, setup=None):
+    # Best of repeat runs, and how far counter() moved in the last run
+    # (backend calls, files read); counts do not depend on the machine, so
+    # they catch regressions that timing noise hides.
+    best = None
+    calls = 0
+    for _ in range(repeat):
+        if setup:
+            setup()
+        before = counter()
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        calls = counter() - before
+        if best is None or elapsed < best:
+            best = elapsed
+    return {"ms": round(best * 1000, 3), "calls": calls}
+
+def benchmark_window_list(count, repeat=5, latency_us=0):
+    # Drives a real PinApp, as a trace replay does. The scan thread is
+    # stopped and its scan slot called here, so a refresh is enumeration
+    # plus on_scan_finished; pins go through toggle_pin and
+    # unpin_all_windows, with the list refresh they queue flushed by hand.
+    desktop = SimulatedDesktop(seed=count, latency_us=latency_us)
+    desktop.populate(count)
+    config_dir = tempfile.mkdtemp(prefix="aot-bench-")
+    app = simulated_app(desktop, config_dir)
+    try:
+        scanner = app.window_scanner
+        scanner.thread.quit()
+        scanner.thread.wait()
+        app.scan_scheduler.set_visible(True)
+        app.refresh_scheduler.manual = True
+        cache = app.window_cache
+        search_index = app.search_index
+
+        def refresh():
+            scanner.worker.scan(scanner.generation)
+
+        refresh()
+        hwnds = list(app.window_tracker.windows)
+
+        def toggle_pins():
+            for checked in (True, False):
+                for hwnd in hwnds[:100]:
+                    app.toggle_pin(hwnd, checked)
+            app.refresh_scheduler.flush()
+
+        def pin_all():
+            app.set_pinned_many(hwnds, True)
+            app.refresh_scheduler.flush()
+
+        def unpin_all():
+            app.unpin_all_windows()
+            app.refresh_scheduler.flush()
+
+        processes = app.process_names
+
+        def per_window_uncached():
+            for hwnd, title, pid in enum_taskbar_windows(cache):
+                process_basename(desktop.get_process_path(pid))
+                desktop.get_process_start_time(pid)
+                cache.class_name(hwnd)
+
+        def per_window_cached():
+            processes.begin_scan()
+            for hwnd, title, pid in enum_taskbar_windows(cache):
+                processes.name(pid)
+                cache.class_name(hwnd)
+
+        churn = lambda: desktop.churn(renames=max(1, count // 50))
+        calls = lambda: desktop.calls
+        return {
+            "get_taskbar_windows": time_best(lambda: get_taskbar_windows(cache=cache), repeat, calls),
+            "get_taskbar_windows_cold": time_best(
+                lambda: get_taskbar_windows(cache=WindowAttributeCache(desktop)), repeat, calls),
+            "refresh_window_list": time_best(refresh, repeat, calls, churn),
+            "toggle_pin_x100": time_best(toggle_pins, repeat, calls),
+            "unpin_all": time_best(unpin_all, repeat, calls, pin_all),
+            "search_short": time_best(lambda: search_index.search("ap"), repeat, calls),
+            "search_terms": time_best(lambda: search_index.search("document 4 app1"), repeat, calls),
+            "search_fuzzy": time_best(lambda: search_index.search("dcmnt app"), repeat, calls),
+            "per_window_uncached": time_best(per_window_uncached, repeat, calls),
+            "per_window_cached": time_best(per_window_cached, repeat, calls),
+        }
+    finally:
+        app.quit_app()
+        shutil.rmtree(config_dir, ignore_errors=True)
+
+def benchmark_scan_gaps(count=1000, repeat=5, latency_us=20):
+    # The longest the GUI thread goes without turning its event loop while
+    # a scan of a slow desktop runs on the worker, on_scan_finished
+    # included; "calls" are the scan's backend calls.
+    desktop = SimulatedDesktop(seed=count, latency_us=latency_us)
+    desktop.populate(count)
+    config_dir = tempfile.mkdtemp(prefix="aot-bench-")
+    app = simulated_app(desktop, config_dir)
+    qt = QtCore.QCoreApplication.instance()
+    done = []
+    try:
+        app.window_scanner.scan_finished.connect(done.append)
+        best = None
+        calls = 0
+        for _ in range(repeat):
+            del done[:]
+            before = desktop.calls
+            gap = 0.0
+            last = time.perf_counter()
+            app.window_scanner.request_scan()
+            while not done:
+                qt.processEvents()
+                now = time.perf_counter()
+                gap = max(gap, now - last)
+                last = now
+            calls = desktop.calls - before
+            best = gap if best is None else min(best, gap)
+        return {"scan_gui_gap": {"ms": best * 1000, "calls": calls}}
+    finally:
+        app.quit_app()
+        shutil.rmtree(config_dir, ignore_errors=True)
+
+def benchmark_commands(count=1000, commands=2000):
+    # Round trips over one ctl connection to a real PinApp: reads are
+    # answered on the server thread, pins wait for a turn of the GUI event
+    # loop. "ms" is the 99th percentile of each kind; "calls" are the
+    # backend calls the pins made.
+    desktop = SimulatedDesktop(seed=count)
+    desktop.populate(count)
+    config_dir = tempfile.mkdtemp(prefix="aot-bench-")
+    app = simulated_app(desktop, config_dir)
+    qt = QtCore.QCoreApplication.instance()
+    server = app.command_server
+    server.address = os.path.join(config_dir, "aot.sock")
+    try:
+        scanner = app.window_scanner
+        scanner.thread.quit()
+        scanner.thread.wait()
+        scanner.worker.scan(scanner.generation)
+        while not server._index[0]:
+            qt.processEvents()
+        hwnd = server._index[0][0][0]
+        requests = [{"cmd": "list", "title": "Document 9"}, {"cmd": "status"},
+                    {"cmd": "pin", "hwnd": hwnd}, {"cmd": "unpin", "hwnd": hwnd}]
+        latencies = {"list": [], "status": [], "pin": [], "unpin": []}
+
+        def client():
+            with Client(server.address) as conn:
+                for number in range(commands):
+                    request = requests[number % len(requests)]
+                    started = time.perf_counter()
+                    conn.send_bytes(json.dumps(request).encode("utf-8"))
+                    conn.recv_bytes()
+                    latencies[request["cmd"]].append(time.perf_counter() - started)
+
+        if not server.start():
+            raise RuntimeError("cannot listen on {0}".format(server.address))
+        before = desktop.calls
+        thread = threading.Thread(target=client)
+        thread.start()
+        while thread.is_alive():
+            qt.processEvents(QtCore.QEventLoop.AllEvents, 10)
+        thread.join()
+        calls = desktop.calls - before
+
+        def p99(values):
+            values = sorted(values)
+            return values[min(len(values) - 1, int(len(values) * 0.99))] * 1000
+
+        return {
+            "ctl_reads": {"ms": p99(latencies["list"] + latencies["status"]), "calls": 0},
+            "ctl_pins": {"ms": p99(latencies["pin"] + latencies["unpin"]), "calls": calls},
+        }
+    finally:
+        server.stop()
+        app.quit_app()
+        shutil.rmtree(config_dir, ignore_errors=True)
+
+def benchmark_pin_restore(count, repeat=5, entries=5000):
+    # A journal of `entries` pins, half for windows on the desktop and half
+    # for programs that are not running, matched against the first scan.
+    desktop = SimulatedDesktop(seed=count)
+    desktop.populate(count)
+    windows = {hwnd: (title, pid) for hwnd, title, pid in enum_taskbar_windows(WindowAttributeCache(desktop))}
+    rng = random.Random(count)
+    hwnds = list(windows)
+    directory = tempfile.mkdtemp(prefix="aot-pins-")
+    path = os.path.join(directory, "pins.journal")
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            for number in range(entries):
+                if number % 2 and hwnds:
+                    hwnd = rng.choice(hwnds)
+                    title, pid = windows[hwnd]
+                    fp = window_fingerprint(process_basename(desktop.processes[pid]),
+                                            desktop.windows[hwnd].class_name, title)
+                else:
+                    fp = ("gone{0}.exe".format(number % 50), "Gone", "closed window {0}".format(number))
+                f.write(json.dumps({"op": "pin", "fp": fp, "t": int(time.time())}) + "\n")
+        state = {}
+
+        def setup():
+            state["processes"] = ProcessInfoCache(desktop)
+            state["cache"] = WindowAttributeCache(desktop)
+
+        def restore():
+            journal = PinJournal(path)
+            journal.load()
+            plan_pin_restore(journal, windows, state["processes"].name, state["cache"].class_name)
+
+        return {"pin_restore": time_best(restore, repeat, lambda: desktop.calls, setup)}
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def synthetic_auto_pin_rules(count):
+    # Rules in the shapes people write, against SimulatedDesktop's titles
+    # and programs: plain titles, regexes (some with inline flags, named
+    # groups or backreferences), program names, and both together.
+    rules = []
+    for number in range(count):
+        pid = 1000 + 4 * number
+        kind = number % 8
+        if number % 50 == 4:
+            rules.append({"title": "/(?P<n>{0})(?P=n) - /".format(number)})
+        elif kind in (0, 1, 4):
+            rules.append({"title": "Report {0}".format(number)})
+        elif kind == 2:
+            rules.append({"title": "/^Document {0}\\d - /".format(number)})
+        elif kind == 3:
+            rules.append({"title": "/(?i)document {0} - app{1}$/".format(number, pid)})
+        elif kind == 5:
+            rules.append({"process": "app{0}.exe".format(pid)})
+        else:
+            rules.append({"process": "app{0}.exe".format(pid), "title": "/Document \\d+{0} /".format(number)})
+    return rules
+
+def benchmark_auto_pin(count=5000, rules=500, repeat=5):
+    # Every window of a fresh desktop checked against the rules, as on the
+    # first scan; process names are looked up once per pid.
+    desktop = SimulatedDesktop(seed=count)
+    desktop.populate(count)
+    windows = list(enum_taskbar_windows(WindowAttributeCache(desktop)))
+    rule_list = synthetic_auto_pin_rules(rules)
+    state = {}
+
+    def setup():
+        state["engine"] = AutoPinEngine(rule_list, ProcessInfoCache(desktop))
+
+    def run():
+        check = state["engine"].check
+        for hwnd, title, pid in windows:
+            check(hwnd, title, pid)
+
+    return {"auto_pin": time_best(run, repeat, lambda: desktop.calls, setup)}
+
+def benchmark_topmost_watchdog(count, repeat=5, rounds=100):
+    # 20 pinned windows: each round two lose topmost at random and one
+    # drops it every time, until the watchdog gives up on it. The clock
+    # moves a second per round so spacing never defers a re-assert.
+    desktop = SimulatedDesktop(seed=count)
+    desktop.populate(count)
+    hwnds = [hwnd for hwnd, _, _ in enum_taskbar_windows(WindowAttributeCache(desktop))][:20]
+    pinned = PinnedRegistry()
+    for hwnd in desktop.set_topmost_many(hwnds, True):
+        pinned.add(hwnd, desktop.get_pid(hwnd))
+    desktop.fighters = set(hwnds[:1])
+    clock = [0.0]
+    watchdog = TopmostWatchdog(desktop, pinned, clock=lambda: clock[0])
+
+    def setup():
+        desktop.set_topmost_many(hwnds, True)
+        for hwnd in hwnds:
+            watchdog.reset(hwnd)
+
+    def run():
+        for _ in range(rounds):
+            clock[0] += 1
+            for _, hwnd in desktop.churn(strips=2):
+                watchdog.notify(hwnd)
+            watchdog.flush()
+
+    return {"topmost_watchdog_x100": time_best(run, repeat, lambda: desktop.calls, setup)}
+
+def benchmark_x11(count, repeat=5, display=None):
+    # Needs an X server without a window manager (a bare Xvfb): a second
+    # connection plays the window manager, creating count clients and
+    # listing them in _NET_CLIENT_LIST. "calls" here are round trips.
+    wm = xcffib.connect(display=display)
+    screen = wm.get_setup().roots[wm.pref_screen]
+    backend = X11WindowBackend(display)
+    atoms = backend.atoms
+    atom = xcffib.xproto.Atom
+    replace = xcffib.xproto.PropMode.Replace
+    core = wm.core
+    clients = []
+    for number in range(count):
+        wid = wm.generate_id()
+        core.CreateWindow(screen.root_depth, wid, screen.root, 0, 0, 100, 100, 0,
+                          xcffib.xproto.WindowClass.InputOutput, screen.root_visual, 0, [])
+        title = "Document {0} - App{1}".format(number, number % 40)
+        core.ChangeProperty(replace, wid, atoms["_NET_WM_NAME"], atoms["UTF8_STRING"], 8,
+                            len(title.encode("utf-8")), title)
+        core.ChangeProperty(replace, wid, atoms["_NET_WM_PID"], atom.CARDINAL, 32, 1, [1000 + number % 40])
+        if number % 10 == 0:
+            core.ChangeProperty(replace, wid, atoms["_NET_WM_STATE"], atom.ATOM, 32, 1,
+                                [atoms["_NET_WM_STATE_SKIP_TASKBAR"]])
+        clients.append(wid)
+    core.ChangeProperty(replace, screen.root, atoms["_NET_CLIENT_LIST"], atom.WINDOW, 32,
+                        len(clients), clients)
+    core.GetInputFocus().reply()
+    round_trips = lambda: backend.round_trips
+    try:
+        return {
+            "x11_enumerate": time_best(lambda: get_taskbar_windows(cache=WindowAttributeCache(backend)),
+                                       repeat, round_trips),
+            "x11_pin_all": time_best(lambda: backend.set_topmost_many(clients, True), repeat, round_trips),
+        }
+    finally:
+        for wid in clients:
+            core.DestroyWindow(wid)
+        core.DeleteProperty(screen.root, atoms["_NET_CLIENT_LIST"])
+        wm.flush()
+        wm.disconnect()
+        backend.conn.disconnect()
+
+def allocated_kb(func):
+    tracemalloc.start()
+    try:
+        result = func()
+        return round(tracemalloc.get_traced_memory()[0] / 1024, 1), result
+    finally:
+        tracemalloc.stop()
+
+def benchmark_catalogs(languages=30, repeat=5):
+    # Startup needs one catalog no matter how many are installed.
+    english = TranslationCatalogs(data_directories("", "i18n")).catalog(FALLBACK_LANGUAGE)
+    directory = tempfile.mkdtemp(prefix="aot-i18n-")
+    try:
+        for number in range(languages):
+            with open(os.path.join(directory, "l{0:02}.json".format(number)), 'w', encoding='utf-8') as f:
+                json.dump({key: "{0} [{1}]".format(text, number) for key, text in zip(TEXT_KEYS, english)},
+                          f, ensure_ascii=False)
+        loads = [0]
+
+        def first():
+            catalogs = TranslationCatalogs([directory])
+            catalogs.catalog("l00")
+            loads[0] += catalogs.loads
+            return catalogs
+
+        def every():
+            catalogs = TranslationCatalogs([directory])
+            for code in catalogs.paths():
+                catalogs.catalog(code)
+            loads[0] += catalogs.loads
+            return catalogs
+
+        results = {
+            "catalog_first": time_best(first, repeat, lambda: loads[0]),
+            "catalog_all": time_best(every, repeat, lambda: loads[0]),
+        }
+        results["catalog_first"]["kb"] = allocated_kb(first)[0]
+        results["catalog_all"]["kb"] = allocated_kb(every)[0]
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def benchmark_config(switches=100, repeat=5):
+    # Loading a config with 200 hotkey bindings, and switching theme
+    # `switches` times before the flush; "calls" are file writes, which
+    # should be one per burst whatever its length.
+    directory = tempfile.mkdtemp(prefix="aot-config-")
+    path = os.path.join(directory, "config.json")
+    try:
+        with open(path, 'w') as f:
+            json.dump({"theme": "white", "bindings": dict(many_hotkey_bindings(200))}, f, indent=4)
+        state = {"writes": 0}
+
+        def load():
+            store = ConfigStore(path)
+            store.load()
+            store.close()
+            state["writes"] += store.writes
+
+        def switch():
+            store = ConfigStore(path)
+            store.load()
+            for number in range(switches):
+                store.set("theme", ("gray", "black", "white")[number % 3])
+            store.close()
+            state["writes"] += store.writes
+            # Back to the start so every run writes.
+            store = ConfigStore(path)
+            store.load()
+            store.set("theme", "white")
+            store.close()
+
+        return {
+            "config_load": time_best(load, repeat, lambda: state["writes"]),
+            "config_switch_x{0}".format(switches): time_best(switch, repeat, lambda: state["writes"]),
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def benchmark_themes(items=500, repeat=5):
+    # Switching through every theme on a shown window with a full list;
+    # "calls" are stylesheet renders, which the cache keeps at 0.
+    engine = ThemeEngine(data_directories("", "themes"))
+    engine.load()
+    widget = QtWidgets.QWidget()
+    layout = QtWidgets.QVBoxLayout(widget)
+    model = WindowListModel(widget)
+    model.apply_snapshot([(hwnd, "Document {0} - App{1}".format(hwnd, hwnd % 40)) for hwnd in range(items)], ())
+    view = QtWidgets.QListView()
+    view.setModel(model)
+    layout.addWidget(view)
+    layout.addWidget(QtWidgets.QPushButton("Unpin all"))
+    widget.show()
+    names = engine.names()
+    renders = lambda: engine.renders
+
+    def switch():
+        for name in names:
+            engine.apply(widget, name)
+
+    try:
+        return {
+            "theme_switch": time_best(switch, repeat, renders),
+            "theme_reapply": time_best(lambda: engine.apply(widget, engine.current), repeat, renders),
+        }
+    finally:
+        widget.close()
+        widget.deleteLater()
+
+def synthetic_key_stream(chords, count, seed=0):
+    # (key, down) events: plain typing, with one of chords (lists of
+    # Hotkey steps) pressed in place of about one key in a hundred.
+    rng = random.Random(seed)
+    letters = [chr(c) for c in range(ord("a"), ord("z") + 1)]
+    events = []
+    while len(events) < count:
+        if rng.random() < 0.01:
+            for step in rng.choice(chords):
+                modifiers = [name for flag, name in MODIFIER_NAMES if step.modifiers & flag]
+                events.extend((name, True) for name in modifiers)
+                events.extend(((step.key, True), (step.key, False)))
+                events.extend((name, False) for name in reversed(modifiers))
+        else:
+            key = rng.choice(letters)
+            events.extend(((key, True), (key, False)))
+    return events[:count]
+
+def many_hotkey_bindings(count):
+    # Chords under three modifier sets, then two-step sequences behind
+    # ctrl+k, ctrl+j and ctrl+m, until there are `count` bindings.
+    keys = [chr(c) for c in range(ord("a"), ord("z") + 1)] + [str(n) for n in range(10)]
+    actions = ["toggle_pin", "unpin_all", "cycle_pinned"]
+    actions += ["pin_slot:{0}".format(n) for n in range(1, 10)]
+    actions += ["focus_slot:{0}".format(n) for n in range(1, 10)]
+    texts = ["{0}+{1}".format(prefix, key) for prefix in ("ctrl+alt", "alt+shift", "ctrl+alt+shift")
+             for key in keys]
+    texts += ["{0},{1}".format(prefix, key) for prefix in ("ctrl+k", "ctrl+j", "ctrl+m")
+              for key in keys]
+    return [(text, actions[n % len(actions)]) for n, text in enumerate(texts[:count])]
+
+def benchmark_hotkeys(repeat=5, events=BENCHMARK_KEY_EVENTS):
+    # Cost per keystroke of the in-process engine with the two Settings keys
+    # and with 200 bindings, sequences included; "calls" are the actions it
+    # fired, which only change if matching does.
+    results = {}
+    for name, bindings in (("hotkey_dispatch", [("ctrl+shift+p", "pin"), ("ctrl+shift+u", "unpin")]),
+                           ("hotkey_dispatch_200", many_hotkey_bindings(200))):
+        engine = MatcherHotkeyEngine()
+        engine.set_bindings(compile_bindings(bindings)[0])
+        fired = [0]
+        engine.activated.connect(lambda action, fired=fired: fired.__setitem__(0, fired[0] + 1))
+        stream = synthetic_key_stream([parse_hotkey_sequence(text) for text, _ in bindings], events)
+
+        def run(engine=engine, stream=stream):
+            feed = engine.feed
+            for key, down in stream:
+                feed(key, down, 1.0)
+
+        results[name] = time_best(run, repeat, lambda fired=fired: fired[0])
+    return results
+
+def compare_benchmarks(results, baseline, threshold=BENCHMARK_THRESHOLD):
+    row_format = "{0:<28}{1:>10}{2:>8}{3:>9}{4:>11}{5:>9}"
+    lines = [row_format.format("benchmark", "ms", "calls", "kb", "baseline", "change")]
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        row = [name, "{0:.3f}".format(result["ms"]), str(result["calls"]),
+               str(result.get("kb", "")), "-", ""]
+        if base:
+            row[4] = "{0:.3f}".format(base["ms"])
+            change = result["ms"] / base["ms"] - 1 if base["ms"] else 0.0
+            row[5] = "{0:+.0%}".format(change)
+            grew = result.get("kb", 0) > base.get("kb", 0) * (1 + threshold)
+            if change > threshold or result["calls"] > base["calls"] or grew:
+                row[5] += " !"
+                regressions.append(name)
+        lines.append(row_format.format(*row))
+    return "\n".join(lines), regressions
+
+def run_benchmarks(argv):
+    parser = argparse.ArgumentParser(prog="main.py bench")
+    parser.add_argument("--sizes", default=BENCHMARK_SIZES, help="comma-separated window counts")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--latency-us", type=float, default=0, help="simulated cost of each backend call")
+    parser.add_argument("--baseline", default="bench_baseline.json")
+    parser.add_argument("--save", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=BENCHMARK_THRESHOLD)
+    parser.add_argument("--trace", action="append", default=[],
+                        help="replay a recorded trace as a benchmark (repeatable)")
+    parser.add_argument("--x11", action="store_true",
+                        help="also count X server round trips for 500 clients (needs Xvfb on $DISPLAY)")
+    args = parser.parse_args(argv)
+    # Timers (the topmost watchdog's) need an application object; themes
+    # and trace replays need widgets, offscreen.
+    app = QtCore.QCoreApplication.instance()
+    if app is None:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        app = QtWidgets.QApplication(sys.argv[:1])
+    results = {}
+    for count in (int(size) for size in args.sizes.split(",")):
+        for name, result in benchmark_window_list(count, args.repeat, args.latency_us).items():
+            results["{0}/{1}".format(name, count)] = result
+        for name, result in benchmark_pin_restore(count, args.repeat).items():
+            results["{0}/{1}".format(name, count)] = result
+        for name, result in benchmark_topmost_watchdog(count, args.repeat).items():
+            results["{0}/{1}".format(name, count)] = result
+    for name, result in benchmark_scan_gaps(repeat=args.repeat).items():
+        results["{0}/1000".format(name)] = result
+    for name, result in benchmark_commands().items():
+        results["{0}/1000".format(name)] = result
+    for name, result in benchmark_catalogs(repeat=args.repeat).items():
+        results["{0}/30".format(name)] = result
+    for name, result in benchmark_config(repeat=args.repeat).items():
+        results["{0}/200".format(name)] = result
+    for name, result in benchmark_themes(repeat=args.repeat).items():
+        results["{0}/500".format(name)] = result
+    for name, result in benchmark_auto_pin(repeat=args.repeat).items():
+        results["{0}/5000".format(name)] = result
+    for name, result in benchmark_hotkeys(args.repeat).items():
+        results["{0}/{1}".format(name, BENCHMARK_KEY_EVENTS)] = result
+    for path in args.trace:
+        report = replay_trace(path, latency_us=args.latency_us)
+        results["replay/{0}".format(os.path.basename(path))] = {
+            "ms": report["replay_ms"], "calls": report["backend_calls"]}
+    if args.x11:
+        if xcffib is None or not os.environ.get("DISPLAY"):
+            print("--x11 needs xcffib and an X server on $DISPLAY, skipping.", file=sys.stderr)
+        else:
+            for name, result in benchmark_x11(BENCHMARK_X11_CLIENTS, args.repeat).items():
+                results["{0}/{1}".format(name, BENCHMARK_X11_CLIENTS)] = result
+    baseline = {}
+    try:
+        with open(args.baseline, 'r') as f:
+            stored = json.load(f)
+        if stored.get("latency_us") == args.latency_us:
+            baseline = stored.get("results", {})
+        else:
+            print("Baseline was recorded with latency_us={0}, not comparing.".format(stored.get("latency_us")))
     except Exception:
-        base_path = os.path.abspath(".")
-    return os.path.join(base_path, relative_path)
+        pass
+    report, regressions = compare_benchmarks(results, baseline, args.threshold)
+    print(report)
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump({"latency_us": args.latency_us, "results": results}, f, indent=2)
+        print("Saved baseline to {0}".format(args.baseline))
+    if regressions:
+        print("Regressed: {0}".format(", ".join(regressions)), file=sys.stderr)
+        return 1
+    return 0
 
-def is_window_on_taskbar(hwnd):
-    if not win32gui.IsWindowVisible(hwnd):
-        return False
-    if win32gui.GetParent(hwnd):
-        return False
-    if win32gui.GetWindow(hwnd, win32con.GW_OWNER):
-        return False
-    style = win32gui.GetWindowLong(hwnd, win32con.GWL_EXSTYLE)
-    if style & win32con.WS_EX_TOOLWINDOW:
-        return False
-    title = win32gui.GetWindowText(hwnd).strip()
-    return bool(title)
+def open_trace(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
 
-def get_taskbar_windows(exclude_title="AOT - AlwaysOnTop"):
-    windows = []
-    seen_pids = set()
-    exclude_titles = [exclude_title, "Settings", "Cài đặt"]
-    def enum_handler(hwnd, _):
-        if is_window_on_taskbar(hwnd):
-            _, pid = win32process.GetWindowThreadProcessId(hwnd)
-            if pid not in seen_pids:
-                seen_pids.add(pid)
-                title = win32gui.GetWindowText(hwnd)
-                if title not in exclude_titles:
-                    windows.append((hwnd, title))
-    win32gui.EnumWindows(enum_handler, None)
-    return windows
+def load_trace(path):
+    header = {}
+    records = []
+    with open_trace(path, "r") as f:
+        for number, line in enumerate(f):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if number == 0 and isinstance(record, dict):
+                header = record
+            elif isinstance(record, list) and len(record) >= 2:
+                records.append(record)
+    return header, records
 
-class HotkeySignals(QObject):
-    pin_signal = pyqtSignal()
-    unpin_signal = pyqtSignal()
+class TraceRecorder:
+    # What the app saw, as JSON lines of [ms since the previous record,
+    # kind, ...]. Scans are stored as a diff against what was known before,
+    # a process path only when its pid is new. A .gz path is compressed.
+    #   x pid exe                  process path
+    #   s upserts removed          scan; upserts are [hwnd, title, pid, class]
+    #   e kind hwnd                window event
+    #   w hwnd [title pid class]   probe result; hwnd alone: gone
+    #   h action foreground        hotkey
+    #   p hwnd pinned              pin toggled in the list
+    #   c cmd hwnds                pin/unpin from a script
+    #   u                          unpin all
+    def __init__(self, path, process_exe, class_name, foreground):
+        self.path = path
+        self.process_exe = process_exe
+        self.class_name = class_name
+        self.foreground = foreground
+        self.records = 0
+        self._windows = {}
+        self._exes = {}
+        self._file = open_trace(path, "w")
+        self._file.write(json.dumps({"trace": TRACE_VERSION, "started": int(time.time())}) + "\n")
+        self._last = time.perf_counter()
+
+    def _write(self, *record):
+        delta = int((time.perf_counter() - self._last) * 1000)
+        self._last += delta / 1000
+        self._file.write(json.dumps([delta] + list(record), ensure_ascii=False, separators=(",", ":")) + "\n")
+        self.records += 1
+
+    def _process(self, pid):
+        exe = self.process_exe(pid) or ""
+        if self._exes.get(pid) != exe:
+            self._exes[pid] = exe
+            self._write("x", pid, exe)
+
+    def scan(self, windows):
+        seen = {}
+        upserts = []
+        for hwnd, title, pid in windows:
+            seen[hwnd] = (title, pid)
+            if self._windows.get(hwnd) != (title, pid):
+                self._process(pid)
+                upserts.append([hwnd, title, pid, self.class_name(hwnd)])
+        removed = [hwnd for hwnd in self._windows if hwnd not in seen]
+        self._windows = seen
+        self._write("s", upserts, removed)
+
+    def event(self, kind, hwnd):
+        self._write("e", kind, hwnd)
+
+    def probed(self, hwnd, info):
+        if info is None:
+            self._windows.pop(hwnd, None)
+            self._write("w", hwnd)
+            return
+        self._process(info[1])
+        self._windows[hwnd] = info
+        self._write("w", hwnd, info[0], info[1], self.class_name(hwnd))
+
+    def hotkey(self, action):
+        try:
+            foreground = self.foreground()
+        except Exception as e:
+            metrics.swallowed("trace.foreground", e)
+            foreground = 0
+        self._write("h", action, foreground)
+
+    def pin(self, hwnd, pinned):
+        self._write("p", hwnd, int(pinned))
+
+    def command(self, cmd, hwnds):
+        self._write("c", cmd, list(hwnds))
+
+    def unpin_all(self):
+        self._write("u")
+
+    def close(self):
+        self._file.close()
+
+class TraceReplayer:
+    # Plays a trace into a PinApp on a SimulatedDesktop. The desktop is
+    # built from everything up to the first scan, which the app's first
+    # scan then finds. After that each record changes the desktop first and
+    # then hands the app what it got while recording: a scan, an event
+    # (with the state its probe found, taken from the "w" that followed),
+    # or an action, which is timed. Periodic scans are stopped so only the
+    # trace's scans run.
+    def __init__(self, records):
+        self.records = records
+        self.times = []
+        clock = 0
+        for record in records:
+            clock += record[0]
+            self.times.append(clock)
+        self.duration_ms = clock
+        self._start = 0
+        self._probe_states = {}
+        self._attached = set()
+        pending = {}
+        for index, record in enumerate(records):
+            if record[1] == "e":
+                pending[record[3]] = index
+            elif record[1] == "w" and record[2] in pending:
+                self._probe_states[pending.pop(record[2])] = index
+                self._attached.add(index)
+
+    def build_desktop(self, latency_us=0):
+        desktop = SimulatedDesktop(latency_us=latency_us)
+        for index, record in enumerate(self.records):
+            if record[1] == "x":
+                self._apply_process(desktop, record)
+            elif record[1] == "s":
+                self._apply_scan(desktop, record)
+                self._start = index + 1
+                break
+        return desktop
+
+    def _apply_process(self, desktop, record):
+        if desktop.processes.get(record[2]) != record[3]:
+            desktop.start_process(record[2], record[3])
+
+    def _apply_window(self, desktop, hwnd, title, pid, class_name):
+        window = desktop.windows.get(hwnd)
+        if window is None:
+            desktop.add_window(title, pid, hwnd=hwnd, class_name=class_name or "Window")
+        else:
+            window.title = title
+            window.pid = pid
+            window.class_name = class_name or window.class_name
+
+    def _apply_scan(self, desktop, record):
+        for hwnd, title, pid, class_name in record[2]:
+            self._apply_window(desktop, hwnd, title, pid, class_name)
+        for hwnd in record[3]:
+            desktop.remove_window(hwnd)
+
+    def _apply_state(self, desktop, record):
+        if len(record) > 3:
+            self._apply_window(desktop, *record[2:6])
+        else:
+            desktop.remove_window(record[2])
+
+    def _wait(self, done, timeout_s=5.0):
+        # Blocks in the event loop until something arrives; the timer both
+        # bounds the wait and wakes it.
+        if done():
+            return True
+        qt = QtCore.QCoreApplication.instance()
+        timer = QtCore.QTimer()
+        timer.setSingleShot(True)
+        timer.setTimerType(QtCore.Qt.PreciseTimer)
+        timer.start(max(0, int(timeout_s * 1000)))
+        while not done() and timer.isActive():
+            qt.processEvents(QtCore.QEventLoop.WaitForMoreEvents)
+        timer.stop()
+        return done()
+
+    def run(self, app, desktop, realtime=False, speed=1.0):
+        # At full speed list refreshes run on the trace's clock, flushed once
+        # the recorded time passes the coalescing delay, and every probe and
+        # scan is waited for, so the counts repeat from run to run.
+        qt = QtCore.QCoreApplication.instance()
+        refresh = app.refresh_scheduler
+        counts = {"scans": 0, "probes": 0}
+
+        def on_scan(windows):
+            counts["scans"] += 1
+
+        def on_probe(hwnd, info):
+            counts["probes"] += 1
+
+        def settle():
+            self._wait(lambda: counts["probes"] >= probes
+                       and counts["scans"] >= app.scan_scheduler.scans - requested)
+
+        app.window_scanner.scan_finished.connect(on_scan)
+        app.window_scanner.window_probed.connect(on_probe)
+        # Recorded with window events, so titles were only re-read on them.
+        app.window_cache.track_titles = any(record[1] == "e" for record in self.records)
+        # Not shown: what gets painted depends on timing, not on the trace.
+        app.scan_scheduler.set_visible(True)
+        app.start_window_tracking()
+        self._wait(lambda: app._initial_scan_done)
+        app.scan_scheduler.stop()
+        refresh.manual = not realtime
+        calls = desktop.calls
+        refreshes = refresh.executed
+        requested = app.scan_scheduler.scans
+        counts["scans"] = counts["probes"] = 0
+        probes = 0
+        actions = {}
+        flush_at = None
+        started = due = time.perf_counter()
+        for index in range(self._start, len(self.records)):
+            record = self.records[index]
+            clock = self.times[index]
+            if realtime:
+                due += record[0] / 1000 / speed
+                self._wait(lambda: time.perf_counter() >= due, timeout_s=due - time.perf_counter())
+            elif flush_at is not None and clock >= flush_at:
+                flush_at = None
+                refresh.flush()
+                settle()
+            kind = record[1]
+            if kind == "x":
+                self._apply_process(desktop, record)
+            elif kind == "s":
+                self._apply_scan(desktop, record)
+                app.refresh_window_list()
+            elif kind == "e":
+                if index in self._probe_states:
+                    self._apply_state(desktop, self.records[self._probe_states[index]])
+                    probes += 1
+                app.on_window_event(record[2], record[3])
+            elif kind == "w":
+                if index not in self._attached:
+                    self._apply_state(desktop, record)
+            else:
+                action_started = time.perf_counter()
+                if kind == "h":
+                    desktop.foreground = record[3]
+                    app.on_hotkey(record[2])
+                    name = "hotkey." + record[2]
+                elif kind == "p":
+                    app.toggle_pin(record[2], bool(record[3]))
+                    name = "pin" if record[3] else "unpin"
+                elif kind == "c":
+                    app.apply_command_mutations([(record[2], record[3])])
+                    name = "ctl." + record[2]
+                elif kind == "u":
+                    app.unpin_all_windows()
+                    name = "unpin_all"
+                else:
+                    continue
+                histogram = actions.get(name)
+                if histogram is None:
+                    histogram = actions[name] = Histogram()
+                histogram.add((time.perf_counter() - action_started) * 1000)
+            if not realtime:
+                settle()
+                if refresh.pending and flush_at is None:
+                    # A probe result invalidated when it arrived, not when
+                    # its event did.
+                    flush_at = self.times[self._probe_states.get(index, index)] + refresh.delay_ms
+        if refresh.pending:
+            refresh.flush()
+        settle()
+        self._wait(lambda: not refresh.pending)
+        return {
+            "records": len(self.records),
+            "trace_ms": self.duration_ms,
+            "replay_ms": round((time.perf_counter() - started) * 1000, 3),
+            "scans": counts["scans"],
+            "refreshes": refresh.executed - refreshes,
+            "probes": counts["probes"],
+            "backend_calls": desktop.calls - calls,
+            "actions": {name: histogram.summary() for name, histogram in sorted(actions.items())},
+        }
+
+def simulated_app(desktop, config_dir):
+    # A PinApp on a simulated desktop with its own config directory, so the
+    # user's pins, journal and command socket are left alone, and without
+    # OS-level hotkeys.
+    with open(os.path.join(config_dir, "config.json"), 'w') as f:
+        json.dump({"command_server": False}, f)
+    return PinApp(window_backend=desktop, config_dir=config_dir, hotkey_engine=MatcherHotkeyEngine())
+
+def replay_trace(path, realtime=False, speed=1.0, latency_us=0):
+    _, records = load_trace(path)
+    replayer = TraceReplayer(records)
+    desktop = replayer.build_desktop(latency_us)
+    config_dir = tempfile.mkdtemp(prefix="aot-replay-")
+    try:
+        window = simulated_app(desktop, config_dir)
+        try:
+            return replayer.run(window, desktop, realtime, speed)
+        finally:
+            window.quit_app()
+    finally:
+        shutil.rmtree(config_dir, ignore_errors=True)
+
+def format_replay_report(report):
+    lines = ["{0} records, {1} ms recorded, replayed in {2} ms".format(
+                 report["records"], report["trace_ms"], report["replay_ms"]),
+             "scans {0}, refreshes {1}, probes {2}, backend calls {3}".format(
+                 report["scans"], report["refreshes"], report["probes"], report["backend_calls"])]
+    if report["actions"]:
+        lines.append("{0:<24}{1:>7}{2:>10}{3:>10}{4:>10}".format("action", "count", "mean ms", "p95 ms", "max ms"))
+        for name, summary in report["actions"].items():
+            lines.append("{0:<24}{1:>7}{2:>10.3f}{3:>10.3f}{4:>10.3f}".format(
+                name, summary["count"], summary["mean"], summary["p95"], summary["max"]))
+    return "\n".join(lines)
+
+def run_replay(argv):
+    parser = argparse.ArgumentParser(prog="main.py replay")
+    parser.add_argument("trace")
+    parser.add_argument("--realtime", action="store_true", help="keep the recorded pacing")
+    parser.add_argument("--speed", type=float, default=1.0, help="pacing multiplier with --realtime")
+    parser.add_argument("--latency-us", type=float, default=0, help="simulated cost of each backend call")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+    report = replay_trace(args.trace, args.realtime, args.speed, args.latency_us)
+    print(json.dumps(report, indent=2) if args.json else format_replay_report(report))
+    return 0
+
+class SamplingProfiler:
+    # Samples one thread's stack from a daemon thread. It only runs while
+    # switched on from the debug panel.
+    def __init__(self, thread_id, interval_ms=PROFILER_INTERVAL_MS, depth=40):
+        self.thread_id = thread_id
+        self.interval_ms = interval_ms
+        self.depth = depth
+        self.samples = 0
+        self._self_counts = {}
+        self._total_counts = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="aot-sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(1.0)
+        self._thread = None
+
+    def reset(self):
+        self.samples = 0
+        self._self_counts = {}
+        self._total_counts = {}
+
+    def _run(self):
+        interval = self.interval_ms / 1000
+        while not self._stop.wait(interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            self_counts = self._self_counts
+            total_counts = self._total_counts
+            seen = set()
+            for depth in range(self.depth):
+                if frame is None:
+                    break
+                code = frame.f_code
+                location = "{0} ({1}:{2})".format(code.co_name, os.path.basename(code.co_filename),
+                                                  code.co_firstlineno)
+                if depth == 0:
+                    self_counts[location] = self_counts.get(location, 0) + 1
+                if location not in seen:
+                    seen.add(location)
+                    total_counts[location] = total_counts.get(location, 0) + 1
+                frame = frame.f_back
+
+    def top(self, n=25):
+        self_counts = dict(self._self_counts)
+        ranked = sorted(dict(self._total_counts).items(), key=lambda item: -item[1])[:n]
+        return [{"function": location, "self": self_counts.get(location, 0), "total": total}
+                for location, total in ranked]
+
+class StartupProfiler:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.phases = []
+        self._last = self.started
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last, now - self.started))
+        self._last = now
+
+    def report(self):
+        lines = ["{0:<16}{1:>10}{2:>10}".format("phase", "ms", "total")]
+        for phase, elapsed, total in self.phases:
+            lines.append("{0:<16}{1:>10.1f}{2:>10.1f}".format(phase, elapsed * 1000, total * 1000))
+        return "\n".join(lines)
 
 class PinApp(QtWidgets.QWidget):
-    def __init__(self):
+    def __init__(self, profiler=None, window_backend=None, config_dir=None, hotkey_engine=None,
+                 window_event_source=None):
         super().__init__()
-        self.pinned_windows = {}
-        self.config_file = os.path.join(os.path.expanduser("~"), "AppData", "Local", "AOT_AlwaysOnTop", "config.json")
+        self.profiler = profiler or StartupProfiler()
+        self._first_paint_done = False
+        self._initial_scan_done = False
+        self._about_dialog = None
+        self._settings_dialog = None
+        self.trace_recorder = None
+        self.pinned_windows = PinnedRegistry()
+        self.window_backend = window_backend or create_window_backend()
+        self.window_cache = WindowAttributeCache(self.window_backend,
+                                                 title_timeout_ms=TITLE_TIMEOUT_MS)
+        self.window_tracker = WindowTracker()
+        self.process_names = ProcessInfoCache(self.window_backend)
+        config_dir = config_dir or os.path.join(os.path.expanduser("~"), "AppData", "Local", "AOT_AlwaysOnTop")
+        self.config_file = os.path.join(config_dir, "config.json")
         
         self.hotkey_pin = "ctrl+shift+p"
         self.hotkey_unpin = "ctrl+shift+u"
         self.close_to_tray = False
-        self.language = "vi"
+        self.language = DEFAULT_LANGUAGE
+        self.config = ConfigStore(self.config_file, parent=self)
+        self.config.load()
         self.load_config_all()
+        self.auto_pin = AutoPinEngine(self.config.get("auto_pin", []), self.process_names)
+        self.pin_journal = PinJournal(os.path.join(os.path.dirname(self.config_file), "pins.journal"))
+        self.pin_journal.load()
+        self.topmost_watchdog = TopmostWatchdog(self.window_backend, self.pinned_windows, parent=self)
+        self.topmost_watchdog.enabled = self.config.get("enforce_topmost", True)
+        self.topmost_watchdog.fight_detected.connect(self.on_topmost_fight)
+        metrics.enabled = metrics.enabled or bool(self.config.get("metrics", False))
+        self.sampling_profiler = SamplingProfiler(threading.get_ident())
+        self._debug_panel = None
+        self.profiler.mark("config")
+
+        config_dir = os.path.dirname(self.config_file)
+        self.theme_engine = ThemeEngine(data_directories(config_dir, "themes"))
+        self.theme_engine.load()
+        self.profiler.mark("theme_files")
         
         self.settings_changed = False
         
-        self.texts = {
-            "vi": {
-                "title": "AOT - AlwaysOnTop",
-                "select_window": "Chọn cửa sổ để ghim",
-                "unpin_all": "Bỏ tất cả ghim",
-                "hotkey_label": "Phím tắt: Ghim [{0}] | Bỏ ghim [{1}]",
-                "menu_file": "File",
-                "menu_open_location": "Mở thư mục file",
-                "menu_about": "Thông tin",
-                "menu_exit": "Thoát",
-                "menu_theme": "Giao diện",
-                "menu_white": "Trắng",
-                "menu_gray": "Xám",
-                "menu_black": "Đen",
-                "menu_refresh": "Làm mới",
-                "menu_settings": "Cài đặt",
-                "settings_title": "Cài đặt",
-                "settings_hotkey": "Phím tắt",
-                "settings_pin": "Phím tắt ghim:",
-                "settings_unpin": "Phím tắt bỏ ghim:",
-                "settings_example": "Ví dụ: ctrl+shift+p, alt+p\nCác phím: ctrl, shift, alt, win",
-                "settings_close_tray": "Ẩn xuống khay khi đóng",
-                "settings_language": "Ngôn ngữ",
-                "settings_vietnamese": "Tiếng Việt",
-                "settings_english": "English",
-                "btn_save": "Lưu",
-                "btn_cancel": "Hủy",
-                "msg_error": "Lỗi",
-                "msg_empty_hotkey": "Vui lòng nhập đầy đủ phím tắt!",
-                "msg_invalid_hotkey": "Phím tắt không hợp lệ: {0}",
-                "msg_cannot_open": "Không thể mở thư mục: {0}",
-                "tray_open": "Mở",
-                "tray_exit": "Thoát",
-                "about_title": "Thông tin phần mềm",
-                "about_app_name": "Tên: AOT - AlwaysOnTop",
-                "about_version": "Phiên bản: 2.0.0",
-                "about_author": "Tác giả: Ky Khanh Nguyen"
-            },
-            "en": {
-                "title": "AOT - AlwaysOnTop",
-                "select_window": "Select window to pin",
-                "unpin_all": "Unpin all",
-                "hotkey_label": "Hotkey: Pin [{0}] | Unpin [{1}]",
-                "menu_file": "File",
-                "menu_open_location": "Open file location",
-                "menu_about": "About",
-                "menu_exit": "Exit",
-                "menu_theme": "Theme",
-                "menu_white": "White",
-                "menu_gray": "Gray",
-                "menu_black": "Black",
-                "menu_refresh": "Refresh",
-                "menu_settings": "Settings",
-                "settings_title": "Settings",
-                "settings_hotkey": "Hotkeys",
-                "settings_pin": "Pin hotkey:",
-                "settings_unpin": "Unpin hotkey:",
-                "settings_example": "Example: ctrl+shift+p, alt+p\nKeys: ctrl, shift, alt, win",
-                "settings_close_tray": "Close to tray",
-                "settings_language": "Language",
-                "settings_vietnamese": "Tiếng Việt",
-                "settings_english": "English",
-                "btn_save": "Save",
-                "btn_cancel": "Cancel",
-                "msg_error": "Error",
-                "msg_empty_hotkey": "Please enter hotkeys!",
-                "msg_invalid_hotkey": "Invalid hotkey: {0}",
-                "msg_cannot_open": "Cannot open folder: {0}",
-                "tray_open": "Open",
-                "tray_exit": "Exit",
-                "about_title": "About",
-                "about_app_name": "Name: AOT - AlwaysOnTop",
-                "about_version": "Version: 2.0.0",
-                "about_author": "Author: Ky Khanh Nguyen"
-            }
-        }
-        
+        self.catalogs = TranslationCatalogs(data_directories(config_dir, "i18n"))
+        self.texts = self.catalogs.catalog(self.language)
+        self._text_bindings = []
+        self.profiler.mark("texts")
+
         self.setWindowTitle(self.t("title"))
         self.setGeometry(200, 200, 380, 500)
         
         self.hotkey_signals = HotkeySignals()
         self.hotkey_signals.pin_signal.connect(self.pin_active_window)
         self.hotkey_signals.unpin_signal.connect(self.unpin_active_window)
+        self.hotkey_engine = hotkey_engine or create_hotkey_engine(self)
+        self.skipped_hotkeys = []
+        self.rejected_bindings = []
+        self.hotkey_engine.activated.connect(self.on_hotkey)
+        self.profiler.mark("hotkey_engine")
         
         icon_paths = [
             resource_path("PinApp/icon.ico"),
@@ -169,28 +4154,105 @@ class PinApp(QtWidgets.QWidget):
         self.create_tray_menu()
         self.tray_icon.activated.connect(self.tray_icon_activated)
         self.tray_icon.show()
+        self.profiler.mark("tray")
+
+        self.refresh_scheduler = RefreshScheduler(self.sync_window_list,
+                                                  self.refresh_window_list, parent=self)
+
+        self.window_scanner = WindowScanner(self.window_cache, self)
+        self.window_scanner.scan_finished.connect(self.on_scan_finished)
+        self.window_scanner.window_probed.connect(self.on_window_probed)
+        self.scan_scheduler = ScanScheduler(self.window_scanner.request_scan, parent=self)
 
         self.create_ui()
-        
-        timer = QtCore.QTimer(self)
-        timer.timeout.connect(self.refresh_window_list)
-        timer.start(5000)
+        self.profiler.mark("ui")
+
+        # Window events keep the list current; the full scan is only a
+        # consistency check, or the poll when no event source exists.
+        # Both start after the first paint, see start_window_tracking(),
+        # and the scan pauses while the window is hidden.
+        # An injected backend (--simulate) has no OS events behind it
+        # unless a source for it is injected too, as tests do.
+        self.window_event_source = window_event_source
+        if window_event_source is None and window_backend is None:
+            self.window_event_source = create_window_event_source(self)
+        if self.window_event_source:
+            self.window_cache.track_titles = True
+            self.window_event_source.window_event.connect(self.on_window_event)
 
         saved_theme = self.load_theme()
         self.change_theme(saved_theme)
+        self.profiler.mark("theme")
 
         self.register_hotkeys()
+        self.profiler.mark("hotkeys")
+
+        self.command_server = CommandServer(self.process_names, self.apply_command_mutations,
+                                            parent=self, status=self.component_stats)
+        if self.config.get("command_server", True):
+            self.command_server.start()
+        self.profiler.mark("command_server")
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self._first_paint_done:
+            self._first_paint_done = True
+            self.profiler.mark("first_paint")
+            QtCore.QTimer.singleShot(0, self.start_window_tracking)
+
+    def start_window_tracking(self):
+        if self.scan_scheduler.running:
+            return
+        if self.window_event_source:
+            self.window_event_source.start()
+            self.scan_scheduler.start(FULL_SCAN_INTERVAL_MS)
+        else:
+            # Nothing reports new windows while hidden, so auto-pin, ctl
+            # and pruning closed pins rely on a slow scan.
+            self.scan_scheduler.hidden_ms = HIDDEN_POLL_INTERVAL_MS
+            self.scan_scheduler.start(POLL_INTERVAL_MS)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.update_visibility()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.update_visibility()
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QtCore.QEvent.WindowStateChange:
+            self.update_visibility()
+        elif event.type() == QtCore.QEvent.ActivationChange and self.isActiveWindow():
+            self.scan_scheduler.activity()
+
+    def update_visibility(self):
+        self.scan_scheduler.set_visible(self.isVisible() and not self.isMinimized())
 
     def t(self, key):
-        return self.texts[self.language].get(key, key)
+        index = TEXT_KEY_INDEX.get(key)
+        return key if index is None else self.texts[index]
+
+    def bind_text(self, setter, key):
+        # Remembered so a language switch can retext widgets in place.
+        setter(self.t(key))
+        self._text_bindings.append((setter, key))
 
     def create_tray_menu(self):
-        tray_menu = QtWidgets.QMenu()
-        open_action = tray_menu.addAction(self.t("tray_open"))
+        self.tray_menu = QtWidgets.QMenu()
+        self.tray_menu.aboutToShow.connect(self.populate_tray_menu)
+        self.tray_icon.setContextMenu(self.tray_menu)
+
+    def populate_tray_menu(self):
+        if self.tray_menu.actions():
+            return
+        open_action = self.tray_menu.addAction("")
+        self.bind_text(open_action.setText, "tray_open")
         open_action.triggered.connect(self.show_window)
-        exit_action = tray_menu.addAction(self.t("tray_exit"))
+        exit_action = self.tray_menu.addAction("")
+        self.bind_text(exit_action.setText, "tray_exit")
         exit_action.triggered.connect(self.quit_app)
-        self.tray_icon.setContextMenu(tray_menu)
 
     def create_ui(self):
         main_layout = QtWidgets.QVBoxLayout(self)
@@ -199,7 +4261,8 @@ class PinApp(QtWidgets.QWidget):
         self.create_menus()
         main_layout.setMenuBar(self.menubar)
 
-        self.title_label = QtWidgets.QLabel(self.t("select_window"))
+        self.title_label = QtWidgets.QLabel()
+        self.bind_text(self.title_label.setText, "select_window")
         self.title_label.setAlignment(QtCore.Qt.AlignCenter)
         self.title_label.setStyleSheet("font-size: 16px; font-weight: bold;")
         main_layout.addWidget(self.title_label)
@@ -211,69 +4274,121 @@ class PinApp(QtWidgets.QWidget):
         self.hotkey_label.setStyleSheet("font-size: 10px; font-style: italic;")
         main_layout.addWidget(self.hotkey_label)
 
-        self.list_widget = QtWidgets.QListWidget()
-        self.list_widget.setSelectionMode(QtWidgets.QAbstractItemView.NoSelection)
-        main_layout.addWidget(self.list_widget)
+        self.search_edit = QtWidgets.QLineEdit()
+        self.bind_text(self.search_edit.setPlaceholderText, "search_placeholder")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.textChanged.connect(self.update_search)
+        self.search_edit.returnPressed.connect(self.pin_top_search_hit)
+        escape_shortcut = QtWidgets.QShortcut(QtGui.QKeySequence(QtCore.Qt.Key_Escape),
+                                              self.search_edit, context=QtCore.Qt.WidgetShortcut)
+        escape_shortcut.activated.connect(self.search_edit.clear)
+        down_shortcut = QtWidgets.QShortcut(QtGui.QKeySequence(QtCore.Qt.Key_Down),
+                                            self.search_edit, context=QtCore.Qt.WidgetShortcut)
+        down_shortcut.activated.connect(self.focus_list)
+        main_layout.addWidget(self.search_edit)
 
-        self.unpin_btn = QtWidgets.QPushButton(self.t("unpin_all"))
+        self.search_index = SearchIndex(self.window_process_name)
+        self.icon_cache = IconCache(create_icon_provider(),
+                                    self.style().standardIcon(QtWidgets.QStyle.SP_FileIcon),
+                                    self.config.get("icon_cache_kb", ICON_CACHE_KB), self)
+        self.window_model = WindowListModel(self, self.search_index, self.window_icon)
+        self.window_model.pin_toggled.connect(self.toggle_pin)
+        self.search_model = WindowListModel(self, icon_for=self.window_icon)
+        self.search_model.pin_toggled.connect(self.toggle_pin)
+        self.list_view = QtWidgets.QListView()
+        self.list_view.setModel(self.window_model)
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setIconSize(QtCore.QSize(ICON_SIZE, ICON_SIZE))
+        self.icon_cache.icon_ready.connect(self.list_view.viewport().update)
+        self.list_view.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
+        self.list_view.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self.list_view.customContextMenuRequested.connect(self.show_list_menu)
+        main_layout.addWidget(self.list_view)
+
+        self.unpin_btn = QtWidgets.QPushButton()
+        self.bind_text(self.unpin_btn.setText, "unpin_all")
         self.unpin_btn.clicked.connect(self.unpin_all_windows)
         main_layout.addWidget(self.unpin_btn)
 
-        self.refresh_window_list()
+        debug_shortcut = QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+Shift+F12"), self)
+        debug_shortcut.activated.connect(self.show_debug_panel)
 
     def create_menus(self):
-        self.menubar.clear()
-        
-        file_menu = self.menubar.addMenu(self.t("menu_file"))
-        open_location_action = QtWidgets.QAction(self.t("menu_open_location"), self)
+        file_menu = self.menubar.addMenu("")
+        self.bind_text(file_menu.setTitle, "menu_file")
+        open_location_action = QtWidgets.QAction(self)
+        self.bind_text(open_location_action.setText, "menu_open_location")
         open_location_action.triggered.connect(self.open_file_location)
         file_menu.addAction(open_location_action)
         
-        about_action = QtWidgets.QAction(self.t("menu_about"), self)
+        about_action = QtWidgets.QAction(self)
+        self.bind_text(about_action.setText, "menu_about")
         about_action.triggered.connect(self.show_about)
         file_menu.addAction(about_action)
         
         file_menu.addSeparator()
-        exit_action = QtWidgets.QAction(self.t("menu_exit"), self)
+        exit_action = QtWidgets.QAction(self)
+        self.bind_text(exit_action.setText, "menu_exit")
         exit_action.triggered.connect(self.quit_app)
         file_menu.addAction(exit_action)
 
-        theme_menu = self.menubar.addMenu(self.t("menu_theme"))
-        white_action = QtWidgets.QAction(self.t("menu_white"), self)
-        white_action.triggered.connect(lambda: self.change_theme("white"))
-        theme_menu.addAction(white_action)
-        gray_action = QtWidgets.QAction(self.t("menu_gray"), self)
-        gray_action.triggered.connect(lambda: self.change_theme("gray"))
-        theme_menu.addAction(gray_action)
-        black_action = QtWidgets.QAction(self.t("menu_black"), self)
-        black_action.triggered.connect(lambda: self.change_theme("black"))
-        theme_menu.addAction(black_action)
-
-        settings_menu = self.menubar.addMenu(self.t("menu_settings"))
-        settings_action = QtWidgets.QAction(self.t("settings_title"), self)
+        self.theme_menu = self.menubar.addMenu("")
+        self.bind_text(self.theme_menu.setTitle, "menu_theme")
+        self.theme_menu.aboutToShow.connect(self.populate_theme_menu)
+
+        settings_menu = self.menubar.addMenu("")
+        self.bind_text(settings_menu.setTitle, "menu_settings")
+        settings_action = QtWidgets.QAction(self)
+        self.bind_text(settings_action.setText, "settings_title")
         settings_action.triggered.connect(self.show_settings)
         settings_menu.addAction(settings_action)
+        per_window_action = QtWidgets.QAction(self)
+        per_window_action.setCheckable(True)
+        per_window_action.setChecked(self.per_window)
+        self.bind_text(per_window_action.setText, "menu_per_window")
+        per_window_action.toggled.connect(self.set_per_window)
+        settings_menu.addAction(per_window_action)
 
-        refresh_action = self.menubar.addAction(self.t("menu_refresh"))
+        refresh_action = self.menubar.addAction("")
+        self.bind_text(refresh_action.setText, "menu_refresh")
         refresh_action.triggered.connect(self.refresh_window_list)
 
+    def populate_theme_menu(self):
+        if self.theme_menu.actions():
+            return
+        for name in self.theme_engine.names():
+            theme = self.theme_engine.themes[name]
+            theme_action = QtWidgets.QAction(theme.get("name", name), self.theme_menu)
+            if theme.get("label_key"):
+                self.bind_text(theme_action.setText, theme["label_key"])
+            theme_action.triggered.connect(lambda checked=False, name=name: self.change_theme(name))
+            self.theme_menu.addAction(theme_action)
+
     def show_about(self):
+        if self._about_dialog is None:
+            self._about_dialog = self.create_about_dialog()
+        self._about_dialog.exec_()
+
+    def create_about_dialog(self):
         about_dialog = QtWidgets.QDialog(self)
-        about_dialog.setWindowTitle(self.t("about_title"))
+        self.bind_text(about_dialog.setWindowTitle, "about_title")
         about_dialog.setFixedSize(350, 150)
         
         layout = QtWidgets.QVBoxLayout(about_dialog)
         
-        app_name_label = QtWidgets.QLabel(self.t("about_app_name"))
+        app_name_label = QtWidgets.QLabel()
+        self.bind_text(app_name_label.setText, "about_app_name")
         app_name_label.setAlignment(QtCore.Qt.AlignCenter)
         app_name_label.setStyleSheet("font-size: 14px; font-weight: bold;")
         layout.addWidget(app_name_label)
         
-        version_label = QtWidgets.QLabel(self.t("about_version"))
+        version_label = QtWidgets.QLabel()
+        self.bind_text(version_label.setText, "about_version")
         version_label.setAlignment(QtCore.Qt.AlignCenter)
         layout.addWidget(version_label)
         
-        author_label = QtWidgets.QLabel(self.t("about_author"))
+        author_label = QtWidgets.QLabel()
+        self.bind_text(author_label.setText, "about_author")
         author_label.setAlignment(QtCore.Qt.AlignCenter)
         layout.addWidget(author_label)
         
@@ -283,32 +4398,159 @@ class PinApp(QtWidgets.QWidget):
         ok_btn.clicked.connect(about_dialog.accept)
         layout.addWidget(ok_btn)
         
-        about_dialog.exec_()
+        return about_dialog
+
+    def show_debug_panel(self):
+        if self._debug_panel is None:
+            self._debug_panel = self.create_debug_panel()
+        self.update_debug_panel()
+        self._debug_timer.start()
+        self._debug_panel.show()
+        self._debug_panel.raise_()
+
+    def create_debug_panel(self):
+        # Not translated: this is for whoever is chasing a slowdown.
+        panel = QtWidgets.QDialog(self)
+        panel.setWindowTitle("Debug")
+        panel.resize(640, 480)
+
+        layout = QtWidgets.QVBoxLayout(panel)
+
+        options = QtWidgets.QHBoxLayout()
+        self.metrics_check = QtWidgets.QCheckBox("Metrics")
+        self.metrics_check.setChecked(metrics.enabled)
+        self.metrics_check.toggled.connect(self.set_metrics_enabled)
+        options.addWidget(self.metrics_check)
+        self.profiler_check = QtWidgets.QCheckBox("Sampling profiler")
+        self.profiler_check.setChecked(self.sampling_profiler.running)
+        self.profiler_check.toggled.connect(self.set_profiler_running)
+        options.addWidget(self.profiler_check)
+        options.addStretch()
+        layout.addLayout(options)
+
+        self.debug_text = QtWidgets.QPlainTextEdit()
+        self.debug_text.setReadOnly(True)
+        self.debug_text.setFont(QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont))
+        layout.addWidget(self.debug_text)
+
+        buttons = QtWidgets.QHBoxLayout()
+        reset_btn = QtWidgets.QPushButton("Reset")
+        reset_btn.clicked.connect(self.reset_metrics)
+        buttons.addWidget(reset_btn)
+        dump_btn = QtWidgets.QPushButton("Save JSON...")
+        dump_btn.clicked.connect(self.dump_metrics)
+        buttons.addWidget(dump_btn)
+        buttons.addStretch()
+        close_btn = QtWidgets.QPushButton("Close")
+        close_btn.clicked.connect(panel.reject)
+        buttons.addWidget(close_btn)
+        layout.addLayout(buttons)
+
+        self._debug_timer = QtCore.QTimer(panel)
+        self._debug_timer.setInterval(1000)
+        self._debug_timer.timeout.connect(self.update_debug_panel)
+        panel.finished.connect(self._debug_timer.stop)
+        return panel
+
+    def component_stats(self):
+        # Shown in the debug panel and by "ctl status"; also read from the
+        # command server's threads.
+        return {
+            "pinned_registry": self.pinned_windows.stats(),
+            "window_cache": self.window_cache.stats(),
+            "refresh_scheduler": self.refresh_scheduler.stats(),
+            "process_cache": self.process_names.stats(),
+            "icon_cache": self.icon_cache.stats(),
+            "scan_scheduler": self.scan_scheduler.stats(),
+            "topmost_watchdog": self.topmost_watchdog.stats(),
+            "auto_pin": self.auto_pin.stats(),
+            "hotkeys": self.hotkey_stats(),
+        }
+
+    def update_debug_panel(self):
+        text = metrics.report() + "\n"
+        for name, stats in self.component_stats().items():
+            text += "\n{0} {1}".format(name.replace("_", " "), json.dumps(stats))
+        if self.sampling_profiler.samples:
+            lines = ["", "", "profile, {0} samples".format(self.sampling_profiler.samples),
+                     "{0:>7}{1:>7}  {2}".format("self", "total", "function")]
+            for entry in self.sampling_profiler.top():
+                lines.append("{0:>7}{1:>7}  {2}".format(entry["self"], entry["total"], entry["function"]))
+            text += "\n".join(lines)
+        self.debug_text.setPlainText(text)
+
+    def set_metrics_enabled(self, enabled):
+        metrics.enabled = enabled
+        self.update_debug_panel()
+
+    def set_profiler_running(self, running):
+        if running:
+            self.sampling_profiler.start()
+        else:
+            self.sampling_profiler.stop()
+
+    def reset_metrics(self):
+        metrics.reset()
+        self.sampling_profiler.reset()
+        self.update_debug_panel()
+
+    def metrics_dump(self):
+        return {"metrics": metrics.snapshot(), "profile": self.sampling_profiler.top(100)}
+
+    def dump_metrics(self):
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self._debug_panel, "Save JSON", "aot-metrics.json", "JSON (*.json)")
+        if not path:
+            return
+        try:
+            with open(path, 'w') as f:
+                json.dump(self.metrics_dump(), f, indent=2)
+        except Exception as e:
+            QtWidgets.QMessageBox.warning(self._debug_panel, self.t("msg_error"), str(e))
 
     def update_ui_text(self):
+        self.texts = self.catalogs.catalog(self.language)
         self.setWindowTitle(self.t("title"))
-        self.title_label.setText(self.t("select_window"))
         self.hotkey_label.setText(
             self.t("hotkey_label").format(self.hotkey_pin, self.hotkey_unpin)
         )
-        self.unpin_btn.setText(self.t("unpin_all"))
-        self.create_menus()
-        self.create_tray_menu()
+        bindings = []
+        for setter, key in self._text_bindings:
+            try:
+                setter(self.t(key))
+            except RuntimeError:
+                # The widget is gone, e.g. a menu action Qt already deleted.
+                continue
+            bindings.append((setter, key))
+        self._text_bindings = bindings
 
     def show_settings(self):
+        if self._settings_dialog is None:
+            self._settings_dialog = self.create_settings_dialog()
+
+        self.pin_input.setText(self.hotkey_pin)
+        self.unpin_input.setText(self.hotkey_unpin)
+        self.close_to_tray_checkbox.setChecked(self.close_to_tray)
+        self.lang_combo.setCurrentIndex(max(0, self.lang_combo.findData(self.language)))
         self.settings_changed = False
-        
+        self.save_btn.setEnabled(False)
+
+        self._settings_dialog.exec_()
+
+    def create_settings_dialog(self):
         dialog = QtWidgets.QDialog(self)
-        dialog.setWindowTitle(self.t("settings_title"))
+        self.bind_text(dialog.setWindowTitle, "settings_title")
         dialog.setFixedSize(450, 350)
         
         layout = QtWidgets.QVBoxLayout(dialog)
         
-        hotkey_group = QtWidgets.QGroupBox(self.t("settings_hotkey"))
+        hotkey_group = QtWidgets.QGroupBox()
+        self.bind_text(hotkey_group.setTitle, "settings_hotkey")
         hotkey_layout = QtWidgets.QVBoxLayout()
         
         pin_layout = QtWidgets.QHBoxLayout()
-        pin_label = QtWidgets.QLabel(self.t("settings_pin"))
+        pin_label = QtWidgets.QLabel()
+        self.bind_text(pin_label.setText, "settings_pin")
         pin_label.setFixedWidth(120)
         self.pin_input = QtWidgets.QLineEdit(self.hotkey_pin)
         self.pin_input.textChanged.connect(self.on_settings_changed)
@@ -317,7 +4559,8 @@ class PinApp(QtWidgets.QWidget):
         hotkey_layout.addLayout(pin_layout)
         
         unpin_layout = QtWidgets.QHBoxLayout()
-        unpin_label = QtWidgets.QLabel(self.t("settings_unpin"))
+        unpin_label = QtWidgets.QLabel()
+        self.bind_text(unpin_label.setText, "settings_unpin")
         unpin_label.setFixedWidth(120)
         self.unpin_input = QtWidgets.QLineEdit(self.hotkey_unpin)
         self.unpin_input.textChanged.connect(self.on_settings_changed)
@@ -325,34 +4568,31 @@ class PinApp(QtWidgets.QWidget):
         unpin_layout.addWidget(self.unpin_input)
         hotkey_layout.addLayout(unpin_layout)
         
-        help_text = QtWidgets.QLabel(self.t("settings_example"))
+        help_text = QtWidgets.QLabel()
+        self.bind_text(help_text.setText, "settings_example")
         help_text.setStyleSheet("font-size: 9px; font-style: italic;")
         hotkey_layout.addWidget(help_text)
         
         hotkey_group.setLayout(hotkey_layout)
         layout.addWidget(hotkey_group)
         
-        self.close_to_tray_checkbox = QtWidgets.QCheckBox(self.t("settings_close_tray"))
+        self.close_to_tray_checkbox = QtWidgets.QCheckBox()
+        self.bind_text(self.close_to_tray_checkbox.setText, "settings_close_tray")
         self.close_to_tray_checkbox.setChecked(self.close_to_tray)
         self.close_to_tray_checkbox.stateChanged.connect(self.on_settings_changed)
         layout.addWidget(self.close_to_tray_checkbox)
         
-        lang_group = QtWidgets.QGroupBox(self.t("settings_language"))
+        lang_group = QtWidgets.QGroupBox()
+        self.bind_text(lang_group.setTitle, "settings_language")
         lang_layout = QtWidgets.QVBoxLayout()
         
-        self.lang_vi_radio = QtWidgets.QRadioButton(self.t("settings_vietnamese"))
-        self.lang_en_radio = QtWidgets.QRadioButton(self.t("settings_english"))
-        
-        self.lang_vi_radio.toggled.connect(self.on_settings_changed)
-        self.lang_en_radio.toggled.connect(self.on_settings_changed)
-        
-        if self.language == "vi":
-            self.lang_vi_radio.setChecked(True)
-        else:
-            self.lang_en_radio.setChecked(True)
+        self.lang_combo = QtWidgets.QComboBox()
+        for code, name in self.catalogs.languages():
+            self.lang_combo.addItem(name, code)
+        self.lang_combo.setCurrentIndex(max(0, self.lang_combo.findData(self.language)))
+        self.lang_combo.currentIndexChanged.connect(self.on_settings_changed)
         
-        lang_layout.addWidget(self.lang_vi_radio)
-        lang_layout.addWidget(self.lang_en_radio)
+        lang_layout.addWidget(self.lang_combo)
         
         lang_group.setLayout(lang_layout)
         layout.addWidget(lang_group)
@@ -360,8 +4600,10 @@ class PinApp(QtWidgets.QWidget):
         layout.addStretch()
         
         btn_layout = QtWidgets.QHBoxLayout()
-        self.save_btn = QtWidgets.QPushButton(self.t("btn_save"))
-        cancel_btn = QtWidgets.QPushButton(self.t("btn_cancel"))
+        self.save_btn = QtWidgets.QPushButton()
+        self.bind_text(self.save_btn.setText, "btn_save")
+        cancel_btn = QtWidgets.QPushButton()
+        self.bind_text(cancel_btn.setText, "btn_cancel")
         
         self.save_btn.setEnabled(False)
         self.save_btn.clicked.connect(lambda: self.save_settings(dialog))
@@ -371,7 +4613,7 @@ class PinApp(QtWidgets.QWidget):
         btn_layout.addWidget(cancel_btn)
         layout.addLayout(btn_layout)
         
-        dialog.exec_()
+        return dialog
 
     def on_settings_changed(self):
         self.settings_changed = True
@@ -387,37 +4629,51 @@ class PinApp(QtWidgets.QWidget):
                 self, self.t("msg_error"), self.t("msg_empty_hotkey")
             )
             return
+
+        try:
+            if parse_hotkey(new_pin) == parse_hotkey(new_unpin):
+                raise ValueError(new_unpin)
+        except ValueError as e:
+            QtWidgets.QMessageBox.warning(
+                self, self.t("msg_error"), self.t("msg_invalid_hotkey").format(str(e))
+            )
+            return
         
         self.unregister_hotkeys()
         
+        old_pin, old_unpin = self.hotkey_pin, self.hotkey_unpin
         self.hotkey_pin = new_pin
         self.hotkey_unpin = new_unpin
-        self.close_to_tray = self.close_to_tray_checkbox.isChecked()
-        
-        old_language = self.language
-        self.language = "vi" if self.lang_vi_radio.isChecked() else "en"
-        
-        self.save_config()
         
         try:
-            self.register_hotkeys()
-            
-            if old_language != self.language:
-                self.update_ui_text()
-            else:
-                self.hotkey_label.setText(
-                    self.t("hotkey_label").format(self.hotkey_pin, self.hotkey_unpin)
-                )
-            
-            self.save_btn.setEnabled(False)
-            self.settings_changed = False
-            dialog.accept()
+            self.bind_hotkeys()
         except Exception as e:
             QtWidgets.QMessageBox.warning(
                 self, self.t("msg_error"), self.t("msg_invalid_hotkey").format(str(e))
             )
-            self.load_config_all()
+            # Nothing was saved yet; put the old keys (and every other
+            # binding that still registers) back.
+            self.hotkey_pin, self.hotkey_unpin = old_pin, old_unpin
             self.register_hotkeys()
+            return
+        
+        self.close_to_tray = self.close_to_tray_checkbox.isChecked()
+        
+        old_language = self.language
+        self.language = self.lang_combo.currentData() or self.language
+        
+        self.save_config()
+        
+        if old_language != self.language:
+            self.update_ui_text()
+        else:
+            self.hotkey_label.setText(
+                self.t("hotkey_label").format(self.hotkey_pin, self.hotkey_unpin)
+            )
+        
+        self.save_btn.setEnabled(False)
+        self.settings_changed = False
+        dialog.accept()
 
     def tray_icon_activated(self, reason):
         if reason == QtWidgets.QSystemTrayIcon.DoubleClick:
@@ -429,86 +4685,169 @@ class PinApp(QtWidgets.QWidget):
 
     def quit_app(self):
         self.unregister_hotkeys()
+        if self.window_event_source:
+            self.window_event_source.stop()
+        self.refresh_scheduler.cancel()
+        self.scan_scheduler.stop()
+        self.window_scanner.stop()
+        self.command_server.stop()
+        self.sampling_profiler.stop()
+        self.icon_cache.close()
+        self.pin_journal.close()
+        if self.trace_recorder:
+            self.trace_recorder.close()
         
-        for hwnd, pinned in list(self.pinned_windows.items()):
-            if pinned:
-                try:
-                    win32gui.SetWindowPos(hwnd, win32con.HWND_NOTOPMOST, 0, 0, 0, 0,
-                                          win32con.SWP_NOMOVE | win32con.SWP_NOSIZE)
-                except Exception:
-                    pass
+        try:
+            self.window_backend.set_topmost_many(list(self.pinned_windows), False)
+        except Exception as e:
+            metrics.swallowed("quit.unpin_all", e)
         
+        self.config.close()
         self.tray_icon.hide()
         QtWidgets.QApplication.quit()
 
     def register_hotkeys(self):
         try:
-            keyboard.add_hotkey(self.hotkey_pin, lambda: self.hotkey_signals.pin_signal.emit())
-            keyboard.add_hotkey(self.hotkey_unpin, lambda: self.hotkey_signals.unpin_signal.emit())
-        except Exception:
-            pass
+            self.bind_hotkeys()
+        except Exception as e:
+            metrics.swallowed("hotkeys.register", e)
+
+    def hotkey_bindings(self):
+        bindings = [(self.hotkey_pin, "pin"), (self.hotkey_unpin, "unpin")]
+        extra = self.config.get("bindings", {})
+        bindings.extend(extra.items() if isinstance(extra, dict) else [])
+        return compile_bindings(bindings)
+
+    def bind_hotkeys(self):
+        # Only the pin and unpin keys from Settings are fatal; any other
+        # binding the OS refuses is skipped and shows up under
+        # hotkeys.skipped in the metrics.
+        required = set()
+        for text in (self.hotkey_pin, self.hotkey_unpin):
+            try:
+                required.add(parse_hotkey_sequence(text)[0])
+            except ValueError:
+                pass
+        trie, self.rejected_bindings = self.hotkey_bindings()
+        for text, action in self.rejected_bindings:
+            metrics.swallowed("hotkeys.rejected", ValueError(
+                "cannot bind {0!r} to {1!r}: bad keys, unknown action or a clash".format(text, action)))
+        self.skipped_hotkeys = self.hotkey_engine.set_bindings(trie, required)
+        for step in self.skipped_hotkeys:
+            metrics.swallowed("hotkeys.skipped", OSError("cannot register {0}".format(step)))
+
+    def hotkey_stats(self):
+        return {"rejected": ["{0} -> {1}".format(text, action) for text, action in self.rejected_bindings],
+                "skipped": [str(step) for step in self.skipped_hotkeys]}
 
     def unregister_hotkeys(self):
         try:
-            keyboard.remove_hotkey(self.hotkey_pin)
-            keyboard.remove_hotkey(self.hotkey_unpin)
-        except Exception:
-            pass
+            self.hotkey_engine.unregister_all()
+        except Exception as e:
+            metrics.swallowed("hotkeys.unregister", e)
+
+    def on_hotkey(self, action):
+        name, _, slot = action.partition(":")
+        if self.trace_recorder:
+            self.trace_recorder.hotkey(action)
+        self.scan_scheduler.activity()
+        if name == "pin":
+            self.hotkey_signals.pin_signal.emit()
+        elif name == "unpin":
+            self.hotkey_signals.unpin_signal.emit()
+        elif name == "toggle_pin":
+            self.toggle_active_window()
+        elif name == "unpin_all":
+            self.unpin_all_windows()
+        elif name == "cycle_pinned":
+            self.cycle_pinned_windows()
+        elif name == "pin_slot":
+            self.pin_active_window_to_slot(int(slot))
+        elif name == "focus_slot":
+            self.focus_slot(int(slot))
+        metrics.observe_since("hotkey.{0}_ms".format(name), self.hotkey_engine.event_time)
 
     def pin_active_window(self):
         try:
-            hwnd = win32gui.GetForegroundWindow()
-            title = win32gui.GetWindowText(hwnd)
+            hwnd = self.window_backend.get_foreground_window()
+            title = self.window_backend.get_text(hwnd)
             
             if title and title != self.t("title"):
-                win32gui.SetWindowPos(hwnd, win32con.HWND_TOPMOST, 0, 0, 0, 0,
-                                      win32con.SWP_NOMOVE | win32con.SWP_NOSIZE)
-                self.pinned_windows[hwnd] = True
-                self.refresh_window_list()
-        except Exception:
-            pass
+                self.window_backend.set_topmost(hwnd, True)
+                self.pinned_windows.add(hwnd, self.window_backend.get_pid(hwnd))
+                self.topmost_watchdog.reset(hwnd)
+                self.journal_pin(hwnd, True)
+                self.refresh_scheduler.invalidate(rescan=hwnd not in self.window_tracker.windows)
+                return hwnd
+        except Exception as e:
+            metrics.swallowed("pin_active_window", e)
+        return None
+
+    def toggle_active_window(self):
+        try:
+            hwnd = self.window_backend.get_foreground_window()
+        except Exception as e:
+            metrics.swallowed("toggle_active_window", e)
+            return
+        if hwnd in self.pinned_windows:
+            self.unpin_active_window()
+        else:
+            self.pin_active_window()
+
+    def pin_active_window_to_slot(self, slot):
+        hwnd = self.pin_active_window()
+        if hwnd is not None:
+            self.pinned_windows.assign_slot(hwnd, slot)
+
+    def focus_slot(self, slot):
+        hwnd = self.pinned_windows.slot_window(slot)
+        if hwnd is not None:
+            try:
+                self.window_backend.activate(hwnd)
+            except Exception as e:
+                metrics.swallowed("focus_slot", e)
+
+    def cycle_pinned_windows(self):
+        pinned = list(self.pinned_windows)
+        if not pinned:
+            return
+        try:
+            current = self.window_backend.get_foreground_window()
+            index = pinned.index(current) + 1 if current in self.pinned_windows else 0
+            self.window_backend.activate(pinned[index % len(pinned)])
+        except Exception as e:
+            metrics.swallowed("cycle_pinned_windows", e)
 
     def unpin_active_window(self):
         try:
-            hwnd = win32gui.GetForegroundWindow()
-            title = win32gui.GetWindowText(hwnd)
+            hwnd = self.window_backend.get_foreground_window()
             
-            if hwnd in self.pinned_windows and self.pinned_windows[hwnd]:
-                win32gui.SetWindowPos(hwnd, win32con.HWND_NOTOPMOST, 0, 0, 0, 0,
-                                      win32con.SWP_NOMOVE | win32con.SWP_NOSIZE)
-                self.pinned_windows[hwnd] = False
-                self.refresh_window_list()
-        except Exception:
-            pass
+            if hwnd in self.pinned_windows:
+                self.window_backend.set_topmost(hwnd, False)
+                self.pinned_windows.discard(hwnd)
+                self.journal_pin(hwnd, False)
+                self.refresh_scheduler.invalidate()
+        except Exception as e:
+            metrics.swallowed("unpin_active_window", e)
 
     def load_config_all(self):
-        try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r') as f:
-                    config = json.load(f)
-                    self.hotkey_pin = config.get("hotkey_pin", "ctrl+shift+p")
-                    self.hotkey_unpin = config.get("hotkey_unpin", "ctrl+shift+u")
-                    self.close_to_tray = config.get("close_to_tray", False)
-                    self.language = config.get("language", "vi")
-        except Exception:
-            pass
+        config = self.config
+        self.hotkey_pin = config.get("hotkey_pin", "ctrl+shift+p")
+        self.hotkey_unpin = config.get("hotkey_unpin", "ctrl+shift+u")
+        self.close_to_tray = config.get("close_to_tray", False)
+        self.language = config.get("language", DEFAULT_LANGUAGE)
+        self.per_window = config.get("per_window_list", False)
+        self.process_names.capacity = config.get("process_cache_size", PROCESS_CACHE_SIZE)
 
     def save_config(self):
-        try:
-            os.makedirs(os.path.dirname(self.config_file), exist_ok=True)
-            
-            config = {
-                "theme": getattr(self, 'current_theme', 'white'),
-                "hotkey_pin": self.hotkey_pin,
-                "hotkey_unpin": self.hotkey_unpin,
-                "close_to_tray": self.close_to_tray,
-                "language": self.language
-            }
-            
-            with open(self.config_file, 'w') as f:
-                json.dump(config, f, indent=4)
-        except Exception:
-            pass
+        self.config.update({
+            "theme": getattr(self, 'current_theme', 'white'),
+            "hotkey_pin": self.hotkey_pin,
+            "hotkey_unpin": self.hotkey_unpin,
+            "close_to_tray": self.close_to_tray,
+            "language": self.language,
+            "per_window_list": self.per_window
+        })
 
     def open_file_location(self):
         try:
@@ -525,157 +4864,298 @@ class PinApp(QtWidgets.QWidget):
 
     def save_theme(self, theme):
         self.current_theme = theme
-        self.save_config()
+        self.config.set("theme", theme)
     
     def load_theme(self):
-        try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r') as f:
-                    config = json.load(f)
-                    return config.get("theme", "white")
-        except Exception:
-            pass
-        return "white"
+        return self.config.get("theme", DEFAULT_THEME)
 
     def change_theme(self, theme):
+        # The saved value can be anything a hand-edited config holds.
+        if not isinstance(theme, str) or theme not in self.theme_engine.themes:
+            theme = DEFAULT_THEME
         self.save_theme(theme)
-        
-        if theme == "white":
-            border_color = "#CCCCCC"
-            text_color = "#000000"
-            bg_color = "#FFFFFF"
-            list_bg = "#F5F5F5"
-            btn_bg = "#E0E0E0"
-            btn_hover = "#D0D0D0"
-            menubar_bg = "#E8E8E8"
-            menu_bg = "#FFFFFF"
-        elif theme == "gray":
-            border_color = "#555555"
-            text_color = "#FFFFFF"
-            bg_color = "#808080"
-            list_bg = "#6B6B6B"
-            btn_bg = "#6B6B6B"
-            btn_hover = "#757575"
-            menubar_bg = "#5A5A5A"
-            menu_bg = "#6B6B6B"
-        elif theme == "black":
-            border_color = "#3E3E3E"
-            text_color = "#FFFFFF"
-            bg_color = "#1E1E1E"
-            list_bg = "#2D2D2D"
-            btn_bg = "#2D2D2D"
-            btn_hover = "#3A3A3A"
-            menubar_bg = "#252525"
-            menu_bg = "#2D2D2D"
-        
-        self.setStyleSheet(f"""
-            QWidget {{
-                background-color: {bg_color};
-                color: {text_color};
-            }}
-            QListWidget {{
-                background-color: {list_bg};
-                border: 1px solid {border_color};
-            }}
-            QPushButton {{
-                background-color: {btn_bg};
-                border: 1px solid {border_color};
-                padding: 5px;
-                color: {text_color};
-            }}
-            QPushButton:hover {{
-                background-color: {btn_hover};
-            }}
-            QPushButton:disabled {{
-                background-color: {border_color};
-                color: #888888;
-            }}
-            QMenuBar {{
-                background-color: {menubar_bg};
-                color: {text_color};
-            }}
-            QMenuBar::item {{
-                background-color: transparent;
-                padding: 4px 8px;
-            }}
-            QMenuBar::item:selected {{
-                background-color: #0078D4;
-                color: #FFFFFF;
-            }}
-            QMenuBar::item:pressed {{
-                background-color: #005A9E;
-                color: #FFFFFF;
-            }}
-            QMenu {{
-                background-color: {menu_bg};
-                color: {text_color};
-                border: 1px solid {border_color};
-            }}
-            QMenu::item {{
-                padding: 5px 20px;
-            }}
-            QMenu::item:selected {{
-                background-color: #0078D4;
-                color: #FFFFFF;
-            }}
-            QGroupBox {{
-                border: 1px solid {border_color};
-                margin-top: 10px;
-                padding-top: 10px;
-                color: {text_color};
-            }}
-            QGroupBox::title {{
-                subcontrol-origin: margin;
-                left: 10px;
-                padding: 0 5px;
-            }}
-        """)
+        self.theme_engine.apply(self, theme)
 
     def refresh_window_list(self):
-        try:
-            self.list_widget.itemChanged.disconnect()
-        except:
-            pass
-        
-        self.list_widget.clear()
-        windows = get_taskbar_windows()
+        self.scan_scheduler.request()
 
-        for hwnd, title in windows:
-            item = QtWidgets.QListWidgetItem(title)
-            item.setFlags(item.flags() | QtCore.Qt.ItemIsUserCheckable)
-            state = QtCore.Qt.Checked if self.pinned_windows.get(hwnd, False) else QtCore.Qt.Unchecked
-            item.setCheckState(state)
-            item.setData(QtCore.Qt.UserRole, hwnd)
-            self.list_widget.addItem(item)
+    def on_scan_finished(self, windows):
+        started = time.perf_counter()
+        if self.trace_recorder:
+            self.trace_recorder.scan(windows)
+        self.process_names.begin_scan()
+        previous = self.window_tracker.windows
+        self.window_tracker.reset(windows)
+        if self.pinned_windows.sweep(self.window_backend):
+            self.refresh_scheduler.invalidate()
+            for hwnd in [h for h in self.pin_journal.session if h not in self.pinned_windows]:
+                self.pin_journal.forget(hwnd)
+        self.topmost_watchdog.check_all()
+        if not self._initial_scan_done:
+            self.restore_pins()
+        if self.auto_pin.rules:
+            self.auto_pin.retain(self.window_tracker.windows)
+            self.apply_auto_pin([w for w in windows if previous.get(w[0]) != (w[1], w[2])])
+        self.process_names.retain(pid for _, pid in self.window_tracker.windows.values())
+        self.scan_scheduler.scan_done(previous != self.window_tracker.windows)
+        self.sync_window_list()
+        metrics.observe_since("refresh.total_ms", started)
+        if not self._initial_scan_done:
+            self._initial_scan_done = True
+            self.profiler.mark("initial_scan")
+            if self.profiler.enabled:
+                print(self.profiler.report(), flush=True)
 
-        self.list_widget.itemChanged.connect(self.toggle_pin)
+    def sync_window_list(self):
+        if not self.scan_scheduler.visible:
+            # Nobody sees the list; showing the window rescans and rebuilds
+            # it. Scripts still get the current windows.
+            self.publish_windows()
+            return
+        started = time.perf_counter()
+        snapshot = self.window_tracker.snapshot(per_window=self.per_window)
+        if self.per_window:
+            snapshot = [(hwnd, self.describe_window(hwnd, title)) for hwnd, title in snapshot]
+        ops = self.window_model.apply_snapshot(snapshot, self.pinned_windows)
+        metrics.observe_since("refresh.diff_ms", started)
+        metrics.count("refresh.rows_changed", sum(ops.values()))
+        if self.search_edit.text().strip():
+            self.update_search()
+        self.publish_windows()
+
+    def publish_windows(self):
+        self.command_server.publish(
+            [(hwnd, title, pid) for hwnd, (title, pid) in self.window_tracker.windows.items()],
+            self.pinned_windows
+        )
+
+    def apply_command_mutations(self, mutations):
+        results = []
+        for cmd, hwnds in mutations:
+            if cmd == "unpin-all":
+                cmd, hwnds = "unpin", list(self.pinned_windows)
+            if self.trace_recorder:
+                self.trace_recorder.command(cmd, hwnds)
+            results.append(self.set_pinned_many(hwnds, cmd == "pin"))
+        # The next command must not wait for a list refresh to see these.
+        self.publish_windows()
+        return results
 
-    def toggle_pin(self, item):
-        hwnd = item.data(QtCore.Qt.UserRole)
-        checked = item.checkState() == QtCore.Qt.Checked
+    def on_window_event(self, kind, hwnd):
+        if self.trace_recorder:
+            self.trace_recorder.event(kind, hwnd)
+        if kind in (WINDOW_REORDERED, WINDOW_FOREGROUND):
+            self.topmost_watchdog.notify(hwnd)
+            return
+        if kind == WINDOW_DESTROYED:
+            self.pinned_windows.prune(hwnd)
+            self.auto_pin.forget(hwnd)
+            self.pin_journal.forget(hwnd)
+        self.window_scanner.probe(kind, hwnd)
+
+    def on_window_probed(self, hwnd, info):
+        if self.trace_recorder:
+            self.trace_recorder.probed(hwnd, info)
+        changed = self.window_tracker.update(hwnd, info)
+        if changed:
+            if info is not None:
+                self.apply_auto_pin([(hwnd, info[0], info[1])])
+            self.refresh_scheduler.invalidate()
 
+    def apply_auto_pin(self, windows):
+        hwnds = [hwnd for hwnd, title, pid in windows if self.auto_pin.check(hwnd, title, pid)]
+        if hwnds:
+            self.set_pinned_many(hwnds, True)
+
+    def toggle_pin(self, hwnd, checked):
+        if self.trace_recorder:
+            self.trace_recorder.pin(hwnd, checked)
         try:
+            self.window_backend.set_topmost(hwnd, checked)
             if checked:
-                win32gui.SetWindowPos(hwnd, win32con.HWND_TOPMOST, 0, 0, 0, 0,
-                                      win32con.SWP_NOMOVE | win32con.SWP_NOSIZE)
-                self.pinned_windows[hwnd] = True
+                self.pinned_windows.add(hwnd, self.window_backend.get_pid(hwnd))
+                self.topmost_watchdog.reset(hwnd)
             else:
-                win32gui.SetWindowPos(hwnd, win32con.HWND_NOTOPMOST, 0, 0, 0, 0,
-                                      win32con.SWP_NOMOVE | win32con.SWP_NOSIZE)
-                self.pinned_windows[hwnd] = False
-        except Exception:
-            pass
+                self.pinned_windows.discard(hwnd)
+            self.journal_pin(hwnd, checked)
+            self.window_model.set_pinned(hwnd, checked)
+            self.search_model.set_pinned(hwnd, checked)
+        except Exception as e:
+            metrics.swallowed("toggle_pin", e)
 
-    def unpin_all_windows(self):
-        for hwnd, pinned in list(self.pinned_windows.items()):
+    def set_pinned_many(self, hwnds, pinned, journal=True):
+        hwnds = [hwnd for hwnd in hwnds if (hwnd in self.pinned_windows) != pinned]
+        if not hwnds:
+            return 0
+        try:
+            done = self.window_backend.set_topmost_many(hwnds, pinned)
+        except Exception as e:
+            metrics.swallowed("set_pinned_many", e)
+            return 0
+        for hwnd in done:
             if pinned:
-                try:
-                    win32gui.SetWindowPos(hwnd, win32con.HWND_NOTOPMOST, 0, 0, 0, 0,
-                                          win32con.SWP_NOMOVE | win32con.SWP_NOSIZE)
-                    self.pinned_windows[hwnd] = False
-                except Exception:
-                    pass
-        self.refresh_window_list()
+                self.pinned_windows.add(hwnd, self.window_backend.get_pid(hwnd))
+            else:
+                self.pinned_windows.discard(hwnd)
+            if journal:
+                self.journal_pin(hwnd, pinned)
+        self.refresh_scheduler.invalidate()
+        return len(done)
+
+    def journal_pin(self, hwnd, pinned):
+        if not pinned:
+            self.pin_journal.record_unpin(hwnd)
+            return
+        record = self.pinned_windows.get(hwnd)
+        info = self.window_tracker.windows.get(hwnd)
+        try:
+            title = info[0] if info else self.window_cache.title(hwnd)
+            fp = window_fingerprint(self.process_names.name(record.pid),
+                                    self.window_cache.class_name(hwnd), title)
+        except Exception as e:
+            metrics.swallowed("journal_pin", e)
+            return
+        self.pin_journal.record_pin(hwnd, record.pid, fp)
+
+    def on_topmost_fight(self, hwnd):
+        info = self.window_tracker.windows.get(hwnd)
+        title = info[0] if info else str(hwnd)
+        self.tray_icon.showMessage(self.t("title"), self.t("msg_topmost_fight").format(title),
+                                   QtWidgets.QSystemTrayIcon.Information, 5000)
+
+    def record_trace(self, path):
+        self.trace_recorder = TraceRecorder(path, lambda pid: self.process_names.info(pid).exe,
+                                            self.class_name_or_empty,
+                                            self.window_backend.get_foreground_window)
+
+    def class_name_or_empty(self, hwnd):
+        try:
+            return self.window_cache.class_name(hwnd)
+        except Exception as e:
+            metrics.swallowed("class_name", e)
+            return ""
+
+    def restore_pins(self):
+        # Runs once, on the first scan: pins from the journal are matched
+        # against it and re-applied; windows a crashed run left topmost and
+        # nothing claims any more are un-pinned.
+        journal = self.pin_journal
+        started = time.perf_counter()
+        windows = self.window_tracker.windows
+        if self.config.get("restore_pins", True):
+            restored, orphans = plan_pin_restore(journal, windows, self.process_names.name,
+                                                 self.class_name_or_empty)
+        else:
+            restored = {}
+            orphans = [hwnd for hwnd, (pid, _) in journal.session.items()
+                       if windows.get(hwnd, (None, None))[1] == pid]
+            journal.clear()
+        topmost = []
+        for hwnd in orphans:
+            try:
+                if self.window_backend.get_ex_style(hwnd) & WS_EX_TOPMOST:
+                    topmost.append(hwnd)
+            except Exception as e:
+                metrics.swallowed("restore_pins", e)
+        if topmost:
+            try:
+                self.window_backend.set_topmost_many(topmost, False)
+            except Exception as e:
+                metrics.swallowed("restore_pins", e)
+        if restored:
+            self.set_pinned_many(list(restored), True, journal=False)
+        journal.begin_session({hwnd: entry for hwnd, entry in restored.items()
+                               if hwnd in self.pinned_windows})
+        metrics.count("pins.restored", len(restored))
+        metrics.count("pins.orphans_cleared", len(topmost))
+        metrics.observe_since("pins.restore_ms", started)
+
+    def describe_window(self, hwnd, title):
+        try:
+            class_name = self.window_cache.class_name(hwnd)
+        except Exception as e:
+            metrics.swallowed("describe_window", e)
+            class_name = "?"
+        return "{0}   ({1}, {2})".format(title, self.window_process_name(hwnd) or "?", class_name)
+
+    def set_per_window(self, per_window):
+        self.per_window = per_window
+        self.save_config()
+        self.sync_window_list()
+
+    def window_icon(self, hwnd):
+        # Asked for by the view for rows it paints, so only visible rows
+        # ever cost a lookup.
+        info = self.window_tracker.windows.get(hwnd)
+        exe = self.process_names.info(info[1]).exe if info else ""
+        return self.icon_cache.icon(exe, hwnd)
+
+    def window_process_name(self, hwnd):
+        info = self.window_tracker.windows.get(hwnd)
+        return self.process_names.name(info[1]) if info else ""
+
+    def update_search(self):
+        query = self.search_edit.text()
+        if not query.strip():
+            if self.list_view.model() is not self.window_model:
+                self.list_view.setModel(self.window_model)
+            return
+        started = time.perf_counter()
+        self.search_model.set_rows(self.search_index.search(query), self.pinned_windows)
+        if self.list_view.model() is not self.search_model:
+            self.list_view.setModel(self.search_model)
+        metrics.observe_since("search.query_ms", started)
+
+    def pin_top_search_hit(self):
+        if not self.search_edit.text().strip() or not self.search_model.rowCount():
+            return
+        hwnd = self.search_model.index(0).data(QtCore.Qt.UserRole)
+        if hwnd not in self.pinned_windows:
+            self.toggle_pin(hwnd, True)
+
+    def focus_list(self):
+        self.list_view.setFocus()
+        model = self.list_view.model()
+        if model.rowCount():
+            self.list_view.setCurrentIndex(model.index(0))
+
+    def selected_hwnds(self):
+        return [index.data(QtCore.Qt.UserRole)
+                for index in self.list_view.selectionModel().selectedRows()]
+
+    def show_list_menu(self, pos):
+        index = self.list_view.indexAt(pos)
+        if not index.isValid():
+            return
+        hwnd = index.data(QtCore.Qt.UserRole)
+        selected = self.selected_hwnds()
+        if hwnd not in selected:
+            selected = [hwnd]
+
+        menu = QtWidgets.QMenu(self)
+        pin_action = menu.addAction(self.t("menu_pin_selected"))
+        pin_action.triggered.connect(lambda: self.set_pinned_many(selected, True))
+        unpin_action = menu.addAction(self.t("menu_unpin_selected"))
+        unpin_action.triggered.connect(lambda: self.set_pinned_many(selected, False))
+        menu.addSeparator()
+        process_action = menu.addAction(self.t("menu_pin_process"))
+        process_action.triggered.connect(lambda: self.pin_process_windows(hwnd))
+        menu.exec_(self.list_view.viewport().mapToGlobal(pos))
+
+    def pin_process_windows(self, hwnd):
+        info = self.window_tracker.windows.get(hwnd)
+        if info is None:
+            return
+        pid = info[1]
+        self.set_pinned_many(
+            [h for h, (_, window_pid) in self.window_tracker.windows.items() if window_pid == pid],
+            True
+        )
+
+    def unpin_all_windows(self):
+        if self.trace_recorder:
+            self.trace_recorder.unpin_all()
+        self.set_pinned_many(list(self.pinned_windows), False)
 
     def closeEvent(self, event):
         if self.close_to_tray:
@@ -685,7 +5165,29 @@ class PinApp(QtWidgets.QWidget):
             self.quit_app()
 
 if __name__ == "__main__":
-    app = QtWidgets.QApplication(sys.argv)
-    win = PinApp()
+    if sys.argv[1:2] == ["ctl"]:
+        sys.exit(run_command_client(sys.argv[2:]))
+    if sys.argv[1:2] == ["bench"]:
+        sys.exit(run_benchmarks(sys.argv[2:]))
+    if sys.argv[1:2] == ["replay"]:
+        sys.exit(run_replay(sys.argv[2:]))
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--profile-startup", action="store_true")
+    parser.add_argument("--simulate", type=int, metavar="WINDOWS")
+    parser.add_argument("--metrics", action="store_true")
+    parser.add_argument("--record-trace", metavar="PATH")
+    options, qt_args = parser.parse_known_args(sys.argv[1:])
+    metrics.enabled = options.metrics
+    profiler = StartupProfiler(enabled=options.profile_startup)
+    app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
+    profiler.mark("qt")
+    window_backend = None
+    if options.simulate:
+        window_backend = SimulatedDesktop()
+        window_backend.populate(options.simulate)
+    win = PinApp(profiler, window_backend)
+    if options.record_trace:
+        win.record_trace(options.record_trace)
     win.show()
+    profiler.mark("show")
     sys.exit(app.exec_())
@@ -0,0 +1,62 @@
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from PyQt5 import QtCore, QtWidgets
+
+import main
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+
+
+def wait_until(done, timeout_s=5.0):
+    # Runs the event loop until done() holds or the timeout passes.
+    deadline = time.perf_counter() + timeout_s
+    app = QtCore.QCoreApplication.instance()
+    while not done() and time.perf_counter() < deadline:
+        app.processEvents(QtCore.QEventLoop.AllEvents, 10)
+    return done()
+
+
+def run_events(ms):
+    deadline = time.perf_counter() + ms / 1000
+    app = QtCore.QCoreApplication.instance()
+    while time.perf_counter() < deadline:
+        app.processEvents(QtCore.QEventLoop.AllEvents, 10)
+
+
+@pytest.fixture
+def make_app(qapp, tmp_path):
+    # PinApp on an injected backend, in its own config directory, without
+    # OS-level hotkeys or the command socket.
+    apps = []
+
+    def make(backend=None, config=None, show=True, **kwargs):
+        settings = {"command_server": False}
+        settings.update(config or {})
+        with open(os.path.join(str(tmp_path), "config.json"), 'w') as f:
+            json.dump(settings, f)
+        kwargs.setdefault("hotkey_engine", main.MatcherHotkeyEngine())
+        app = main.PinApp(window_backend=backend or main.FakeWindowBackend(),
+                          config_dir=str(tmp_path), **kwargs)
+        apps.append(app)
+        if show:
+            app.show()
+            wait_until(lambda: app._initial_scan_done)
+        return app
+
+    yield make
+    for app in apps:
+        # Hidden first, so no repaint reaches the icon cache once closed.
+        app.hide()
+        app.quit_app()
+        app.deleteLater()
+    qapp.processEvents()
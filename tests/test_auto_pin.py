@@ -0,0 +1,99 @@
+import re
+
+import main
+
+
+class Names:
+    def __init__(self, names=None):
+        self.names = names or {}
+
+    def name(self, pid):
+        return self.names.get(pid, "")
+
+
+def naive_matches(rule, title, process):
+    # One rule on its own, the way a reader of the README would expect.
+    if "process" in rule and rule["process"].lower() != process:
+        return False
+    text = rule.get("title")
+    if not text:
+        return True
+    if len(text) > 1 and text.startswith("/") and text.endswith("/"):
+        return re.search(text[1:-1], title, re.IGNORECASE) is not None
+    return text.lower() in title.lower()
+
+
+def test_patterns_that_cannot_share_an_alternation():
+    rules = main.AutoPinRules([
+        {"title": "/(?i)zoom meeting/"},
+        {"title": "/(?x) team  call /"},
+        {"title": "/(?P<word>ab)(?P=word)/"},
+        {"title": "/(?P<word>cd)/"},
+        {"title": "/(e)\\1/"},
+        {"title": "plain"},
+    ])
+    assert rules.rejected == []
+    assert rules.count == 6
+    for title in ("Zoom Meeting", "teamcall", "xababx", "cd", "ee", "PLAIN text"):
+        assert rules.matches(title), title
+    for title in ("team call", "ab", "e1", "plan"):
+        assert not rules.matches(title), title
+
+
+def test_bad_rules_are_rejected_and_reported():
+    before = main.metrics.errors.get("auto_pin.rejected", {}).get("count", 0)
+    bad = [{"title": "/foo(?i)/"}, {"title": "/[/"}, {}, {"title": 5}, "zoom"]
+    engine = main.AutoPinEngine(bad + [{"title": "zoom"}], Names())
+    assert engine.rules.rejected == bad
+    assert engine.stats()["rules"] == 1
+    assert engine.stats()["rejected"] == 5
+    assert main.metrics.errors["auto_pin.rejected"]["count"] == before + 5
+
+
+def test_a_pattern_that_breaks_the_alternation_is_dropped_alone(monkeypatch):
+    # With the checks switched off, the duplicate group name reaches the
+    # merged compile; only that rule goes.
+    monkeypatch.setattr(main, "UNSHAREABLE_RE", re.compile(r"(?!)"))
+    rules = main.AutoPinRules([{"title": "one"}, {"title": "/(?P<n>x)/"}, {"title": "/(?P<n>y)/"},
+                               {"title": "two"}])
+    assert rules.rejected == [{"title": "/(?P<n>y)/"}]
+    assert rules.count == 3
+    assert [rules.matches(title) for title in ("one", "x", "y", "two")] == [True, True, False, True]
+
+
+def test_500_rules_against_5000_windows():
+    desktop = main.SimulatedDesktop(seed=5000)
+    desktop.populate(5000)
+    windows = list(main.enum_taskbar_windows(main.WindowAttributeCache(desktop)))
+    rules = main.synthetic_auto_pin_rules(500)
+    processes = main.ProcessInfoCache(desktop)
+    engine = main.AutoPinEngine(rules, processes)
+    hits = [hwnd for hwnd, title, pid in windows if engine.check(hwnd, title, pid)]
+    expected = [hwnd for hwnd, title, pid in windows
+                if any(naive_matches(rule, title, processes.name(pid)) for rule in rules)]
+    assert hits == expected
+    stats = engine.stats()
+    assert stats["rejected"] == 0
+    assert stats["evaluations"] == len(windows) == 3722
+    assert stats["matched"] == 610
+    # About 60 us here, the first process-name lookup included.
+    assert stats["cost_per_event_us"] < 1000
+    # A window is pinned by a rule at most once.
+    assert not any(engine.check(hwnd, title, pid) for hwnd, title, pid in windows)
+
+
+def test_app_starts_with_tricky_rules_and_reports_them(make_app):
+    backend = main.FakeWindowBackend()
+    zoom = backend.add_window("Zoom Meeting", 100)
+    other = backend.add_window("Notes", 101)
+    app = make_app(backend, {"auto_pin": [{"title": "/(?i)zoom meeting/"}, {"title": "/(?P<a>x)/"},
+                                          {"title": "/(?P<a>y)/"}, {"title": "/[/"}]})
+    assert zoom in app.pinned_windows
+    assert other not in app.pinned_windows
+    status = app.command_server.handle({"cmd": "status"})
+    assert status["auto_pin"]["rules"] == 3
+    assert status["auto_pin"]["rejected"] == 1
+    assert status["auto_pin"]["evaluations"] == 2
+    app.show_debug_panel()
+    assert '"rejected": 1' in app.debug_text.toPlainText()
+    app._debug_panel.close()
@@ -0,0 +1,62 @@
+import main
+
+
+def make_desktop(count, processes=10):
+    backend = main.FakeWindowBackend()
+    hwnds = [backend.add_window("Window {0}".format(n), 1000 + n % processes) for n in range(count)]
+    return backend, hwnds
+
+
+def test_multi_select_pins_in_one_batch(make_app):
+    backend, hwnds = make_desktop(50)
+    app = make_app(backend, {"per_window_list": True})
+    assert app.window_model.rowCount() == 50
+
+    app.list_view.selectAll()
+    selected = app.selected_hwnds()
+    assert sorted(selected) == sorted(hwnds)
+    assert app.set_pinned_many(selected, True) == 50
+    assert backend.batches == [(tuple(selected), True)]
+    assert backend.topmost_calls == []
+
+    selection = app.list_view.selectionModel()
+    selection.clearSelection()
+    for row in (1, 3, 5):
+        selection.select(app.window_model.index(row), main.QtCore.QItemSelectionModel.Select)
+    selected = app.selected_hwnds()
+    assert len(selected) == 3
+    assert app.set_pinned_many(selected, False) == 3
+    assert len(backend.batches) == 2
+    assert len(app.pinned_windows) == 47
+
+
+def test_unpin_all_is_one_batch(make_app):
+    backend, hwnds = make_desktop(200)
+    app = make_app(backend)
+    app.set_pinned_many(hwnds, True)
+    del backend.batches[:]
+    app.unpin_all_windows()
+    assert len(backend.batches) == 1
+    assert sorted(backend.batches[0][0]) == sorted(hwnds)
+    assert backend.batches[0][1] is False
+    assert not len(app.pinned_windows)
+    assert backend.topmost_calls == []
+
+
+def test_pin_process_windows_is_one_batch(make_app):
+    backend, hwnds = make_desktop(100, processes=4)
+    app = make_app(backend)
+    app.pin_process_windows(hwnds[0])
+    assert len(backend.batches) == 1
+    assert sorted(backend.batches[0][0]) == sorted(hwnds[::4])
+
+
+def test_quit_unpins_in_one_batch(make_app):
+    backend, hwnds = make_desktop(100)
+    app = make_app(backend)
+    app.set_pinned_many(hwnds[:60], True)
+    del backend.batches[:]
+    app.quit_app()
+    assert len(backend.batches) == 1
+    assert sorted(backend.batches[0][0]) == sorted(hwnds[:60])
+    assert not any(window.ex_style & main.WS_EX_TOPMOST for window in backend.windows.values())
@@ -0,0 +1,133 @@
+import json
+import os
+import socket
+import threading
+from multiprocessing.connection import Client
+
+import main
+from conftest import wait_until
+
+
+def in_thread(work):
+    # Requests block until the GUI thread applies their pin changes, so they
+    # run on a thread of their own while this one turns the event loop.
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault("value", work()))
+    thread.start()
+    assert wait_until(lambda: not thread.is_alive(), 30.0)
+    return result["value"]
+
+
+def make_desktop(count):
+    backend = main.FakeWindowBackend()
+    for number in range(count):
+        backend.add_window("Window {0}".format(number), 1000 + number)
+    return backend
+
+
+def test_unpin_all_sees_pins_made_just_before(make_app):
+    app = make_app(make_desktop(20))
+    server = app.command_server
+    replies = in_thread(lambda: [server.handle({"cmd": "pin", "title": "Window 1"}),
+                                 server.handle({"cmd": "status"}),
+                                 server.handle({"cmd": "unpin-all"}),
+                                 server.handle({"cmd": "status"})])
+    # "Window 1" and "Window 10" ... "Window 19".
+    assert replies[0]["matched"] == replies[0]["changed"] == 11
+    assert replies[1]["pinned"] == 11
+    assert replies[2] == {"ok": True, "matched": 11, "changed": 11}
+    assert replies[3]["pinned"] == 0
+    assert not len(app.pinned_windows)
+
+
+def test_unpin_all_in_a_batch_after_a_pin(make_app):
+    backend = make_desktop(20)
+    app = make_app(backend)
+    hwnd = list(backend.windows)[0]
+    replies = in_thread(lambda: app.command_server.handle([{"cmd": "pin", "hwnd": hwnd},
+                                                          {"cmd": "unpin-all"}]))
+    assert [reply["changed"] for reply in replies] == [1, 1]
+    assert not len(app.pinned_windows)
+
+
+def test_unpin_all_covers_pins_from_the_gui(make_app):
+    backend = make_desktop(20)
+    app = make_app(backend)
+    app.set_pinned_many(list(backend.windows)[:5], True)
+    reply = in_thread(lambda: app.command_server.handle({"cmd": "unpin-all"}))
+    assert reply["matched"] == 5
+
+
+def test_10000_commands_over_one_connection(make_app, tmp_path):
+    # Latency is measured by bench (ctl_reads, ctl_pins); this checks every
+    # reply.
+    backend = make_desktop(1000)
+    app = make_app(backend)
+    server = app.command_server
+    hwnd = list(backend.windows)[7]
+    server.address = os.path.join(str(tmp_path), "aot.sock")
+    assert server.start()
+    commands = [{"cmd": "list", "title": "Window 99"}, {"cmd": "status"},
+                {"cmd": "pin", "hwnd": hwnd}, {"cmd": "unpin", "hwnd": hwnd}]
+
+    def run():
+        replies = []
+        with Client(server.address) as conn:
+            for number in range(10000):
+                conn.send_bytes(json.dumps(commands[number % len(commands)]).encode("utf-8"))
+                replies.append(json.loads(conn.recv_bytes().decode("utf-8")))
+        return replies
+
+    try:
+        replies = in_thread(run)
+    finally:
+        server.stop()
+    assert server.commands == 10000
+    assert all(reply["ok"] for reply in replies)
+    assert {len(reply["windows"]) for reply in replies[0::4]} == {11}
+    assert {reply["windows"] for reply in replies[1::4]} == {1000}
+    assert {reply["changed"] for reply in replies[2::4]} == {1}
+    assert {reply["changed"] for reply in replies[3::4]} == {1}
+    assert not len(app.pinned_windows)
+
+
+def test_socket_lives_in_the_runtime_directory(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    assert main.command_address() == os.path.join(str(tmp_path), "aot-alwaysontop.sock")
+    monkeypatch.delenv("XDG_RUNTIME_DIR")
+    monkeypatch.setattr(main.tempfile, "gettempdir", lambda: str(tmp_path))
+    directory = os.path.dirname(main.command_address())
+    assert os.path.dirname(directory) == str(tmp_path)
+    server = main.CommandServer(main.ProcessInfoCache(main.FakeWindowBackend()), lambda mutations: [])
+    assert server.start()
+    try:
+        assert os.stat(directory).st_mode & 0o777 == 0o700
+        assert main.send_commands({"cmd": "status"})["ok"]
+    finally:
+        server.stop()
+
+
+def test_stale_socket_is_replaced(qapp, tmp_path):
+    address = os.path.join(str(tmp_path), "aot.sock")
+    stale = socket.socket(socket.AF_UNIX)
+    stale.bind(address)
+    stale.close()
+    server = main.CommandServer(main.ProcessInfoCache(main.FakeWindowBackend()), lambda mutations: [],
+                                address=address)
+    assert server.start()
+    try:
+        assert main.send_commands({"cmd": "status"}, address)["ok"]
+    finally:
+        server.stop()
+
+
+def test_shared_directory_is_refused_without_crashing(qapp, tmp_path):
+    before = main.metrics.errors.get("commands.start", {}).get("count", 0)
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    os.chmod(str(shared), 0o777)
+    server = main.CommandServer(main.ProcessInfoCache(main.FakeWindowBackend()), lambda mutations: [],
+                                address=str(shared / "aot.sock"))
+    assert not server.start()
+    assert main.metrics.errors["commands.start"]["count"] == before + 1
+    assert "only this user" in main.metrics.errors["commands.start"]["last"]
@@ -0,0 +1,103 @@
+import json
+import os
+
+import main
+from conftest import wait_until
+
+
+def make_store(tmp_path, data=None, delay_ms=main.CONFIG_FLUSH_MS):
+    path = os.path.join(str(tmp_path), "config.json")
+    if data is not None:
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=4)
+    store = main.ConfigStore(path, delay_ms=delay_ms)
+    store.load()
+    return store, path
+
+
+def test_setting_the_current_value_writes_nothing(qapp, tmp_path):
+    store, _ = make_store(tmp_path, {"theme": "white"})
+    store.set("theme", "white")
+    assert not store.dirty_keys
+    store.close()
+    assert store.writes == 0
+
+
+def test_rapid_theme_switching_writes_once(qapp, tmp_path):
+    store, path = make_store(tmp_path, {"theme": "white"}, delay_ms=50)
+    for number in range(100):
+        store.set("theme", ("gray", "black", "white")[number % 3])
+    assert store.dirty_keys == {"theme"}
+    assert store.writes == 0
+    assert wait_until(lambda: store.writes == 1, 2.0)
+    store.close()
+    assert store.writes == 1
+    with open(path) as f:
+        assert json.load(f) == {"theme": "gray"}
+
+
+def test_switching_back_to_the_saved_theme_writes_nothing(qapp, tmp_path):
+    store, _ = make_store(tmp_path, {"theme": "white"})
+    for number in range(100):
+        store.set("theme", ("gray", "black", "white")[number % 3])
+    store.set("theme", "white")
+    store.close()
+    assert store.writes == 0
+
+
+def test_write_is_atomic(qapp, tmp_path):
+    store, path = make_store(tmp_path, {"theme": "white"})
+    store.set("language", "en")
+    store.close()
+    assert sorted(os.listdir(str(tmp_path))) == ["config.json"]
+    with open(path) as f:
+        assert json.load(f) == {"theme": "white", "language": "en"}
+
+
+def test_startup_parses_once_and_writes_only_the_first_time(make_app, tmp_path, monkeypatch):
+    path = os.path.join(str(tmp_path), "config.json")
+    opened = []
+    real_open = open
+
+    def counting_open(file, *args, **kwargs):
+        if os.path.abspath(str(file)) == path:
+            opened.append(args[0] if args else kwargs.get("mode", "r"))
+        return real_open(file, *args, **kwargs)
+
+    monkeypatch.setattr(main, "open", counting_open, raising=False)
+    first = make_app()
+    first.quit_app()
+    # The theme default and hotkeys were not in the file yet.
+    assert opened == ['r']
+    assert first.config.writes == 1
+
+    del opened[:]
+    second = main.PinApp(window_backend=main.FakeWindowBackend(), config_dir=str(tmp_path),
+                         hotkey_engine=main.MatcherHotkeyEngine())
+    second.show()
+    assert wait_until(lambda: second._initial_scan_done)
+    second.quit_app()
+    assert opened == ['r']
+    assert second.config.writes == 0
+
+
+def test_config_that_is_not_an_object_falls_back_to_defaults(qapp, tmp_path, monkeypatch):
+    for text in ("[]", "null", '"x"', "5"):
+        before = main.metrics.errors.get("config.load", {}).get("count", 0)
+        with open(os.path.join(str(tmp_path), "config.json"), 'w') as f:
+            f.write(text)
+        store, _ = make_store(tmp_path)
+        assert store.get("theme", "white") == "white"
+        assert main.metrics.errors["config.load"]["count"] == before + 1
+        store.close()
+        assert store.writes == 0
+
+    # The defaults turn the command socket on; keep this test off it.
+    monkeypatch.setattr(main.CommandServer, "start", lambda self: False)
+    app = main.PinApp(window_backend=main.FakeWindowBackend(), config_dir=str(tmp_path),
+                      hotkey_engine=main.MatcherHotkeyEngine())
+    try:
+        assert app.config.get("command_server") is None
+    finally:
+        app.quit_app()
+        app.deleteLater()
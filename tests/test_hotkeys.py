@@ -0,0 +1,153 @@
+import pytest
+
+import main
+
+
+def engine_with(bindings):
+    engine = main.MatcherHotkeyEngine()
+    engine.set_bindings(main.compile_bindings(bindings)[0])
+    fired = []
+    engine.activated.connect(fired.append)
+    return engine, fired
+
+
+def press(engine, text):
+    for step in main.parse_hotkey_sequence(text):
+        modifiers = [name for flag, name in main.MODIFIER_NAMES if step.modifiers & flag]
+        for name in modifiers:
+            engine.feed(name, True)
+        engine.feed(step.key, True)
+        engine.feed(step.key, False)
+        for name in reversed(modifiers):
+            engine.feed(name, False)
+
+
+def test_parse_normalizes_order_case_and_aliases():
+    hotkey = main.parse_hotkey(" Shift + CTRL + p ")
+    assert hotkey == main.parse_hotkey("ctrl+shift+p")
+    assert str(hotkey) == "ctrl+shift+p"
+    assert main.parse_hotkey("ctrl+Escape") == main.parse_hotkey("control+esc")
+    assert main.parse_hotkey("alt+page  down").key == "page down"
+
+
+@pytest.mark.parametrize("text", ["", "ctrl+", "ctrl+shift", "ctrl+ctrl+p", "p+q", "ctrl+nosuchkey"])
+def test_parse_rejects_invalid_hotkeys(text):
+    with pytest.raises(ValueError):
+        main.parse_hotkey(text)
+
+
+def test_engine_fires_on_the_chord_only(qapp):
+    engine, fired = engine_with([("ctrl+shift+p", "pin"), ("ctrl+shift+u", "unpin")])
+    for key in "hello":
+        engine.feed(key, True)
+        engine.feed(key, False)
+    press(engine, "ctrl+p")
+    press(engine, "ctrl+shift+alt+p")
+    assert fired == []
+    press(engine, "ctrl+shift+p")
+    press(engine, "shift+ctrl+u")
+    assert fired == ["pin", "unpin"]
+
+
+def test_unregister_all_stops_matching(qapp):
+    engine, fired = engine_with([("ctrl+shift+p", "pin")])
+    engine.unregister_all()
+    press(engine, "ctrl+shift+p")
+    assert fired == []
+
+
+def test_synthetic_stream_fires_once_per_chord(qapp):
+    bindings = [("ctrl+shift+p", "pin"), ("ctrl+shift+u", "unpin")]
+    engine, fired = engine_with(bindings)
+    stream = main.synthetic_key_stream([main.parse_hotkey_sequence(text) for text, _ in bindings],
+                                       100000)
+    chords = sum(1 for index, (key, down) in enumerate(stream)
+                 if down and key in "pu" and stream[index - 1] == ("shift", True))
+    for key, down in stream:
+        engine.feed(key, down, 1.0)
+    assert len(fired) == chords
+    assert chords > 100
+
+
+class RecordingEngine(main.MatcherHotkeyEngine):
+    def __init__(self):
+        super().__init__()
+        self.unregistered = 0
+
+    def unregister_all(self):
+        self.unregistered += 1
+        super().unregister_all()
+
+
+@pytest.fixture
+def settings_app(make_app, monkeypatch):
+    warnings = []
+    monkeypatch.setattr(main.QtWidgets.QMessageBox, "warning",
+                        staticmethod(lambda *args: warnings.append(args[-1])))
+    app = make_app(hotkey_engine=RecordingEngine())
+    app._settings_dialog = app.create_settings_dialog()
+    return app, warnings
+
+
+@pytest.mark.parametrize("pin, unpin", [("ctrl+shift+", "ctrl+u"), ("ctrl+k", "ctrl+K"), ("", "ctrl+u")])
+def test_save_settings_rejects_before_unregistering(settings_app, pin, unpin):
+    app, warnings = settings_app
+    engine = app.hotkey_engine
+    bound = engine.matcher._root
+    unregistered = engine.unregistered
+    app.pin_input.setText(pin)
+    app.unpin_input.setText(unpin)
+    app.save_settings(app._settings_dialog)
+    assert len(warnings) == 1
+    assert engine.unregistered == unregistered
+    assert engine.matcher._root is bound
+    assert (app.hotkey_pin, app.hotkey_unpin) == ("ctrl+shift+p", "ctrl+shift+u")
+
+
+def test_save_settings_rebinds(settings_app):
+    app, warnings = settings_app
+    fired = []
+    app.hotkey_engine.activated.connect(fired.append)
+    app.pin_input.setText("Alt+F9")
+    app.save_settings(app._settings_dialog)
+    assert warnings == []
+    assert app.hotkey_pin == "alt+f9"
+    press(app.hotkey_engine, "ctrl+shift+p")
+    press(app.hotkey_engine, "alt+f9")
+    assert fired == ["pin"]
+
+
+def test_rejected_bindings_are_reported(make_app):
+    before = main.metrics.errors.get("hotkeys.rejected", {}).get("count", 0)
+    bindings = {
+        "ctrl+k, p": "toggle_pin",
+        "ctrl+k": "unpin_all",      # a prefix of the chord above
+        "ctrl+alt+": "cycle_pinned",  # no key
+        "ctrl+alt+1": "launch",     # unknown action
+        "ctrl+alt+2": ["pin"],      # not an action name
+        "ctrl+alt+3": "pin_slot:3",
+    }
+    app = make_app(config={"bindings": bindings})
+    assert app.rejected_bindings == [("ctrl+k", "unpin_all"), ("ctrl+alt+", "cycle_pinned"),
+                                     ("ctrl+alt+1", "launch"), ("ctrl+alt+2", ["pin"])]
+    assert main.metrics.errors["hotkeys.rejected"]["count"] == before + 4
+    assert "'ctrl+alt+2'" in main.metrics.errors["hotkeys.rejected"]["last"]
+    status = app.command_server.handle({"cmd": "status"})
+    assert status["hotkeys"]["rejected"] == ["ctrl+k -> unpin_all", "ctrl+alt+ -> cycle_pinned",
+                                             "ctrl+alt+1 -> launch", "ctrl+alt+2 -> ['pin']"]
+    assert status["hotkeys"]["skipped"] == []
+    fired = []
+    app.hotkey_engine.activated.connect(fired.append)
+    press(app.hotkey_engine, "ctrl+k")
+    press(app.hotkey_engine, "p")
+    press(app.hotkey_engine, "ctrl+alt+3")
+    assert fired == ["toggle_pin", "pin_slot:3"]
+
+
+def test_bindings_that_are_not_an_object_are_ignored(make_app):
+    app = make_app(config={"bindings": ["ctrl+alt+1"]})
+    assert app.rejected_bindings == []
+    fired = []
+    app.hotkey_engine.activated.connect(fired.append)
+    press(app.hotkey_engine, "ctrl+shift+p")
+    assert fired == ["pin"]
@@ -0,0 +1,76 @@
+import main
+from conftest import wait_until
+
+
+def make_cache(qapp, capacity_kb=main.ICON_CACHE_KB, provider=None):
+    placeholder = main.QtGui.QIcon()
+    return main.IconCache(provider or main.FakeIconProvider(), placeholder, capacity_kb), placeholder
+
+
+def test_each_executable_is_fetched_once(qapp):
+    provider = main.FakeIconProvider(delay_s=0.001)
+    cache, placeholder = make_cache(qapp, provider=provider)
+    exes = ["C:\\Program Files\\App{0}\\app.exe".format(n) for n in range(300)]
+    try:
+        # Many windows per program, asked for over and over by repaints.
+        for hwnd in range(2000):
+            assert cache.icon(exes[hwnd % 300], hwnd) is placeholder
+        assert wait_until(lambda: cache.loads == 300, 5.0)
+        for hwnd in range(2000):
+            assert cache.icon(exes[hwnd % 300].upper(), hwnd) is not placeholder
+    finally:
+        cache.close()
+    assert len(provider.fetches) == 300
+    assert set(provider.fetches.values()) == {1}
+    assert len(cache) == 300
+
+
+def test_size_stays_under_the_cap(qapp):
+    provider = main.FakeIconProvider()
+    cache, _ = make_cache(qapp, capacity_kb=16, provider=provider)
+    try:
+        for number in range(200):
+            cache.icon("app{0}.exe".format(number), number)
+        assert wait_until(lambda: cache.loads == 200, 5.0)
+    finally:
+        cache.close()
+    # A 16x16 ARGB icon is 1 KB.
+    assert cache.size <= 16 * 1024
+    assert len(cache) == 16
+    assert cache.evicted == 184
+
+
+def test_windows_without_a_path_are_keyed_by_hwnd(qapp):
+    provider = main.FakeIconProvider()
+    cache, _ = make_cache(qapp, provider=provider)
+    try:
+        cache.icon("", 10)
+        cache.icon("", 10)
+        cache.icon("", 11)
+        assert wait_until(lambda: cache.loads == 2, 5.0)
+    finally:
+        cache.close()
+    assert provider.fetches == {10: 1, 11: 1}
+
+
+def test_placeholder_provider_keeps_the_placeholder(qapp):
+    cache, placeholder = make_cache(qapp, provider=main.PlaceholderIconProvider())
+    try:
+        cache.icon("app.exe", 1)
+        assert wait_until(lambda: cache.loads == 1, 5.0)
+        assert cache.icon("app.exe", 1) is placeholder
+    finally:
+        cache.close()
+
+
+def test_closed_cache_loads_nothing(qapp):
+    provider = main.FakeIconProvider()
+    cache, placeholder = make_cache(qapp, provider=provider)
+    cache.close()
+    assert cache.icon("app.exe", 1) is placeholder
+    assert provider.fetches == {}
+
+
+def test_app_without_win32_uses_placeholders(make_app):
+    app = make_app()
+    assert isinstance(app.icon_cache.provider, main.PlaceholderIconProvider)
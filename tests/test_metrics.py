@@ -0,0 +1,79 @@
+import threading
+import time
+
+import main
+
+
+def test_histogram_percentiles_are_bucket_bounds_capped_at_max():
+    histogram = main.Histogram()
+    assert histogram.percentile(0.5) is None
+    for value in range(1, 101):
+        histogram.add(float(value))
+    assert histogram.summary() == {"count": 100, "mean": 50.5, "min": 1.0, "max": 100.0,
+                                   "p50": 50, "p95": 100, "p99": 100}
+    assert histogram.percentile(0.1) == 10
+    assert histogram.percentile(0.15) == 20
+
+    flat = main.Histogram()
+    for _ in range(10):
+        flat.add(3.0)
+    assert flat.percentile(0.5) == 3.0
+    assert flat.percentile(0.99) == 3.0
+
+    outlier = main.Histogram()
+    for value in (0.0005, 0.0005, 2e6):
+        outlier.add(value)
+    assert outlier.percentile(0.5) == 0.001
+    assert outlier.percentile(0.99) == 2e6
+
+
+def test_swallowed_errors_are_counted_by_site_even_when_disabled():
+    metrics = main.Metrics(enabled=False)
+    metrics.count("scan.probes")
+    metrics.observe("scan.ms", 1.0)
+    metrics.swallowed("config.load", ValueError("bad"))
+    metrics.swallowed("config.load", OSError("gone"))
+    metrics.swallowed("hotkeys.skipped")
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"] == {}
+    assert snapshot["histograms"] == {}
+    assert snapshot["errors"] == {"config.load": {"count": 2, "last": "OSError: gone"},
+                                  "hotkeys.skipped": {"count": 1, "last": None}}
+    assert "config.load" in metrics.report()
+
+    metrics.enabled = True
+    metrics.count("scan.probes", 3)
+    metrics.observe("scan.ms", 4.0)
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"] == {"scan.probes": 3}
+    assert snapshot["histograms"]["scan.ms"]["count"] == 1
+    metrics.reset()
+    assert metrics.snapshot()["errors"] == {}
+
+
+def busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_profiler_samples_at_its_interval_and_stops_cleanly():
+    profiler = main.SamplingProfiler(threading.get_ident(), interval_ms=5)
+    profiler.start()
+    profiler.start()
+    assert profiler.running
+    started = time.perf_counter()
+    busy(0.3)
+    profiler.stop()
+    elapsed = time.perf_counter() - started
+    assert not profiler.running
+    samples = profiler.samples
+    assert 0 < samples <= elapsed / 0.005 + 1
+    assert any(entry["function"].startswith("busy ") and entry["self"] for entry in profiler.top())
+    busy(0.05)
+    assert profiler.samples == samples
+    profiler.stop()
+    profiler.reset()
+    assert profiler.samples == 0
+    assert profiler.top() == []
+    assert not [t for t in threading.enumerate() if t.name == "aot-sampling-profiler"]
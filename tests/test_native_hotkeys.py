@@ -0,0 +1,123 @@
+import pytest
+
+import main
+
+
+class FakeUser32:
+    # RegisterHotKey/UnregisterHotKey; chords in `taken` belong to another
+    # program and fail to register.
+    def __init__(self):
+        self.taken = set()
+        self.registered = {}
+
+    def RegisterHotKey(self, hwnd, hotkey_id, modifiers, vk):
+        chord = (modifiers & ~main.MOD_NOREPEAT, vk)
+        if chord in self.taken or chord in self.registered.values():
+            return 0
+        self.registered[hotkey_id] = chord
+        return 1
+
+    def UnregisterHotKey(self, hwnd, hotkey_id):
+        return 1 if self.registered.pop(hotkey_id, None) else 0
+
+    def take(self, text):
+        step = main.parse_hotkey(text)
+        self.taken.add((step.modifiers, step.vk))
+
+
+@pytest.fixture
+def user32(monkeypatch):
+    user32 = FakeUser32()
+    monkeypatch.setattr(main.ctypes, "windll", type("windll", (), {"user32": user32}), raising=False)
+    return user32
+
+
+def engine_for(bindings):
+    engine = main.NativeHotkeyEngine()
+    fired = []
+    engine.activated.connect(fired.append)
+    return engine, fired, compile(bindings)
+
+
+def compile(bindings):
+    trie, rejected = main.compile_bindings(bindings)
+    assert rejected == []
+    return trie
+
+
+def hit(engine, text):
+    for step in main.parse_hotkey_sequence(text):
+        engine._on_hotkey(engine._ids[step])
+
+
+def test_200_bindings_skip_only_the_taken_ones(qapp, user32):
+    bindings = main.many_hotkey_bindings(200)
+    taken = [text for text, _ in bindings if "," not in text][::12]
+    for text in taken:
+        user32.take(text)
+    engine, fired, trie = engine_for(bindings)
+    skipped = engine.set_bindings(trie)
+    assert set(skipped) == {main.parse_hotkey(text) for text in taken}
+    # 108 chords and three sequence prefixes, minus the taken chords.
+    assert len(user32.registered) == 108 + 3 - len(taken)
+
+    expected = []
+    for text, action in bindings:
+        if text in taken:
+            assert main.parse_hotkey(text) not in engine.matcher._root
+            continue
+        hit(engine, text)
+        expected.append(action)
+    assert fired == expected
+    # Follow-up steps were only registered while their sequence was pending.
+    assert len(user32.registered) == 108 + 3 - len(taken)
+
+
+def test_taken_required_key_is_fatal(qapp, user32):
+    bindings = [("ctrl+shift+p", "pin"), ("ctrl+shift+u", "unpin")] + main.many_hotkey_bindings(50)
+    user32.take("ctrl+shift+u")
+    engine, fired, trie = engine_for(bindings)
+    with pytest.raises(OSError, match="ctrl\\+shift\\+u"):
+        engine.set_bindings(trie, {main.parse_hotkey("ctrl+shift+p"), main.parse_hotkey("ctrl+shift+u")})
+    assert user32.registered == {}
+    assert engine.matcher._root == {}
+
+
+def test_pending_sequence_steps_are_released(qapp, user32):
+    engine, fired, trie = engine_for([("ctrl+k,1", "pin_slot:1"), ("ctrl+k,2", "focus_slot:2")])
+    engine.set_bindings(trie)
+    assert len(user32.registered) == 1
+    hit(engine, "ctrl+k")
+    assert len(user32.registered) == 3
+    engine.cancel_sequence()
+    assert len(user32.registered) == 1
+    hit(engine, "ctrl+k,2")
+    assert fired == ["focus_slot:2"]
+    assert len(user32.registered) == 1
+
+
+def test_app_reports_skipped_bindings(user32, make_app):
+    user32.take("ctrl+alt+a")
+    extra = dict(main.many_hotkey_bindings(200))
+    app = make_app(config={"bindings": extra}, hotkey_engine=main.NativeHotkeyEngine())
+    assert [str(step) for step in app.skipped_hotkeys] == ["ctrl+alt+a"]
+    assert "ctrl+alt+a" in main.metrics.errors["hotkeys.skipped"]["last"]
+    assert len(user32.registered) == 2 + 108 + 3 - 1
+
+
+def test_failed_save_keeps_the_old_keys_and_every_binding(user32, make_app, monkeypatch):
+    warnings = []
+    monkeypatch.setattr(main.QtWidgets.QMessageBox, "warning",
+                        staticmethod(lambda *args: warnings.append(args[-1])))
+    extra = dict(main.many_hotkey_bindings(200))
+    app = make_app(config={"bindings": extra}, hotkey_engine=main.NativeHotkeyEngine())
+    registered = dict(user32.registered)
+    user32.take("alt+f9")
+    dialog = app.create_settings_dialog()
+    app.pin_input.setText("alt+f9")
+    app.save_settings(dialog)
+    assert len(warnings) == 1
+    assert app.hotkey_pin == "ctrl+shift+p"
+    assert sorted(user32.registered.values()) == sorted(registered.values())
+    # The rejected key never reached the config.
+    assert app.config.get("hotkey_pin") != "alt+f9"
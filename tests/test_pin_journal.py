@@ -0,0 +1,144 @@
+import json
+import os
+import random
+import time
+
+import main
+
+TERMINAL = ("terminal.exe", "Console", "shell")
+
+
+def journal_at(tmp_path, max_age_days=main.PIN_JOURNAL_MAX_AGE_DAYS):
+    journal = main.PinJournal(os.path.join(str(tmp_path), "pins.journal"), max_age_days)
+    journal.load()
+    return journal
+
+
+def restart(journal, tmp_path, restored=None):
+    journal.close()
+    journal = journal_at(tmp_path)
+    journal.begin_session(restored or {})
+    return journal
+
+
+def test_pinning_and_closing_every_day_keeps_one_pin(tmp_path):
+    journal = journal_at(tmp_path)
+    journal.begin_session({})
+    for day in range(5):
+        hwnd = 100 + day
+        journal.record_pin(hwnd, 10 + day, TERMINAL)
+        journal.forget(hwnd)
+        assert journal.counts() == {TERMINAL: 1}
+        journal = restart(journal, tmp_path)
+        assert journal.counts() == {TERMINAL: 1}
+    assert len(journal) == 1
+
+
+def test_windows_open_together_are_all_remembered(tmp_path):
+    journal = journal_at(tmp_path)
+    journal.begin_session({})
+    for hwnd in (1, 2, 3):
+        journal.record_pin(hwnd, hwnd, TERMINAL)
+    journal = restart(journal, tmp_path)
+    assert journal.counts() == {TERMINAL: 3}
+    # One comes back; the other two stay remembered.
+    journal.record_pin(7, 7, TERMINAL)
+    journal.record_unpin(7)
+    assert journal.counts() == {TERMINAL: 2}
+    journal = restart(journal, tmp_path)
+    assert journal.counts() == {TERMINAL: 2}
+
+
+def test_each_closed_slot_expires_on_its_own(tmp_path):
+    old = int(time.time()) - 40 * 86400
+    with open(os.path.join(str(tmp_path), "pins.journal"), 'w') as f:
+        for record in ({"op": "start", "t": old},
+                       {"op": "pin", "fp": TERMINAL, "hwnd": 1, "pid": 1, "t": old},
+                       {"op": "pin", "fp": TERMINAL, "hwnd": 2, "pid": 2, "t": old},
+                       {"op": "closed", "fp": TERMINAL, "hwnd": 1, "t": old},
+                       {"op": "stop", "t": int(time.time())}):
+            f.write(json.dumps(record) + "\n")
+    journal = journal_at(tmp_path)
+    # The window closed 40 days ago is gone; the one open at the stop stays,
+    # however often other terminals were pinned since.
+    assert journal.counts() == {TERMINAL: 1}
+
+
+def test_stops_without_a_time_use_the_last_one_seen(tmp_path):
+    now = int(time.time())
+    with open(os.path.join(str(tmp_path), "pins.journal"), 'w') as f:
+        for record in ({"op": "start", "t": now},
+                       {"op": "pin", "fp": TERMINAL, "hwnd": 1, "pid": 1, "t": now},
+                       {"op": "stop"}):
+            f.write(json.dumps(record) + "\n")
+    assert journal_at(tmp_path).counts() == {TERMINAL: 1}
+
+
+def test_crashed_session_keeps_hwnds_until_restore(tmp_path):
+    journal = journal_at(tmp_path)
+    journal.begin_session({})
+    journal.record_pin(1, 10, TERMINAL)
+    journal.record_pin(2, 20, TERMINAL)
+    journal.close_file()
+    journal = journal_at(tmp_path)
+    assert journal.crashed
+    assert journal.session == {1: (10, TERMINAL), 2: (20, TERMINAL)}
+    assert journal.counts() == {TERMINAL: 2}
+    # Window 2 did not survive; its pin is closed, not lost.
+    journal.begin_session({1: (10, TERMINAL)})
+    assert journal.closed == {TERMINAL: [journal.closed[TERMINAL][0]]}
+    assert journal.counts() == {TERMINAL: 2}
+    journal.record_pin(3, 30, TERMINAL)
+    assert journal.counts() == {TERMINAL: 2}
+
+
+def test_thousands_of_pins_count_the_most_open_at_once(tmp_path):
+    rng = random.Random(7)
+    fingerprints = [("app{0}.exe".format(n), "Frame", "doc") for n in range(100)]
+    journal = journal_at(tmp_path)
+    journal.begin_session({})
+    open_now = {}
+    hwnd = 0
+    for step in range(20000):
+        if open_now and rng.random() < 0.5:
+            closing = rng.choice(list(open_now))
+            del open_now[closing]
+            if rng.random() < 0.5:
+                journal.forget(closing)
+            else:
+                journal.record_unpin(closing)
+        else:
+            fp = rng.choice(fingerprints)
+            if sum(1 for f in open_now.values() if f == fp) >= 3:
+                continue
+            hwnd += 1
+            open_now[hwnd] = fp
+            journal.record_pin(hwnd, hwnd, fp)
+        if step % 5000 == 4999:
+            counts = journal.counts()
+            journal = restart(journal, tmp_path)
+            assert journal.counts() == counts
+            open_now = {}
+    # Never more than three windows of a kind were open at once.
+    counts = journal.counts()
+    assert all(count <= 3 for count in counts.values())
+    assert sum(counts.values()) == len(journal) <= 300
+    assert journal.compactions > 0
+    with open(journal.path) as f:
+        assert sum(1 for _ in f) <= max(main.PIN_JOURNAL_COMPACT_MIN, 4 * (len(journal) + 1)) + 1
+    journal = restart(journal, tmp_path)
+    assert journal.counts() == counts
+
+
+def test_restore_plans_one_window_per_remembered_pin(tmp_path):
+    journal = journal_at(tmp_path)
+    journal.begin_session({})
+    for day in range(5):
+        journal.record_pin(100 + day, 1, TERMINAL)
+        journal.forget(100 + day)
+    journal = restart(journal, tmp_path)
+    windows = {hwnd: ("shell", 50 + hwnd) for hwnd in range(1, 6)}
+    restored, orphans = main.plan_pin_restore(journal, windows, lambda pid: TERMINAL[0],
+                                              lambda hwnd: TERMINAL[1])
+    assert len(restored) == 1
+    assert orphans == []
@@ -0,0 +1,63 @@
+import main
+from conftest import wait_until
+
+
+def test_window_closed_between_sweeps_is_pruned_once():
+    backend = main.FakeWindowBackend()
+    kept = backend.add_window("Kept", 100)
+    closed = backend.add_window("Closed", 101)
+    registry = main.PinnedRegistry()
+    registry.add(kept, 100)
+    registry.add(closed, 101)
+    assert registry.sweep(backend) == 0
+    backend.remove_window(closed)
+    assert registry.sweep(backend) == 1
+    assert list(registry) == [kept]
+    assert registry.stats() == {"pinned": 1, "last_pruned": 1, "total_pruned": 1}
+    assert registry.sweep(backend) == 0
+    assert registry.stats() == {"pinned": 1, "last_pruned": 0, "total_pruned": 1}
+
+
+def test_reused_hwnd_is_not_taken_for_the_pinned_window():
+    backend = main.FakeWindowBackend()
+    hwnd = backend.add_window("Player", 100)
+    registry = main.PinnedRegistry()
+    first = registry.add(hwnd, 100)
+    assert registry.add(hwnd, 100) is first
+    # The player exits and another process gets the same handle.
+    backend.windows[hwnd].pid = 200
+    assert registry.sweep(backend) == 1
+    assert hwnd not in registry
+    second = registry.add(hwnd, 200)
+    assert second.generation > first.generation
+    # Pinning the new owner directly replaces the stale record too.
+    backend.windows[hwnd].pid = 300
+    third = registry.add(hwnd, 300)
+    assert third.generation > second.generation
+    assert len(registry) == 1
+
+
+def test_prune_counts_only_pinned_windows():
+    registry = main.PinnedRegistry()
+    registry.add(1, 10)
+    assert registry.prune(1)
+    assert not registry.prune(1)
+    assert not registry.prune(2)
+    assert registry.stats()["total_pruned"] == 1
+
+
+def test_closed_pins_show_in_status(make_app):
+    backend = main.FakeWindowBackend()
+    hwnds = [backend.add_window("Window {0}".format(n), 100 + n) for n in range(5)]
+    source = main.FakeWindowEventSource()
+    app = make_app(backend, window_event_source=source)
+    app.set_pinned_many(hwnds, True)
+    # One close is reported by an event, one is only found by the next scan.
+    backend.remove_window(hwnds[0])
+    source.push(main.WINDOW_DESTROYED, hwnds[0])
+    backend.remove_window(hwnds[1])
+    app.refresh_window_list()
+    assert wait_until(lambda: len(app.pinned_windows) == 3)
+    status = app.command_server.handle({"cmd": "status"})
+    assert status["pinned"] == 3
+    assert status["pinned_registry"] == {"pinned": 3, "last_pruned": 1, "total_pruned": 2}
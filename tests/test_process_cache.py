@@ -0,0 +1,94 @@
+import main
+from conftest import wait_until
+
+
+def make_backend():
+    backend = main.FakeWindowBackend()
+    backend.start_process(100, "C:\\Tools\\editor.exe")
+    backend.start_process(200, "C:\\Tools\\player.exe")
+    return backend
+
+
+def test_entries_are_checked_once_per_scan():
+    backend = make_backend()
+    cache = main.ProcessInfoCache(backend)
+    cache.begin_scan()
+    assert cache.name(100) == "editor.exe"
+    calls = backend.calls
+    assert cache.name(100) == "editor.exe"
+    assert backend.calls == calls
+    cache.begin_scan()
+    assert cache.name(100) == "editor.exe"
+    # One start-time read, no path lookup.
+    assert backend.calls == calls + 1
+    assert (cache.hits, cache.misses, cache.reused) == (2, 1, 0)
+
+
+def test_reused_pid_is_noticed_by_its_start_time():
+    backend = make_backend()
+    cache = main.ProcessInfoCache(backend)
+    cache.begin_scan()
+    assert cache.name(100) == "editor.exe"
+    backend.start_process(100, "C:\\Games\\game.exe")
+    # Within the same scan the entry is trusted.
+    assert cache.name(100) == "editor.exe"
+    cache.begin_scan()
+    assert cache.name(100) == "game.exe"
+    assert cache.reused == 1
+    assert cache.stats()["reused"] == 1
+    # The same exe started again is a new process too.
+    backend.start_process(100, "C:\\Games\\game.exe")
+    cache.begin_scan()
+    assert cache.info(100).started == backend.process_started[100]
+    assert cache.reused == 2
+
+
+def test_exited_processes_are_dropped_after_a_scan():
+    backend = make_backend()
+    cache = main.ProcessInfoCache(backend)
+    cache.begin_scan()
+    cache.name(100)
+    cache.name(200)
+    cache.retain([100])
+    assert len(cache) == 1
+    calls = backend.calls
+    cache.name(200)
+    assert backend.calls > calls
+    assert cache.misses == 3
+
+
+def test_capacity_evicts_the_least_recently_used():
+    backend = main.FakeWindowBackend()
+    for pid in range(10):
+        backend.start_process(pid, "app{0}.exe".format(pid))
+    cache = main.ProcessInfoCache(backend, capacity=4)
+    cache.begin_scan()
+    for pid in range(4):
+        cache.name(pid)
+    cache.name(0)
+    cache.name(4)
+    # 1 was the least recently used; 0 was touched again.
+    assert list(cache._entries) == [2, 3, 0, 4]
+    for pid in range(5, 10):
+        cache.name(pid)
+    assert len(cache) == 4
+    assert cache.evicted == 6
+    assert cache.stats() == {"size": 4, "capacity": 4, "hit_rate": round(1 / 11, 3), "reused": 0,
+                             "evicted": 6}
+
+
+def test_per_window_list_follows_a_reused_pid(make_app):
+    backend = main.FakeWindowBackend()
+    hwnd = backend.add_window("Untitled", 100, "C:\\Tools\\editor.exe")
+    app = make_app(backend, {"per_window_list": True})
+    model = app.window_model
+
+    def row_process():
+        return model.index(0).data(main.QtCore.Qt.DisplayRole)
+
+    assert "editor.exe" in row_process()
+    backend.remove_window(hwnd)
+    backend.add_window("Level 1", 100, "C:\\Games\\game.exe")
+    app.refresh_window_list()
+    assert wait_until(lambda: "game.exe" in row_process())
+    assert app.process_names.reused == 1
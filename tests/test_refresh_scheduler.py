@@ -0,0 +1,76 @@
+import main
+from conftest import run_events, wait_until
+
+
+class CountingBackend(main.FakeWindowBackend):
+    def __init__(self):
+        super().__init__()
+        self.enumerations = 0
+
+    def enum_windows(self):
+        self.enumerations += 1
+        return super().enum_windows()
+
+
+def test_invalidations_coalesce_into_one_refresh(qapp):
+    runs = []
+    scheduler = main.RefreshScheduler(lambda: runs.append("sync"), lambda: runs.append("rescan"))
+    for _ in range(100):
+        scheduler.invalidate()
+    scheduler.invalidate(rescan=True)
+    assert not runs
+    assert wait_until(lambda: runs, 1.0)
+    run_events(50)
+    assert runs == ["rescan"]
+    assert (scheduler.requested, scheduler.executed, scheduler.rescans) == (101, 1, 1)
+
+
+def test_thousand_pin_signals_do_a_handful_of_scans(make_app):
+    backend = CountingBackend()
+    hwnds = [backend.add_window("Window {0}".format(n), 1000 + n) for n in range(300)]
+    app = make_app(backend)
+    enumerations = backend.enumerations
+    scheduler = app.refresh_scheduler
+    requested, executed = scheduler.requested, scheduler.executed
+
+    for number in range(1000):
+        backend.foreground = hwnds[number % len(hwnds)]
+        app.hotkey_signals.pin_signal.emit()
+    run_events(200)
+
+    assert len(app.pinned_windows) == 300
+    assert scheduler.requested - requested == 1000
+    assert scheduler.executed - executed <= 3
+    assert backend.enumerations - enumerations <= 3
+    pinned_rows = sum(app.window_model.index(row).data(main.QtCore.Qt.CheckStateRole) == main.QtCore.Qt.Checked
+                      for row in range(app.window_model.rowCount()))
+    assert pinned_rows == 300
+
+
+def test_pinning_an_unknown_window_asks_for_one_rescan(make_app):
+    backend = CountingBackend()
+    app = make_app(backend)
+    enumerations = backend.enumerations
+    for number in range(50):
+        backend.foreground = backend.add_window("New {0}".format(number), 2000 + number)
+        app.pin_active_window()
+    assert wait_until(lambda: app.window_model.rowCount() == 50, 2.0)
+    assert app.refresh_scheduler.rescans == 1
+    assert backend.enumerations - enumerations == 1
+
+
+def test_coalescing_shows_in_status_and_debug_panel(make_app):
+    backend = CountingBackend()
+    hwnds = [backend.add_window("Window {0}".format(n), 1000 + n) for n in range(20)]
+    app = make_app(backend)
+    before = app.command_server.handle({"cmd": "status"})["refresh_scheduler"]
+    for hwnd in hwnds:
+        backend.foreground = hwnd
+        app.hotkey_signals.pin_signal.emit()
+    assert wait_until(lambda: not app.refresh_scheduler.pending, 1.0)
+    after = app.command_server.handle({"cmd": "status"})["refresh_scheduler"]
+    assert after["requested"] - before["requested"] == 20
+    assert after["executed"] - before["executed"] == 1
+    app.show_debug_panel()
+    assert "refresh scheduler {" in app.debug_text.toPlainText()
+    app._debug_panel.close()
@@ -0,0 +1,116 @@
+import main
+from conftest import run_events, wait_until
+
+HOUR_MS = 3600 * 1000
+
+
+def idle_scans(duration_ms, base_ms):
+    # Scans a visible, idle desktop would run, following the scheduler's
+    # own backoff.
+    scheduler = main.ScanScheduler(lambda: None)
+    scheduler.base = scheduler.interval = base_ms
+    clock = scans = 0
+    while clock < duration_ms:
+        clock += scheduler.interval
+        scans += 1
+        scheduler.scan_done(False)
+    return scans
+
+
+def test_idle_hour_backs_off(qapp):
+    assert HOUR_MS // main.POLL_INTERVAL_MS == 720
+    assert idle_scans(HOUR_MS, main.POLL_INTERVAL_MS) == 93
+    # Each step doubles, up to the limit.
+    scheduler = main.ScanScheduler(lambda: None)
+    scheduler.base = scheduler.interval = 10
+    intervals = []
+    for _ in range(6):
+        scheduler.scan_done(False)
+        intervals.append(scheduler.interval)
+    assert intervals == [20, 40, 80, 80, 80, 80]
+    scheduler.scan_done(True)
+    assert scheduler.interval == 10
+
+
+def test_scheduler_runs_on_its_timer_and_pauses_while_hidden(qapp):
+    scans = []
+    scheduler = main.ScanScheduler(lambda: scans.append(1))
+    scheduler.set_visible(True)
+    scheduler.start(10)
+    run_events(300)
+    visible_scans = len(scans)
+    # Nothing calls scan_done here, so the interval stays at the base.
+    assert 10 <= visible_scans <= 31
+    scheduler.set_visible(False)
+    hidden_from = len(scans)
+    run_events(300)
+    assert len(scans) == hidden_from
+    scheduler.set_visible(True)
+    assert len(scans) == hidden_from + 1
+    scheduler.stop()
+
+
+def test_hidden_hour_scaled_down(make_app):
+    backend = main.FakeWindowBackend()
+    hwnds = [backend.add_window("Window {0}".format(n), 100 + n) for n in range(50)]
+    source = main.FakeWindowEventSource()
+    app = make_app(backend, window_event_source=source)
+    scheduler = app.scan_scheduler
+    # One base interval stands for a minute.
+    scheduler.start(10)
+    assert wait_until(lambda: not app.refresh_scheduler.pending)
+    app.hide()
+    assert not scheduler.visible
+    scans, calls, refreshes = scheduler.scans, backend.calls, app.refresh_scheduler.executed
+    run_events(60 * 10)
+    assert scheduler.scans == scans
+    assert backend.calls == calls
+    assert app.refresh_scheduler.executed == refreshes
+
+    # Hotkeys still pin while hidden.
+    backend.foreground = hwnds[3]
+    app.hotkey_engine.feed("ctrl", True)
+    app.hotkey_engine.feed("shift", True)
+    app.hotkey_engine.feed("p", True)
+    assert hwnds[3] in app.pinned_windows
+
+    app.show()
+    assert scheduler.visible
+    assert scheduler.scans == scans + 1
+    assert wait_until(lambda: app._initial_scan_done and not app.refresh_scheduler.pending)
+    assert app.window_model.rowCount() == 50
+    scheduler.stop()
+
+
+def test_hidden_without_window_events_keeps_a_slow_scan(make_app):
+    backend = main.FakeWindowBackend()
+    hwnds = [backend.add_window("Window {0}".format(n), 100 + n) for n in range(5)]
+    app = make_app(backend, {"auto_pin": [{"title": "Zoom"}]})
+    scheduler = app.scan_scheduler
+    assert app.window_event_source is None
+    assert scheduler.hidden_ms == main.HIDDEN_POLL_INTERVAL_MS
+    app.set_pinned_many(hwnds[:2], True)
+    # One hidden interval stands for 15 seconds.
+    scheduler.hidden_ms = 20
+    app.hide()
+    assert not scheduler.visible
+    scans = scheduler.scans
+
+    zoom = backend.add_window("Zoom Meeting", 200)
+    backend.remove_window(hwnds[0])
+    assert wait_until(lambda: zoom in app.pinned_windows)
+    assert wait_until(lambda: hwnds[0] not in app.pinned_windows)
+    listed = app.command_server.handle({"cmd": "list", "title": "Zoom"})
+    assert [window["hwnd"] for window in listed["windows"]] == [zoom]
+    assert app.pinned_windows.stats()["total_pruned"] == 1
+    run_events(200)
+    assert 2 <= scheduler.scans - scans <= 25
+    # The list itself is only rebuilt once it can be seen.
+    assert app.window_model.rowCount() == 5
+    assert scheduler.deferred == 0
+
+    app.show()
+    assert wait_until(lambda: app.window_model.rowCount() == 5
+                      and zoom in [app.window_model.index(row).data(main.QtCore.Qt.UserRole)
+                                   for row in range(5)])
+    scheduler.stop()
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import main
+from conftest import run_events, wait_until
+
+
+class SlowBackend(main.FakeWindowBackend):
+    # Titles of some windows take a while, and hung ones time out.
+    def __init__(self, delay_s=0.01, every=20):
+        super().__init__()
+        self.delay_s = delay_s
+        self.every = every
+        self.hung = set()
+        self.readers = set()
+
+    def get_text(self, hwnd, timeout_ms=None):
+        self.readers.add(threading.get_ident())
+        if hwnd in self.hung:
+            if timeout_ms is None:
+                raise AssertionError("hung window read without a timeout")
+            time.sleep(timeout_ms / 1000)
+            return None
+        if (hwnd >> 2) % self.every == 0:
+            time.sleep(self.delay_s)
+        return super().get_text(hwnd, timeout_ms)
+
+
+def populate(backend, count):
+    return [backend.add_window("Window {0}".format(n), 1000 + n) for n in range(count)]
+
+
+def test_hung_window_reports_its_last_title(qapp):
+    backend = SlowBackend()
+    hwnd, = populate(backend, 1)
+    cache = main.WindowAttributeCache(backend, title_timeout_ms=5)
+    assert cache.title(hwnd, refresh=True) == "Window 0"
+    backend.hung.add(hwnd)
+    assert cache.title(hwnd, refresh=True) == "Window 0"
+    assert cache.title_timeouts == 1
+
+
+def test_gui_thread_never_blocks_on_slow_windows(make_app):
+    backend = SlowBackend()
+    hwnds = populate(backend, 200)
+    app = make_app(backend)
+    assert app.window_model.rowCount() == 200
+    backend.hung.update(hwnds[1:4])
+    backend.readers.clear()
+    scans = []
+    app.window_scanner.scan_finished.connect(scans.append)
+    for _ in range(5):
+        app.refresh_window_list()
+    # Each scan sleeps ~10 x 10 ms plus 3 x 200 ms of hung titles, all of
+    # it on the worker; how long the GUI thread stalls is measured by
+    # bench (scan_gui_gap).
+    assert not scans
+    assert wait_until(lambda: scans and app.window_cache.title_timeouts >= 3, 10.0)
+    run_events(100)
+    assert backend.readers
+    assert threading.get_ident() not in backend.readers
+    assert app.window_model.rowCount() == 200
+
+
+def test_newer_request_supersedes_a_running_scan(qapp):
+    backend = SlowBackend(delay_s=0.005, every=5)
+    populate(backend, 100)
+    cache = main.WindowAttributeCache(backend, title_timeout_ms=200)
+    scanner = main.WindowScanner(cache)
+    results = []
+    scanner.scan_finished.connect(results.append)
+    try:
+        scanner.request_scan()
+        run_events(20)
+        added = backend.add_window("Late window", 5000)
+        scanner.request_scan()
+        scanner.request_scan()
+        assert wait_until(lambda: results, 5.0)
+        run_events(200)
+    finally:
+        scanner.stop()
+    assert len(results) == 1
+    assert added in [hwnd for hwnd, _, _ in results[0]]
@@ -0,0 +1,83 @@
+import random
+
+import main
+
+
+def make_index(titles, processes=None):
+    processes = processes or {}
+    index = main.SearchIndex(processes.get)
+    for hwnd, title in enumerate(titles, 1):
+        index.add(hwnd, title)
+    return index
+
+
+def titles_of(results):
+    return [title for _, title in results]
+
+
+def test_title_starts_rank_before_word_starts_before_anywhere():
+    index = make_index(["Notes - Docs", "Docs", "My Docs", "Mydocs draft", "Docs and more"])
+    assert titles_of(index.search("docs")) == ["Docs", "Docs and more", "My Docs", "Notes - Docs",
+                                               "Mydocs draft"]
+    # Every term has to match; scores add up.
+    assert titles_of(index.search("docs my")) == ["My Docs", "Mydocs draft"]
+    assert titles_of(index.search("docs", limit=2)) == ["Docs", "Docs and more"]
+
+
+def test_process_names_are_searchable():
+    index = make_index(["New Tab", "Inbox"], {1: "chrome.exe", 2: "outlook.exe"})
+    assert titles_of(index.search("chrome.exe")) == ["New Tab"]
+    assert titles_of(index.search("inbox outlook")) == ["Inbox"]
+
+
+def test_short_queries_scan_every_title():
+    index = make_index(["Zoom", "Azure", "Notes", "zz"])
+    assert titles_of(index.search("z")) == ["zz", "Zoom", "Azure"]
+    assert titles_of(index.search("zo")) == ["Zoom"]
+    # A short term next to a long one still has to match.
+    assert titles_of(index.search("no tes")) == ["Notes"]
+    assert index.search("   ") == []
+
+
+def test_fuzzy_matches_letters_in_order_when_nothing_contains_the_query():
+    index = make_index(["Document", "Downloads", "Calendar", "xdcm", "Dict"])
+    assert titles_of(index.search("dcmnt")) == ["Document"]
+    # Tighter matches rank first.
+    assert titles_of(index.search("dct")) == ["Dict", "Document"]
+    assert index.search("qqq") == []
+
+
+def test_fuzzy_finds_windows_that_share_no_trigram_with_the_query():
+    index = make_index(["d-c-m-n-t", "dcmx"])
+    assert titles_of(index.search("dcmnt")) == ["d-c-m-n-t"]
+
+
+def test_updates_and_removals_reach_the_postings():
+    index = make_index(["Alpha", "Beta"])
+    index.add(1, "Gamma")
+    index.discard(2)
+    assert index.search("alpha") == []
+    assert index.search("beta") == []
+    assert titles_of(index.search("gamma")) == ["Gamma"]
+    assert len(index) == 1
+
+
+def test_matches_a_full_scan_on_a_simulated_desktop():
+    desktop = main.SimulatedDesktop(seed=3)
+    desktop.populate(3000)
+    windows = main.enum_taskbar_windows(main.WindowAttributeCache(desktop))
+    index = main.SearchIndex()
+    for hwnd, title, _ in windows:
+        index.add(hwnd, title)
+    rng = random.Random(3)
+    words = [word.lower() for _, title, _ in windows for word in title.split()]
+    checked = 0
+    for _ in range(300):
+        terms = [rng.choice(words)[:rng.randint(1, 6)] for _ in range(rng.randint(1, 3))]
+        expected = {hwnd for hwnd, title, _ in windows if all(term in title.lower() for term in terms)}
+        if not expected:
+            continue
+        found = {hwnd for hwnd, _ in index.search(" ".join(terms), limit=len(windows))}
+        assert found == expected, terms
+        checked += 1
+    assert checked > 100
@@ -0,0 +1,55 @@
+import pytest
+
+import main
+
+PHASES = ["config", "theme_files", "texts", "hotkey_engine", "tray", "ui", "theme", "hotkeys",
+          "command_server", "first_paint", "initial_scan"]
+
+
+class CallCountingProfiler(main.StartupProfiler):
+    # Also notes how many window-manager calls had been made at each phase.
+    def __init__(self, backend):
+        super().__init__()
+        self.backend = backend
+        self.calls = {}
+
+    def mark(self, phase):
+        super().mark(phase)
+        self.calls[phase] = self.backend.calls
+
+
+@pytest.mark.parametrize("count", [10, 5000])
+def test_window_shows_before_any_enumeration(make_app, count):
+    backend = main.FakeWindowBackend()
+    for number in range(count):
+        backend.add_window("Window {0}".format(number), 1000 + number)
+    profiler = CallCountingProfiler(backend)
+    app = make_app(backend, profiler=profiler)
+    assert app._initial_scan_done
+    assert [phase for phase, _, _ in profiler.phases] == PHASES
+    # Nothing asks the window manager anything until the window is painted,
+    # however many windows are open.
+    assert profiler.calls["first_paint"] == 0
+    assert profiler.calls["initial_scan"] > 0
+    assert app.window_model.rowCount() == count
+
+
+def test_first_paint_budget(make_app):
+    backend = main.FakeWindowBackend()
+    for number in range(5000):
+        backend.add_window("Window {0}".format(number), 1000 + number)
+    profiler = main.StartupProfiler()
+    make_app(backend, profiler=profiler)
+    first_paint = dict((phase, total) for phase, _, total in profiler.phases)["first_paint"]
+    assert first_paint < 0.5
+
+
+def test_menus_and_dialogs_are_built_on_demand(make_app):
+    app = make_app()
+    assert app.tray_menu.actions() == []
+    assert app.theme_menu.actions() == []
+    assert app._about_dialog is None and app._settings_dialog is None
+    app.tray_menu.aboutToShow.emit()
+    app.theme_menu.aboutToShow.emit()
+    assert len(app.tray_menu.actions()) >= 2
+    assert len(app.theme_menu.actions()) == len(app.theme_engine.names())
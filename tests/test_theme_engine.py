@@ -0,0 +1,71 @@
+import json
+import os
+
+import main
+
+
+def bundled_engine(extra=None):
+    directories = main.data_directories("", "themes")
+    if extra:
+        directories.append(extra)
+    engine = main.ThemeEngine(directories)
+    engine.load()
+    return engine
+
+
+def test_bundled_themes_load_in_menu_order(qapp):
+    assert bundled_engine().names() == ["white", "gray", "black"]
+
+
+def test_each_theme_renders_once(qapp):
+    engine = bundled_engine()
+    widget = main.QtWidgets.QWidget()
+    for number in range(100):
+        engine.apply(widget, ("white", "gray", "black")[number % 3])
+    assert engine.renders == 3
+    assert widget.styleSheet() == engine.stylesheet("white")
+
+
+def test_reapplying_the_current_theme_is_a_no_op(qapp):
+    engine = bundled_engine()
+    widget = main.QtWidgets.QWidget()
+    assert engine.apply(widget, "gray")
+    widget.setStyleSheet("")
+    assert not engine.apply(widget, "gray")
+    assert widget.styleSheet() == ""
+
+
+def test_theme_files_add_and_override_themes(qapp, tmp_path):
+    palette = dict(bundled_engine().themes["white"]["palette"], bg_color="#123456")
+    with open(os.path.join(str(tmp_path), "white.json"), 'w') as f:
+        json.dump({"name": "White", "palette": palette}, f)
+    with open(os.path.join(str(tmp_path), "teal.json"), 'w') as f:
+        json.dump({"name": "Teal", "order": 5, "palette": palette}, f)
+    with open(os.path.join(str(tmp_path), "broken.json"), 'w') as f:
+        json.dump({"name": "Broken", "palette": {"bg_color": "#000000"}}, f)
+    engine = bundled_engine(str(tmp_path))
+    assert "#123456" in engine.stylesheet("white")
+    assert "teal" in engine.names()
+    assert "broken" not in engine.themes
+    assert main.metrics.errors["theme.load"]["count"] >= 1
+
+
+def test_switching_with_500_rows(make_app):
+    backend = main.FakeWindowBackend()
+    for number in range(500):
+        backend.add_window("Window {0}".format(number), 1000 + number)
+    app = make_app(backend)
+    assert app.window_model.rowCount() == 500
+    renders = app.theme_engine.renders
+    for number in range(30):
+        app.change_theme(("gray", "black", "white")[number % 3])
+    app.change_theme("no-such-theme")
+    assert app.theme_engine.current == "white"
+    assert app.theme_engine.renders - renders == 2
+
+
+def test_unusable_saved_theme_falls_back_to_default(make_app):
+    for saved in (["black"], {"name": "black"}, 5, "no-such-theme"):
+        app = make_app(config={"theme": saved})
+        assert app.theme_engine.current == main.DEFAULT_THEME
+        assert app.config.get("theme") == main.DEFAULT_THEME
@@ -0,0 +1,104 @@
+import main
+from conftest import wait_until
+
+
+def make_watchdog(desktop, count=20):
+    hwnds = desktop.populate(count)
+    pinned = main.PinnedRegistry()
+    for hwnd in hwnds:
+        desktop.set_topmost(hwnd, True)
+        pinned.add(hwnd, desktop.get_pid(hwnd))
+    now = [0.0]
+    watchdog = main.TopmostWatchdog(desktop, pinned, clock=lambda: now[0])
+    return watchdog, hwnds, now
+
+
+def is_topmost(desktop, hwnd):
+    return bool(desktop.get_ex_style(hwnd) & main.WS_EX_TOPMOST)
+
+
+def test_random_strips_are_each_reasserted_once(qapp):
+    desktop = main.SimulatedDesktop(seed=3)
+    watchdog, hwnds, now = make_watchdog(desktop)
+    stripped = 0
+    for _ in range(30):
+        # Rounds further apart than the fight window never add up to a fight.
+        now[0] += main.TOPMOST_FIGHT_WINDOW_S + 1
+        events = desktop.churn(strips=desktop.rng.randrange(4))
+        stripped += len(events)
+        for kind, hwnd in events:
+            watchdog.notify(hwnd)
+        watchdog.flush()
+        assert all(is_topmost(desktop, hwnd) for hwnd in hwnds)
+    assert stripped
+    assert watchdog.reasserts == stripped
+    assert watchdog.stats()["fights"] == 0
+    assert not watchdog.given_up
+
+
+def test_reassert_waits_for_min_gap(qapp):
+    desktop = main.SimulatedDesktop()
+    watchdog, hwnds, now = make_watchdog(desktop, 1)
+    hwnd = hwnds[0]
+    desktop.set_topmost(hwnd, False)
+    watchdog.check_all()
+    assert watchdog.reasserts == 1
+    now[0] += watchdog.min_gap / 2
+    desktop.set_topmost(hwnd, False)
+    watchdog.check_all()
+    assert watchdog.reasserts == 1
+    assert not is_topmost(desktop, hwnd)
+    # The check stays pending and goes through once the gap has passed.
+    now[0] += watchdog.min_gap
+    assert wait_until(lambda: watchdog.reasserts == 2, 2.0)
+    assert is_topmost(desktop, hwnd)
+
+
+def test_window_that_keeps_reverting_is_given_up(qapp):
+    desktop = main.SimulatedDesktop()
+    watchdog, hwnds, now = make_watchdog(desktop, 3)
+    fighter = hwnds[0]
+    desktop.fighters.add(fighter)
+    fights = []
+    watchdog.fight_detected.connect(fights.append)
+    for _ in range(3 * watchdog.fight_limit):
+        now[0] += watchdog.min_gap
+        desktop.churn()
+        watchdog.check_all()
+    assert watchdog.reasserts == watchdog.fight_limit
+    assert fights == [fighter]
+    assert watchdog.given_up == {fighter}
+    assert watchdog.stats() == {"checks": watchdog.checks, "reasserts": watchdog.fight_limit,
+                                "fights": 1, "given_up": 1}
+    assert not is_topmost(desktop, fighter)
+    assert all(is_topmost(desktop, hwnd) for hwnd in hwnds[1:])
+
+
+def test_repinning_a_given_up_window_fights_for_it_again(make_app):
+    desktop = main.SimulatedDesktop()
+    hwnd = desktop.add_window("Player", 100)
+    app = make_app(desktop)
+    watchdog = app.topmost_watchdog
+    now = [0.0]
+    watchdog.clock = lambda: now[0]
+    fights = []
+    watchdog.fight_detected.connect(fights.append)
+    app.toggle_pin(hwnd, True)
+    desktop.fighters.add(hwnd)
+    for _ in range(2 * watchdog.fight_limit):
+        now[0] += watchdog.min_gap
+        desktop.churn()
+        watchdog.check_all()
+    assert fights == [hwnd]
+    assert hwnd in watchdog.given_up
+    desktop.fighters.discard(hwnd)
+    app.toggle_pin(hwnd, False)
+    app.toggle_pin(hwnd, True)
+    assert hwnd not in watchdog.given_up
+    reasserts = watchdog.reasserts
+    now[0] += watchdog.min_gap
+    desktop.set_topmost(hwnd, False)
+    watchdog.check_all()
+    assert watchdog.reasserts == reasserts + 1
+    assert is_topmost(desktop, hwnd)
+    assert fights == [hwnd]
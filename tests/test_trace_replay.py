@@ -0,0 +1,95 @@
+import os
+
+import main
+from conftest import run_events, wait_until
+
+BACKEND_METHODS = ("enum_windows", "is_window", "is_visible", "get_parent", "get_owner", "get_ex_style",
+                   "get_pid", "get_text", "get_class_name", "get_foreground_window", "activate",
+                   "get_process_path", "get_process_start_time", "set_topmost", "set_topmost_many")
+
+
+def listed(app):
+    model = app.window_model
+    return [(model.index(row).data(main.QtCore.Qt.UserRole), model.index(row).data())
+            for row in range(model.rowCount())]
+
+
+def log_calls(backend):
+    log = []
+
+    def logged(name, method):
+        def call(*args):
+            log.append((name,) + tuple(tuple(arg) if isinstance(arg, list) else arg for arg in args))
+            return method(*args)
+        return call
+
+    for name in BACKEND_METHODS:
+        setattr(backend, name, logged(name, getattr(backend, name)))
+    return log
+
+
+def record_session(make_app, path):
+    desktop = main.SimulatedDesktop(seed=7)
+    desktop.populate(40)
+    source = main.FakeWindowEventSource()
+    app = make_app(desktop, window_event_source=source, show=False)
+    app.record_trace(path)
+    app.show()
+    assert wait_until(lambda: app._initial_scan_done)
+    for round_number in range(8):
+        for kind, hwnd in desktop.churn(renames=3, creates=1, destroys=1):
+            source.push(kind, hwnd)
+        run_events(50)
+        hwnd = listed(app)[round_number][0]
+        app.toggle_pin(hwnd, True)
+        if round_number % 3 == 2:
+            app.apply_command_mutations([("unpin", [hwnd])])
+        if round_number == 5:
+            app.unpin_all_windows()
+        app.refresh_window_list()
+        run_events(50)
+    app.trace_recorder.close()
+    return app.trace_recorder.records
+
+
+def replay(path, config_dir):
+    _, records = main.load_trace(path)
+    replayer = main.TraceReplayer(records)
+    desktop = replayer.build_desktop()
+    calls = log_calls(desktop)
+    os.mkdir(config_dir)
+    app = main.simulated_app(desktop, config_dir)
+    refreshes = []
+    flush = app.refresh_scheduler.flush
+
+    def logged_flush():
+        flush()
+        refreshes.append(listed(app))
+
+    app.refresh_scheduler.flush = logged_flush
+    try:
+        report = replayer.run(app, desktop)
+        pinned = sorted(app.pinned_windows)
+    finally:
+        app.quit_app()
+        app.deleteLater()
+    return report, refreshes, calls, desktop.topmost_calls, pinned
+
+
+def test_replaying_a_recorded_session_twice_repeats_it(make_app, tmp_path):
+    path = str(tmp_path / "session.trace")
+    assert record_session(make_app, path) > 10
+    first = replay(path, str(tmp_path / "first"))
+    second = replay(path, str(tmp_path / "second"))
+    report, refreshes, calls, topmost_calls, pinned = first
+    assert report["refreshes"] > 0 and refreshes
+    assert report["probes"] > 0
+    assert topmost_calls
+    assert second[1] == refreshes
+    assert second[2] == calls
+    assert second[3] == topmost_calls
+    assert second[4] == pinned
+    timing = ("replay_ms", "actions")
+    assert ({key: value for key, value in second[0].items() if key not in timing}
+            == {key: value for key, value in report.items() if key not in timing})
+    assert sorted(second[0]["actions"]) == sorted(report["actions"]) == ["ctl.unpin", "pin", "unpin_all"]
@@ -0,0 +1,80 @@
+import json
+import os
+
+import main
+
+
+def write_catalogs(directory, catalogs):
+    for code, texts in catalogs.items():
+        with open(os.path.join(str(directory), code + ".json"), 'w', encoding='utf-8') as f:
+            json.dump(texts, f, ensure_ascii=False)
+
+
+def english():
+    return dict(zip(main.TEXT_KEYS, main.TranslationCatalogs(main.data_directories("", "i18n")).catalog("en")))
+
+
+def test_catalogs_are_read_on_first_use(tmp_path):
+    write_catalogs(tmp_path, {"l{0:02}".format(n): {"title": "Title {0}".format(n)} for n in range(30)})
+    write_catalogs(tmp_path, {"en": english()})
+    catalogs = main.TranslationCatalogs([str(tmp_path)])
+    assert len(catalogs.paths()) == 31
+    assert len(catalogs.languages()) == 31
+    assert catalogs.loads == 0
+    texts = catalogs.catalog("l07")
+    # The language itself, then English for the texts it lacks.
+    assert catalogs.loads == 2
+    assert catalogs.catalog("l07") is texts
+    catalogs.catalog("en")
+    assert catalogs.loads == 2
+
+
+def test_missing_texts_come_from_the_fallback_then_the_key(tmp_path):
+    full = english()
+    partial = {key: full[key] for key in main.TEXT_KEYS[1:]}
+    write_catalogs(tmp_path, {"en": partial, "fr": {"unpin_all": "Tout détacher"}})
+    catalogs = main.TranslationCatalogs([str(tmp_path)])
+    french = dict(zip(main.TEXT_KEYS, catalogs.catalog("fr")))
+    assert french["unpin_all"] == "Tout détacher"
+    assert french["btn_save"] == full["btn_save"]
+    assert french[main.TEXT_KEYS[0]] == main.TEXT_KEYS[0]
+
+
+def test_broken_catalog_falls_back_and_is_reported(tmp_path):
+    before = main.metrics.errors.get("i18n.load", {}).get("count", 0)
+    write_catalogs(tmp_path, {"en": english()})
+    with open(os.path.join(str(tmp_path), "xx.json"), 'w') as f:
+        f.write("{not json")
+    catalogs = main.TranslationCatalogs([str(tmp_path)])
+    assert catalogs.catalog("xx") == catalogs.catalog("en")
+    assert main.metrics.errors["i18n.load"]["count"] == before + 1
+    # A language with no file at all is the fallback too.
+    assert catalogs.catalog("zz") == catalogs.catalog("en")
+
+
+def test_switching_language_retexts_widgets_in_place(make_app, tmp_path, monkeypatch):
+    os.makedirs(os.path.join(str(tmp_path), "i18n"))
+    write_catalogs(tmp_path / "i18n", {"fr": {"unpin_all": "Tout détacher", "btn_save": "Enregistrer"}})
+    app = make_app(config={"language": "vi"})
+    vietnamese = dict(zip(main.TEXT_KEYS, app.catalogs.catalog("vi")))
+    full = english()
+    button = app.unpin_btn
+    assert button.text() == vietnamese["unpin_all"]
+    app.populate_tray_menu()
+    tray_action = app.tray_menu.actions()[0]
+    assert tray_action.text() == vietnamese["tray_open"]
+    dialog = app.create_settings_dialog()
+
+    for code, unpin_all, save, tray_open in (("en", full["unpin_all"], full["btn_save"], full["tray_open"]),
+                                             ("fr", "Tout détacher", "Enregistrer", full["tray_open"])):
+        app.lang_combo.setCurrentIndex(app.lang_combo.findData(code))
+        app.save_settings(dialog)
+        assert app.language == code
+        assert app.unpin_btn is button
+        assert button.text() == unpin_all
+        assert app.save_btn.text() == save
+        assert tray_action.text() == tray_open
+        assert app.search_edit.placeholderText() == full["search_placeholder"]
+    app.config.flush(wait=True)
+    with open(app.config_file) as f:
+        assert json.load(f)["language"] == "fr"
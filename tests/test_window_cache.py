@@ -0,0 +1,95 @@
+import sys
+import threading
+
+import main
+
+
+def test_scans_and_gui_lookups_can_overlap():
+    # The scan thread retains and refills the cache while the GUI thread
+    # reads class names of windows the scan has not seen yet.
+    switch = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        backend = main.FakeWindowBackend()
+        for number in range(3000):
+            backend.add_window("Window {0}".format(number), 1000 + number)
+        cache = main.WindowAttributeCache(backend)
+        errors = []
+        done = threading.Event()
+
+        def scan():
+            try:
+                for _ in range(30):
+                    main.enum_taskbar_windows(cache)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                done.set()
+
+        thread = threading.Thread(target=scan)
+        thread.start()
+        hwnds = list(backend.windows)
+        while not done.is_set():
+            extra = backend.add_window("New", 9999)
+            cache.class_name(extra)
+            cache.class_name(hwnds[extra % len(hwnds)])
+            backend.remove_window(extra)
+        thread.join()
+    finally:
+        sys.setswitchinterval(switch)
+    assert errors == []
+    main.enum_taskbar_windows(cache)
+    assert len(cache) == 3000
+
+
+def test_entries_are_shared_between_threads():
+    backend = main.FakeWindowBackend()
+    hwnd = backend.add_window("Editor", 100, class_name="EditorFrame")
+    cache = main.WindowAttributeCache(backend)
+    thread = threading.Thread(target=lambda: main.enum_taskbar_windows(cache))
+    thread.start()
+    thread.join()
+    calls = backend.calls
+    assert cache.class_name(hwnd) == "EditorFrame"
+    assert cache.class_name(hwnd) == "EditorFrame"
+    assert backend.calls == calls + 1
+
+
+def scan_calls(desktop, cache):
+    before = desktop.calls
+    windows = main.enum_taskbar_windows(cache)
+    return len(windows), desktop.calls - before
+
+
+def test_warm_cache_refresh_of_5000_windows():
+    desktop = main.SimulatedDesktop(seed=5000)
+    desktop.populate(5000)
+    cache = main.WindowAttributeCache(desktop)
+    listed, cold = scan_calls(desktop, cache)
+    assert listed == 3722
+    assert cache.stats()["misses"] == len(cache) == 4510
+    # Warm: the enumeration, one visibility check per window and one title
+    # per listed window.
+    assert scan_calls(desktop, cache) == (listed, 1 + 5000 + listed)
+    assert cold > 3 * (1 + 5000 + listed)
+    stats = cache.stats()
+    assert stats["misses"] == 4510
+    assert stats["hit_rate"] > 0.85
+    # Rename events keep titles current, so scans stop re-reading them.
+    tracked = main.WindowAttributeCache(desktop, track_titles=True)
+    scan_calls(desktop, tracked)
+    assert scan_calls(desktop, tracked) == (listed, 1 + 5000)
+
+
+def test_cache_counts_reach_status_and_debug_panel(make_app):
+    backend = main.FakeWindowBackend()
+    for number in range(10):
+        backend.add_window("Window {0}".format(number), 100 + number)
+    app = make_app(backend)
+    status = app.command_server.handle({"cmd": "status"})
+    assert status["window_cache"]["size"] == 10
+    assert status["window_cache"]["misses"] == 10
+    assert status["window_cache"]["hits"] > 0
+    app.show_debug_panel()
+    assert "window cache {" in app.debug_text.toPlainText()
+    app._debug_panel.close()
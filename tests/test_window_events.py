@@ -0,0 +1,70 @@
+import time
+
+import main
+from conftest import run_events, wait_until
+
+
+def listed(app):
+    model = app.window_model
+    return {model.index(row).data(main.QtCore.Qt.UserRole): model.index(row).data()
+            for row in range(model.rowCount())}
+
+
+def make_tracked_app(make_app):
+    backend = main.FakeWindowBackend()
+    first = backend.add_window("Editor", 100, "C:\\editor.exe")
+    source = main.FakeWindowEventSource()
+    app = make_app(backend, window_event_source=source)
+    return app, backend, source, first
+
+
+def test_injected_source_replaces_the_poll(make_app):
+    app, backend, source, first = make_tracked_app(make_app)
+    assert app.window_event_source is source
+    assert source.running
+    assert app.window_cache.track_titles
+    assert app.scan_scheduler.base == main.FULL_SCAN_INTERVAL_MS
+    assert listed(app) == {first: "Editor"}
+
+
+def test_events_update_the_list_without_a_scan(make_app):
+    app, backend, source, first = make_tracked_app(make_app)
+    scans = app.scan_scheduler.scans
+
+    second = backend.add_window("Browser", 200, "C:\\browser.exe")
+    started = time.perf_counter()
+    source.push(main.WINDOW_CREATED, second)
+    assert wait_until(lambda: second in listed(app), 1.0)
+    assert time.perf_counter() - started < 0.1
+
+    backend.windows[first].title = "Editor - notes.txt"
+    source.push(main.WINDOW_RENAMED, first)
+    assert wait_until(lambda: listed(app).get(first) == "Editor - notes.txt", 1.0)
+
+    backend.windows[second].visible = False
+    source.push(main.WINDOW_HIDDEN, second)
+    assert wait_until(lambda: second not in listed(app), 1.0)
+
+    backend.remove_window(first)
+    source.push(main.WINDOW_DESTROYED, first)
+    assert wait_until(lambda: not listed(app), 1.0)
+    assert app.scan_scheduler.scans == scans
+
+
+def test_idle_app_does_not_touch_the_backend(make_app):
+    app, backend, source, first = make_tracked_app(make_app)
+    calls = backend.calls
+    run_events(300)
+    assert backend.calls == calls
+
+
+def test_stopped_source_drops_events(qapp):
+    source = main.FakeWindowEventSource()
+    seen = []
+    source.window_event.connect(lambda kind, hwnd: seen.append((kind, hwnd)))
+    source.push(main.WINDOW_CREATED, 1)
+    source.start()
+    source.push(main.WINDOW_CREATED, 2)
+    source.stop()
+    source.push(main.WINDOW_CREATED, 3)
+    assert seen == [(main.WINDOW_CREATED, 2)]
@@ -0,0 +1,61 @@
+import main
+
+
+def ops(inserted=0, removed=0, changed=0):
+    return {"inserted": inserted, "removed": removed, "changed": changed}
+
+
+def test_first_snapshot_inserts_every_row(qapp):
+    model = main.WindowListModel()
+    assert model.apply_snapshot([(1, "a"), (2, "b"), (3, "c")], set()) == ops(inserted=3)
+    assert model.rowCount() == 3
+
+
+def test_unchanged_snapshot_touches_nothing(qapp):
+    model = main.WindowListModel()
+    snapshot = [(hwnd, "window {0}".format(hwnd)) for hwnd in range(500)]
+    model.apply_snapshot(snapshot, {7})
+    assert model.apply_snapshot(snapshot, {7}) == ops()
+
+
+def test_diff_counts_each_kind_of_change(qapp):
+    model = main.WindowListModel()
+    model.apply_snapshot([(1, "a"), (2, "b"), (3, "c"), (4, "d")], set())
+    # 2 closed, 3 retitled, 4 pinned, 5 opened.
+    assert model.apply_snapshot([(1, "a"), (3, "C"), (4, "d"), (5, "e")], {4}) == \
+        ops(inserted=1, removed=1, changed=2)
+    rows = [(model.index(row).data(main.QtCore.Qt.UserRole), model.index(row).data())
+            for row in range(model.rowCount())]
+    assert rows == [(1, "a"), (3, "C"), (4, "d"), (5, "e")]
+    assert model.index(2).data(main.QtCore.Qt.CheckStateRole) == main.QtCore.Qt.Checked
+
+
+def test_row_signals_match_the_reported_ops(qapp):
+    model = main.WindowListModel()
+    model.apply_snapshot([(hwnd, str(hwnd)) for hwnd in range(100)], set())
+    seen = ops()
+    model.rowsInserted.connect(lambda parent, first, last: seen.__setitem__(
+        "inserted", seen["inserted"] + last - first + 1))
+    model.rowsRemoved.connect(lambda parent, first, last: seen.__setitem__(
+        "removed", seen["removed"] + last - first + 1))
+    model.dataChanged.connect(lambda first, last, roles=(): seen.__setitem__(
+        "changed", seen["changed"] + last.row() - first.row() + 1))
+    resets = []
+    model.modelReset.connect(lambda: resets.append(1))
+
+    snapshot = [(hwnd, str(hwnd) if hwnd % 10 else "renamed") for hwnd in range(100) if hwnd % 7]
+    snapshot += [(hwnd, str(hwnd)) for hwnd in range(100, 103)]
+    result = model.apply_snapshot(snapshot, set())
+    assert result == ops(inserted=3, removed=15, changed=8)
+    assert seen == result
+    assert not resets
+
+
+def test_set_pinned_changes_one_row(qapp):
+    model = main.WindowListModel()
+    model.apply_snapshot([(1, "a"), (2, "b")], set())
+    changed = []
+    model.dataChanged.connect(lambda first, last, roles=(): changed.append(first.row()))
+    model.set_pinned(2, True)
+    model.set_pinned(2, True)
+    assert changed == [1]
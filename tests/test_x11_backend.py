@@ -0,0 +1,166 @@
+import os
+import shutil
+import subprocess
+import time
+
+import pytest
+
+xcffib = pytest.importorskip("xcffib")
+import xcffib.xproto
+
+import main
+
+
+@pytest.fixture(scope="module")
+def display():
+    # A bare Xvfb: no window manager, so the test plays that part.
+    if not shutil.which("Xvfb"):
+        pytest.skip("Xvfb is not installed")
+    read, write = os.pipe()
+    server = subprocess.Popen(["Xvfb", "-displayfd", str(write), "-nolisten", "tcp",
+                               "-screen", "0", "640x480x24"],
+                              pass_fds=(write,), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.close(write)
+    with os.fdopen(read) as f:
+        number = f.readline().strip()
+    if not number:
+        server.kill()
+        pytest.skip("Xvfb did not start")
+    yield ":" + number
+    server.terminate()
+    server.wait()
+
+
+class WindowManager:
+    # Creates clients, lists them in _NET_CLIENT_LIST and applies the
+    # _NET_WM_STATE client messages the backend sends, as an EWMH window
+    # manager would.
+    def __init__(self, display, atoms):
+        self.conn = xcffib.connect(display=display)
+        self.screen = self.conn.get_setup().roots[self.conn.pref_screen]
+        self.atoms = atoms
+        self.clients = []
+        self.conn.core.ChangeWindowAttributes(self.screen.root, xcffib.xproto.CW.EventMask,
+                                              [xcffib.xproto.EventMask.SubstructureRedirect])
+        self.sync()
+
+    def sync(self):
+        self.conn.core.GetInputFocus().reply()
+
+    def set_property(self, wid, name, kind, values):
+        self.conn.core.ChangeProperty(xcffib.xproto.PropMode.Replace, wid, name, kind, 32, len(values), values)
+
+    def get_atoms(self, wid, name):
+        reply = self.conn.core.GetProperty(False, wid, name, xcffib.xproto.Atom.ATOM, 0, 64).reply()
+        return set(main.unpack_cardinals(b"".join(reply.value)))
+
+    def create(self, title, pid, state=(), owner=None, class_name=None, net_name=True):
+        core = self.conn.core
+        atom = xcffib.xproto.Atom
+        wid = self.conn.generate_id()
+        core.CreateWindow(self.screen.root_depth, wid, self.screen.root, 0, 0, 100, 100, 0,
+                          xcffib.xproto.WindowClass.InputOutput, self.screen.root_visual, 0, [])
+        if net_name:
+            data = title.encode("utf-8")
+            core.ChangeProperty(xcffib.xproto.PropMode.Replace, wid, self.atoms["_NET_WM_NAME"],
+                                self.atoms["UTF8_STRING"], 8, len(data), data)
+        else:
+            data = title.encode("latin-1")
+            core.ChangeProperty(xcffib.xproto.PropMode.Replace, wid, atom.WM_NAME, atom.STRING, 8, len(data), data)
+        self.set_property(wid, self.atoms["_NET_WM_PID"], atom.CARDINAL, [pid])
+        if state:
+            self.set_property(wid, self.atoms["_NET_WM_STATE"], atom.ATOM, [self.atoms[name] for name in state])
+        if owner:
+            self.set_property(wid, atom.WM_TRANSIENT_FOR, atom.WINDOW, [owner])
+        if class_name:
+            data = "{0}\0{1}\0".format(class_name.lower(), class_name).encode("latin-1")
+            core.ChangeProperty(xcffib.xproto.PropMode.Replace, wid, atom.WM_CLASS, atom.STRING, 8, len(data), data)
+        self.clients.append(wid)
+        self.set_property(self.screen.root, self.atoms["_NET_CLIENT_LIST"], atom.WINDOW, self.clients)
+        self.sync()
+        return wid
+
+    def handle_state_messages(self, expected, timeout_s=5.0):
+        # Applies expected _NET_WM_STATE add/remove messages and returns them.
+        handled = []
+        deadline = time.perf_counter() + timeout_s
+        while len(handled) < expected and time.perf_counter() < deadline:
+            event = self.conn.poll_for_event()
+            if event is None:
+                time.sleep(0.01)
+                continue
+            if not isinstance(event, xcffib.xproto.ClientMessageEvent):
+                continue
+            if event.type != self.atoms["_NET_WM_STATE"]:
+                continue
+            action, first = list(event.data.data32)[:2]
+            state = self.get_atoms(event.window, self.atoms["_NET_WM_STATE"])
+            if action == main.X11WindowBackend.NET_WM_STATE_ADD:
+                state.add(first)
+            else:
+                state.discard(first)
+            self.set_property(event.window, self.atoms["_NET_WM_STATE"], xcffib.xproto.Atom.ATOM, sorted(state))
+            handled.append((event.window, action, first))
+        self.sync()
+        return handled
+
+    def close(self):
+        for wid in self.clients:
+            self.conn.core.DestroyWindow(wid)
+        self.conn.core.DeleteProperty(self.screen.root, self.atoms["_NET_CLIENT_LIST"])
+        self.sync()
+        self.conn.disconnect()
+
+
+@pytest.fixture
+def desktop(display):
+    backend = main.X11WindowBackend(display)
+    wm = WindowManager(display, backend.atoms)
+    yield backend, wm
+    wm.close()
+    backend.conn.disconnect()
+
+
+def test_enumerate_reads_every_client_in_two_round_trips(desktop):
+    backend, wm = desktop
+    editor = wm.create("Notes — Editor", 4242, class_name="Editor")
+    palette = wm.create("Palette", 4242, state=("_NET_WM_STATE_SKIP_TASKBAR",))
+    dialog = wm.create("Save as", 4242, owner=editor, net_name=False)
+    above = wm.create("Player", 77, state=("_NET_WM_STATE_ABOVE",))
+    round_trips = backend.round_trips
+    assert backend.enum_windows() == [editor, palette, dialog, above]
+    assert backend.round_trips == round_trips + 2
+    assert backend.get_text(editor) == "Notes — Editor"
+    assert backend.get_text(dialog) == "Save as"
+    assert backend.get_pid(editor) == 4242
+    assert backend.get_pid(above) == 77
+    assert backend.get_class_name(editor) == "Editor"
+    assert backend.get_owner(dialog) == editor
+    assert backend.get_owner(editor) == 0
+    assert backend.get_ex_style(editor) == 0
+    assert backend.get_ex_style(palette) == main.WS_EX_TOOLWINDOW
+    assert backend.get_ex_style(above) == main.WS_EX_TOPMOST
+    # The getters answer from the scan's snapshot.
+    assert backend.round_trips == round_trips + 2
+    assert backend.is_window(editor)
+    assert not backend.is_window(wm.screen.root)
+
+
+def test_set_topmost_round_trips_through_net_wm_state_above(desktop):
+    backend, wm = desktop
+    above = backend.atoms["_NET_WM_STATE_ABOVE"]
+    hwnds = [wm.create("Window {0}".format(n), 100 + n) for n in range(3)]
+    backend.enum_windows()
+    backend.set_topmost(hwnds[0], True)
+    assert wm.handle_state_messages(1) == [(hwnds[0], backend.NET_WM_STATE_ADD, above)]
+    assert backend.get_ex_style(hwnds[0]) == main.WS_EX_TOPMOST
+    assert backend.set_topmost_many(hwnds[1:], True) == hwnds[1:]
+    assert len(wm.handle_state_messages(2)) == 2
+    # A fresh scan reads back what the window manager stored.
+    backend.enum_windows()
+    assert [backend.get_ex_style(hwnd) for hwnd in hwnds] == [main.WS_EX_TOPMOST] * 3
+    assert all(wm.get_atoms(hwnd, backend.atoms["_NET_WM_STATE"]) == {above} for hwnd in hwnds)
+    backend.set_topmost(hwnds[1], False)
+    assert wm.handle_state_messages(1) == [(hwnds[1], backend.NET_WM_STATE_REMOVE, above)]
+    backend.enum_windows()
+    assert [backend.get_ex_style(hwnd) for hwnd in hwnds] == [main.WS_EX_TOPMOST, 0, main.WS_EX_TOPMOST]